@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput benchmarks for rewire, run with asv (https://asv.readthedocs.io).
+
+@author: shane mannion
+"""
+
+import random
+import time
+import networkx as nx
+import numpy as np
+from degree_preserving_rewiring import rewire
+
+#mean degree of the generated graphs, so n_edges fixes the number of nodes
+MEAN_DEGREE = 10
+TARGET = 0.3
+TIME_LIMIT = 60
+
+_graphs = {}
+
+
+def make_graph(kind, n_edges, seed=42):
+    """
+    Returns an ER, BA or configuration model graph with about n_edges edges
+    and mean degree MEAN_DEGREE. Graphs are cached, so each is built once 
+    per benchmark process.
+    """
+    key = (kind, n_edges, seed)
+    if key not in _graphs:
+        n = 2*n_edges//MEAN_DEGREE
+        if kind == 'er':
+            G = nx.gnm_random_graph(n, n_edges, seed=seed)
+        elif kind == 'ba':
+            G = nx.barabasi_albert_graph(n, MEAN_DEGREE//2, seed=seed)
+        elif kind == 'configuration':
+            #heavy tailed degrees with the same mean, simplified afterwards
+            rng = np.random.default_rng(seed)
+            degrees = np.round(rng.pareto(2.5, n)*(MEAN_DEGREE - 1)*1.5 + 1).astype(int)
+            if degrees.sum() % 2:
+                degrees[0] += 1
+            G = nx.Graph(nx.configuration_model(degrees.tolist(), seed=seed))
+            G.remove_edges_from(nx.selfloop_edges(G))
+        else:
+            raise ValueError(f'unknown graph kind {kind!r}')
+        _graphs[key] = G
+    return _graphs[key]
+
+
+def run_rewire(G, method):
+    random.seed(0)
+    return rewire(G, TARGET, 'benchmark', sample_size=2, timed=True, 
+                  time_limit=TIME_LIMIT, method=method)
+
+
+def run_to_target(G, method):
+    """
+    Runs rewire and returns (wall time, accepted swaps per second, final r, 
+    whether TARGET was reached).
+
+    The fine tuning walks r from where it starts (the original graph for 
+    'original', the Havel-Hakimi graph for 'new') towards the target and 
+    stops once it crosses it, so the run reached TARGET if the final r is 
+    on the far side of it from that start. Wall time cannot tell, as it 
+    includes the setup and the Havel-Hakimi phase.
+    """
+    start = time.perf_counter()
+    _, results = run_rewire(G, method)
+    elapsed = time.perf_counter() - start
+    rows = results.loc[~results['summary']]
+    hh_rows = rows.loc[rows['method'] == 'max', 'r']
+    r_start = hh_rows.iloc[-1] if len(hh_rows) else rows['r'].iloc[0]
+    r_final = results['r'].iloc[-1]
+    target_r = results['target_r'].iloc[-1]
+    reached = bool((r_final - target_r)*(target_r - r_start) >= 0)
+    accepted = (rows.loc[rows['iteration'] > 0, 'edges_rewired'] > 0).sum()
+    return elapsed, float(accepted/elapsed), float(r_final), reached
+
+
+class Rewire:
+    """
+    rewire with each method on each kind of graph, from 10^3 to 10^5 edges.
+    Every call gets a fresh copy of the graph, as rewire works in place.
+    """
+    params = (['new', 'original', 'max'], 
+              ['er', 'ba', 'configuration'], 
+              [10**3, 10**4, 10**5])
+    param_names = ['method', 'graph', 'n_edges']
+    number = 1
+    repeat = (1, 3, 20)
+    timeout = 4*TIME_LIMIT
+
+    def setup(self, method, graph, n_edges):
+        self.G = make_graph(graph, n_edges).copy()
+
+    def time_rewire(self, method, graph, n_edges):
+        """
+        Wall time of rewire, capped at TIME_LIMIT. See RewireToTarget for 
+        whether the target was reached in that time.
+        """
+        run_rewire(self.G, method)
+
+    def peakmem_rewire(self, method, graph, n_edges):
+        run_rewire(self.G, method)
+
+
+class RewireToTarget:
+    """
+    Throughput of the fine tuning methods and whether and how fast they 
+    reach TARGET. Method 'max' stops at the Havel-Hakimi graph whatever the
+    target, so it is left out.
+
+    Each parameter set is run once, in setup_cache, and every track_* method
+    reads its outcome from there.
+    """
+    params = (['new', 'original'], 
+              ['er', 'ba', 'configuration'], 
+              [10**3, 10**4, 10**5])
+    param_names = ['method', 'graph', 'n_edges']
+
+    def setup_cache(self):
+        outcomes = {}
+        for method in self.params[0]:
+            for graph in self.params[1]:
+                for n_edges in self.params[2]:
+                    G = make_graph(graph, n_edges).copy()
+                    outcomes[method, graph, n_edges] = run_to_target(G, method)
+        return outcomes
+    setup_cache.timeout = 2*TIME_LIMIT*len(params[0])*len(params[1])*len(params[2])
+
+    def track_swaps_per_second(self, outcomes, method, graph, n_edges):
+        """
+        Accepted swaps per second of wall time, counting every iteration row
+        with edges rewired.
+        """
+        return outcomes[method, graph, n_edges][1]
+    track_swaps_per_second.unit = 'swaps/s'
+
+    def track_reached(self, outcomes, method, graph, n_edges):
+        """
+        1 if the run reached TARGET within TIME_LIMIT, else 0.
+        """
+        return float(outcomes[method, graph, n_edges][3])
+    track_reached.unit = 'reached'
+
+    def track_time_to_target(self, outcomes, method, graph, n_edges):
+        """
+        Wall time for rewire to reach TARGET, or nan if it hit TIME_LIMIT 
+        first, so a capped run is not read as a time.
+        """
+        elapsed, _, _, reached = outcomes[method, graph, n_edges]
+        return elapsed if reached else float('nan')
+    track_time_to_target.unit = 'seconds'
+
+    def track_final_gap(self, outcomes, method, graph, n_edges):
+        """
+        |r - TARGET| at the end of the run, so a faster run that stops short
+        of the target is not mistaken for an improvement.
+        """
+        return float(abs(outcomes[method, graph, n_edges][2] - TARGET))
+    track_final_gap.unit = '|r - target|'
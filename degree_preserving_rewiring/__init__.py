@@ -3,3 +3,4 @@ from .dpr.generate_graphs_itm import *
 from .dpr.create_networks import *
 from .dpr.havel_hakimi import *
 from .dpr.rewiring_helpers import *
+from .dpr.rewiring_ensemble import *
@@ -3,5 +3,8 @@ from .generate_graphs_itm import *
 from .create_networks import *
 from .havel_hakimi import *
 from .rewiring_helpers import *
+from .compact_graph import *
+from .rewiring_ensemble import *
 from .rewiring_components import *
 from .rewiring_clustering import *
+from .swap_kernel import *
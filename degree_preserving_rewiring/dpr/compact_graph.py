@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+"""
+Compact integer graph backend for the rewiring algorithms.
+
+@author: shane mannion
+"""
+
+import networkx as nx
+import numpy as np
+from array import array
+from bisect import bisect_left
+from collections import deque
+
+
+class CompactGraph:
+    """
+    Undirected simple graph on nodes 0..n-1 stored as flat int32 arrays.
+
+    Node i owns the slots nbrs[offset[i]:offset[i+1]] of a single neighbour
+    array, of which the first deg[i] are in use and kept sorted. The number
+    of slots per node is fixed when the graph is built (its degree in the 
+    source graph), which is all the degree-preserving algorithms ever need.
+    has_edge is a binary search of a row, O(log d); add_edge and 
+    remove_edge shift the tail of one row per endpoint, O(d) but a single 
+    memmove. There is no per-edge hash table, so the graph takes about 
+    4 bytes per edge end. A hash table would not make has_edge faster from
+    Python: on 200,000 edges a linear probing lookup in an array.array 
+    measured about 600 ns, the same as the bisect and as networkx, while 
+    adding 24 to 48 bytes per edge and a rehash to every add and remove.
+
+    The arrays are array.array buffers, which the Python loops index 
+    without creating numpy scalars, exposed read-only as the numpy views 
+    offset, deg and nbrs for vectorised code.
+
+    The class implements the part of the networkx.Graph interface used by
+    rewire, the Havel-Hakimi phases, reduce_clustering* and
+    connect_components, so those functions run on it unchanged. Convert with
+    from_networkx / to_networkx at the API boundary.
+
+    Only simple graphs are supported: add_edge raises ValueError for a 
+    self-loop, and from_networkx for a graph that has any, where networkx 
+    would accept them. Remove them first, e.g. with 
+    G.remove_edges_from(nx.selfloop_edges(G)), or use the networkx backend.
+
+    Parameters
+    ----------
+    capacity : array-like of int
+        maximum degree of each node
+    labels : list, optional
+        original node label of each integer node, used by to_networkx
+    """
+
+    def __init__(self, capacity, labels=None):
+        capacity = np.asarray(capacity, dtype=np.int64)
+        self.n = len(capacity)
+        offset = np.zeros(self.n + 1, dtype=np.int64)
+        np.cumsum(capacity, out=offset[1:])
+        self._offset = array('q', offset.tobytes())
+        self._nbrs = array('i', np.full(offset[-1], -1, dtype=np.int32).tobytes())
+        self._deg = array('i', bytes(4*self.n))
+        self.labels = list(range(self.n)) if labels is None else list(labels)
+        self.m = 0
+        self._views()
+
+    def _views(self):
+        self.offset = np.frombuffer(self._offset, dtype=np.int64)
+        self.nbrs = np.frombuffer(self._nbrs, dtype=np.int32)
+        self.deg = np.frombuffer(self._deg, dtype=np.int32)
+        #array.array refuses slice assignment while it exports buffers, so 
+        #rows are shifted through a memoryview, which handles the overlap
+        self._rows = memoryview(self._nbrs)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for view in ('offset', 'nbrs', 'deg', '_rows'):
+            del state[view]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._views()
+
+    @classmethod
+    def from_networkx(cls, G):
+        """
+        Builds a CompactGraph from G. Node i is the i-th node of G.nodes().
+        """
+        if nx.number_of_selfloops(G):
+            raise ValueError('CompactGraph only holds simple graphs, but G has self-loops')
+        labels = list(G.nodes())
+        index = {node: i for i, node in enumerate(labels)}
+        edges = np.array([(index[u], index[v]) for u, v in G.edges()], dtype=np.int64).reshape(-1, 2)
+        return cls.from_edge_array(len(labels), edges, labels)
+
+    @classmethod
+    def from_edge_array(cls, n_nodes, edges, labels=None):
+        """
+        Builds a CompactGraph on nodes 0..n_nodes-1 from an (m, 2) integer 
+        array of simple graph edges, as produced by edge_array.
+        """
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        if np.any(edges[:, 0] == edges[:, 1]):
+            raise ValueError('CompactGraph only holds simple graphs, but edges has self-loops')
+        capacity = np.bincount(edges.ravel(), minlength=n_nodes)
+        H = cls(capacity, labels)
+        H.set_edge_array(edges)
+        return H
+
+    def set_edge_array(self, edges):
+        """
+        Replaces the edges by an (m, 2) integer array of simple graph edges
+        with the degree sequence the graph was built for, as left by the 
+        swap kernels.
+        """
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        ends = np.concatenate((edges, edges[:, ::-1]))
+        capacity = np.diff(self.offset)
+        if not np.array_equal(np.bincount(ends[:, 0], minlength=self.n), capacity):
+            raise ValueError('edges do not have the degree sequence of the graph')
+        #every row is filled to capacity, sorted, in one pass
+        order = np.lexsort((ends[:, 1], ends[:, 0]))
+        self.nbrs[:] = ends[order, 1]
+        self.deg[:] = capacity
+        self.m = len(edges)
+
+    def to_networkx(self, G=None):
+        """
+        Returns the graph with the original node labels. If G is given its
+        edges are updated in place, keeping G's node attributes: only the 
+        edges that differ are removed or added, so edges present in both 
+        keep their attributes.
+        """
+        labels = self.labels
+        edges = self.edge_array().astype(np.int64)
+        if G is None:
+            G = nx.Graph()
+            G.add_nodes_from(labels)
+            G.add_edges_from(zip(map(labels.__getitem__, edges[:, 0].tolist()),
+                                 map(labels.__getitem__, edges[:, 1].tolist())))
+            return G
+        index = {node: i for i, node in enumerate(labels)}
+        old = np.array([(index[u], index[v]) for u, v in G.edges()], dtype=np.int64).reshape(-1, 2)
+        old_keys = old.min(axis=1)*self.n + old.max(axis=1)
+        new_keys = edges[:, 0]*self.n + edges[:, 1]
+        removed = old[~np.isin(old_keys, new_keys)].tolist()
+        added = edges[~np.isin(new_keys, old_keys)].tolist()
+        G.remove_edges_from((labels[u], labels[v]) for u, v in removed)
+        G.add_edges_from((labels[u], labels[v]) for u, v in added)
+        return G
+
+    def copy(self):
+        H = CompactGraph.__new__(CompactGraph)
+        H.n = self.n
+        H._offset = self._offset
+        H._nbrs = array('i', self._nbrs)
+        H._deg = array('i', self._deg)
+        H.labels = self.labels
+        H.m = self.m
+        H._views()
+        return H
+
+    def number_of_nodes(self):
+        return self.n
+
+    def number_of_edges(self):
+        return self.m
+
+    def nodes(self):
+        return range(self.n)
+
+    def degree(self, node=None):
+        """
+        Degree of node, or (node, degree) pairs for every node if None.
+        """
+        if node is None:
+            return zip(range(self.n), self._deg.tolist())
+        return self._deg[node]
+
+    def neighbors(self, node):
+        start = self._offset[node]
+        return self._nbrs[start:start + self._deg[node]].tolist()
+
+    def has_edge(self, u, v):
+        start = self._offset[u]
+        end = start + self._deg[u]
+        i = bisect_left(self._nbrs, v, start, end)
+        return i < end and self._nbrs[i] == v
+
+    def add_edge(self, u, v):
+        if u == v:
+            raise ValueError(f'self-loop on node {u} is not supported')
+        if self.has_edge(u, v):
+            return
+        nbrs = self._nbrs
+        rows = self._rows
+        offset = self._offset
+        deg = self._deg
+        for a, b in ((u, v), (v, u)):
+            start = offset[a]
+            end = start + deg[a]
+            if end == offset[a + 1]:
+                raise ValueError(f'node {a} is already at its degree capacity')
+            i = bisect_left(nbrs, b, start, end)
+            rows[i + 1:end + 1] = rows[i:end]
+            nbrs[i] = b
+            deg[a] += 1
+        self.m += 1
+
+    def remove_edge(self, u, v):
+        nbrs = self._nbrs
+        rows = self._rows
+        offset = self._offset
+        deg = self._deg
+        for a, b in ((u, v), (v, u)):
+            start = offset[a]
+            end = start + deg[a]
+            i = bisect_left(nbrs, b, start, end)
+            if i == end or nbrs[i] != b:
+                raise nx.NetworkXError(f'The edge {u}-{v} is not in the graph')
+            rows[i:end - 1] = rows[i + 1:end]
+            nbrs[end - 1] = -1
+            deg[a] -= 1
+        self.m -= 1
+
+    def add_edges_from(self, edges):
+        for u, v in edges:
+            self.add_edge(u, v)
+
+    def remove_edges_from(self, edges):
+        for u, v in edges:
+            self.remove_edge(u, v)
+
+    def edge_array(self):
+        """
+        Returns the edges as an (m, 2) int32 array with u < v in each row.
+        """
+        owner = np.repeat(np.arange(self.n, dtype=np.int32), np.diff(self.offset))
+        in_use = self.nbrs >= 0
+        u = owner[in_use]
+        v = self.nbrs[in_use]
+        keep = u < v
+        return np.column_stack((u[keep], v[keep]))
+
+    def edges(self):
+        edges = self.edge_array()
+        return list(zip(edges[:, 0].tolist(), edges[:, 1].tolist()))
+
+    def triangles(self):
+        """
+        Number of triangles through each node, as a dict like nx.triangles.
+        """
+        neighbours = [set(self.neighbors(u)) for u in range(self.n)]
+        t = [0]*self.n
+        for u in range(self.n):
+            N_u = neighbours[u]
+            for v in N_u:
+                if v > u:
+                    for w in N_u & neighbours[v]:
+                        if w > v:
+                            t[u] += 1
+                            t[v] += 1
+                            t[w] += 1
+        return dict(enumerate(t))
+
+    def connected_components(self):
+        """
+        Yields the node set of each connected component.
+        """
+        seen = np.zeros(self.n, dtype=bool)
+        for source in range(self.n):
+            if not seen[source]:
+                seen[source] = True
+                component = {source}
+                queue = deque([source])
+                while queue:
+                    for w in self.neighbors(queue.popleft()):
+                        if not seen[w]:
+                            seen[w] = True
+                            component.add(w)
+                            queue.append(w)
+                yield component
+
+    def has_path(self, source, target):
+        seen = {source}
+        queue = deque([source])
+        while queue:
+            node = queue.popleft()
+            if node == target:
+                return True
+            for w in self.neighbors(node):
+                if w not in seen:
+                    seen.add(w)
+                    queue.append(w)
+        return False
+
+
+def _triangles(G):
+    if isinstance(G, CompactGraph):
+        return G.triangles()
+    return nx.triangles(G)
+
+
+def _connected_components(G):
+    if isinstance(G, CompactGraph):
+        return G.connected_components()
+    return nx.connected_components(G)
+
+
+def _has_path(G, source, target):
+    if isinstance(G, CompactGraph):
+        return G.has_path(source, target)
+    return nx.has_path(G, source, target)
+
+
+def _set_edges(G, edges):
+    """
+    Replaces the edges of G by an (m, 2) array of positions in 
+    list(G.nodes()) with the same degree sequence. A networkx graph only 
+    has the edges that differ removed and added.
+    """
+    if isinstance(G, CompactGraph):
+        G.set_edge_array(edges)
+    else:
+        nodes = list(G.nodes())
+        CompactGraph.from_edge_array(len(nodes), edges, nodes).to_networkx(G)
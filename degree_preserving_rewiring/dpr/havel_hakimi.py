@@ -11,7 +11,9 @@ import numpy as np
 import pandas as pd
 import time
 import random
-from .rewiring_helpers import degree_list, check_new_edges 
+import warnings
+from collections import defaultdict, deque
+from .rewiring_helpers import degree_list, check_new_edges, AssortativityTracker, EdgeIndex, record_row
 
 def havel_hakimi_positive(
     G: nx.Graph, 
@@ -19,23 +21,33 @@ def havel_hakimi_positive(
     name, 
     sample_size, 
     return_type, 
-    max_time = 600):
+    max_time = 600,
+    tracker = None,
+    profiler = None):
     
     """
     removes every edge from the graph and adds them back ordered in such a way
     to maximise the assortativity.
 
     Parameters:
-      G: nx.Graph
+      G: nx.Graph or CompactGraph
         graph to be rewired
 
-      results: pandas.DataFrame
-        results dataframe to be passed to function requiring the columns assigned
+      results: ResultsRecorder or pandas.DataFrame
+        results to be passed to function requiring the columns assigned
         in the rewiring function above
 
       sample_size: int
         number of edges to be rewired. Relevant only for passing the result of this 
         function to another
+
+      tracker: AssortativityTracker, optional
+        tracker holding the current assortativity of G, updated as edges are 
+        rewired. A new one is created if None.
+
+      profiler: PhaseProfiler, optional
+        accumulates the time spent building the new edges, rewiring G, 
+        repairing the degree sequence and logging. Disabled if None.
     
     Returns:
     --------
@@ -49,18 +61,22 @@ def havel_hakimi_positive(
     itr = 1
     before = degree_list(G)    
     alg_start = time.time()    
+    if profiler is not None:
+        profiler.start()
+    if tracker is None:
+        tracker = AssortativityTracker(G)
     edges_to_remove = list(G.edges())                
      
     #record the orginal degree of each node
     original_degree = {}
     remaining_degree = {}
-    nodes = []
     for edge in edges_to_remove:
         for node in edge:
-            if node not in nodes:
-                nodes.append(node)
-            original_degree[node] = G.degree(node)
-            remaining_degree[node] = original_degree[node]
+            if node not in original_degree:
+                original_degree[node] = G.degree(node)
+                remaining_degree[node] = original_degree[node]
+    #nodes in order of first appearance in the edge list
+    nodes = list(original_degree)
     #sort nodes in descending order of degree
     nodes = sorted(nodes, key=original_degree.get, reverse=True)
     target_nodes = nodes
@@ -75,6 +91,7 @@ def havel_hakimi_positive(
            'duplicate_edges': 0, 
            'self_edges': 0,
            'existing_edges': 0, 
+           'repaired_edges': 0,
            'preserved': True,
            'method': 'max',
            'summary': False}
@@ -85,40 +102,46 @@ def havel_hakimi_positive(
         new_neighbors[node] = set()
 
 
-    for node in nodes:
-        for target in target_nodes:
-            if remaining_degree[node] > 0:
-                if remaining_degree[target] > 0:
-                    if node != target:
-                        new_neighbors[node].add(target)
-                        new_neighbors[target].add(node)
-                        remaining_degree[node] -= 1
-                        remaining_degree[target] -= 1
-
-
-        # target_nodes = sorted(target_nodes, key=remaining_degree.get, reverse=True)
+    _match_positive(nodes, remaining_degree, new_neighbors)
     
     edges_to_add = []
     for node in new_neighbors:
         for target in new_neighbors[node]:
             edges_to_add.append([node, target])
+    if profiler is not None:
+        profiler.lap('havel_hakimi_positive', 'construction')
     
     G.remove_edges_from(edges_to_remove)
     G.add_edges_from(edges_to_add)
+    tracker.remove_edges(edges_to_remove)
+    tracker.add_edges(G.edges())
+    if profiler is not None:
+        profiler.lap('havel_hakimi_positive', 'mutation')
     row['edges_rewired'] += len(edges_to_add)
-    row['r'] += nx.degree_assortativity_coefficient(G)
     row['time'] += time.time() - alg_start
     after = degree_list(G)
     row['preserved'] = list(before) == list(after)
-    results.loc[len(results)] = row
-    
-    edges = list(G.edges())
+    # the tracker holds the original degrees, so only matches G once the 
+    # degree sequence is restored
+    if row['preserved']:
+        row['r'] += tracker.r
+    else:
+        row['r'] += AssortativityTracker(G).r
+    record_row(results, row)
+    if profiler is not None:
+        profiler.lap('havel_hakimi_positive', 'logging')
     
-    #check to ensure that we have maintained the degree sequence
-    success = True
+    #check to ensure that we have maintained the degree sequence, keeping 
+    #the missing degree of each node up to date from here on
+    deficit = {}
     for node in original_degree:
         if G.degree(node) < original_degree[node]:
-            success = False
+            deficit[node] = original_degree[node] - G.degree(node)
+    success = not deficit
+    #only needed by the repair below
+    edge_pool = EdgeIndex(G.edges()) if deficit else None
+    if profiler is not None:
+        profiler.lap('havel_hakimi_positive', 'repair_scan')
 
     #if degree sequence has not been maintained, find the nodes with incorrect
     #degree and remove edges to rewire to them
@@ -136,72 +159,36 @@ def havel_hakimi_positive(
                'duplicate_edges': 0, 
                'self_edges': 0,
                'existing_edges': 0, 
+               'repaired_edges': 0,
                'preserved': True,
                'method': 'max',
                'summary': False}
 
-        affected_nodes = []
-        missing_degree = {}
-        
-        for node in original_degree:
-            if G.degree(node) != original_degree[node]:
-                missing_degree[node] = original_degree[node] - G.degree(node)
-                affected_nodes.append(node)
-        
-        for node in affected_nodes:
-            available_edges = 0
-            for target in affected_nodes:
-                if target != node:
-                    if target not in new_neighbors[node]:
-                        available_edges += 1
-    
-        stubs1 = []
-        stubs2 = []
-        for node in missing_degree:
-            j = 0
-            while j < missing_degree[node]:
-                stubs1.append(node)
-                j += 1
-
-        edges = list(G.edges())
-        while len(stubs2) < len(stubs1):
-            edge_to_remove = random.choice(edges)
-            if edge_to_remove[0] not in stubs1:
-                if edge_to_remove[1] not in stubs1:
-                    if G.has_edge(edge_to_remove[0], edge_to_remove[1]) == True:
-                        stubs2.append(edge_to_remove[0])
-                        stubs2.append(edge_to_remove[1])
-                        G.remove_edge(edge_to_remove[0], edge_to_remove[1])
-            edges.remove(edge_to_remove)
-
-        stubs1 = sorted(stubs1, key = original_degree.get, reverse=False)
-        stubs2 = sorted(stubs2, key = original_degree.get, reverse=False)
-        for u, v in zip(stubs1, stubs2):
-            G.add_edge(u, v)
-            row['edges_rewired'] += 1
-        
-        fails = 0
-        for node in original_degree:
-            if G.degree(node) != original_degree[node]:
-                fails += 1
-        
-        if fails > 0:
-            success = False
-        else:
-            success = True
+        rewired = _repair_round(G, edge_pool, deficit, original_degree, tracker, False,
+                                profiler, 'havel_hakimi_positive')
+        if rewired is None:
+            warnings.warn('no edges left to free stubs for the degree repair', RuntimeWarning)
+            break
+        row['edges_rewired'] += rewired
+        success = not deficit
     
-        row['r'] += nx.degree_assortativity_coefficient(G)
         row['time'] += time.time() - start
-        after = degree_list(G)
-        row['preserved'] = list(before) == list(after)
-        results.loc[len(results)] = row
+        row['preserved'] = success
+        if row['preserved']:
+            row['r'] += tracker.r
+        else:
+            row['r'] += AssortativityTracker(G).r
+        record_row(results, row)
         if return_type == 'full':
-            results.loc[len(results)] = row
+            record_row(results, row)
+
+        if profiler is not None:
+            profiler.lap('havel_hakimi_positive', 'logging')
 
         if time.time() - alg_start > max_time:
             break
 
-        results.loc[len(results)] = row
+        record_row(results, row)
     return G
 
 def havel_hakimi_negative(
@@ -210,7 +197,9 @@ def havel_hakimi_negative(
     name, 
     sample_size, 
     return_type, 
-    max_time = 600):
+    max_time = 600,
+    tracker = None,
+    profiler = None):
     
     """
     removes every edge from the graph and adds them back ordered in such a way
@@ -218,17 +207,25 @@ def havel_hakimi_negative(
 
     Parameters:
     -----------
-      G: nx.Graph
+      G: nx.Graph or CompactGraph
         graph to be rewired
 
-      results: pandas.DataFrame
-        results dataframe to be passed to function requiring the columns assigned
+      results: ResultsRecorder or pandas.DataFrame
+        results to be passed to function requiring the columns assigned
         in the rewiring function above
 
       sample_size: int
         number of edges to be rewired. Relevant only for passing the result of this 
         function to another
 
+      tracker: AssortativityTracker, optional
+        tracker holding the current assortativity of G, updated as edges are 
+        rewired. A new one is created if None.
+
+      profiler: PhaseProfiler, optional
+        accumulates the time spent building the new edges, rewiring G, 
+        repairing the degree sequence and logging. Disabled if None.
+
     Returns:
     --------
       G: nx.Graph
@@ -240,18 +237,22 @@ def havel_hakimi_negative(
     """
     before = degree_list(G)    
     alg_start = time.time()    
+    if profiler is not None:
+        profiler.start()
+    if tracker is None:
+        tracker = AssortativityTracker(G)
     edges_to_remove = list(G.edges())                
     itr = 1
     #record the orginal degree of each node
     original_degree = {}
     remaining_degree = {}
-    nodes = []
     for edge in edges_to_remove:
         for node in edge:
-            if node not in nodes:
-                nodes.append(node)
-            original_degree[node] = G.degree(node)
-            remaining_degree[node] = original_degree[node]
+            if node not in original_degree:
+                original_degree[node] = G.degree(node)
+                remaining_degree[node] = original_degree[node]
+    #nodes in order of first appearance in the edge list
+    nodes = list(original_degree)
     
 
     #sort nodes in descending order of degree
@@ -267,6 +268,7 @@ def havel_hakimi_negative(
            'duplicate_edges': 0, 
            'self_edges': 0,
            'existing_edges': 0, 
+           'repaired_edges': 0,
            'preserved': True,
            'method': 'max',
            'summary': False}
@@ -276,43 +278,51 @@ def havel_hakimi_negative(
     for node in original_degree:
         new_neighbors[node] = set() 
 
-    edges_to_add = []
-    
-    for node in nodes:
-        for target in target_nodes:
-            if remaining_degree[node] > 0:
-                if remaining_degree[target] > 0:
-                    if node != target:
-                        new_neighbors[node].add(target)
-                        new_neighbors[target].add(node)
-                        remaining_degree[node] -= 1
-                        remaining_degree[target] -= 1
-
-
-        target_nodes = sorted(target_nodes, key=remaining_degree.get, reverse=True)
+    _match_negative(nodes, target_nodes, remaining_degree, new_neighbors)
     
     edges_to_add = []
     for node in new_neighbors:
         for target in new_neighbors[node]:
             edge = [node, target]
             edges_to_add.append([node, target])
+    if profiler is not None:
+        profiler.lap('havel_hakimi_negative', 'construction')
     
     G.remove_edges_from(edges_to_remove)
     G.add_edges_from(edges_to_add)
+    tracker.remove_edges(edges_to_remove)
+    tracker.add_edges(G.edges())
+    if profiler is not None:
+        profiler.lap('havel_hakimi_negative', 'mutation')
     row['edges_rewired'] += len(edges_to_add) 
-    row['r'] += nx.degree_assortativity_coefficient(G)
     row['time'] += time.time() - alg_start
     after = degree_list(G)
     row['preserved'] = list(before) == list(after)
-    results.loc[len(results)] = row
-    
-    edges = list(G.edges())
+    # the tracker holds the original degrees, so only matches G once the 
+    # degree sequence is restored
+    if row['preserved']:
+        row['r'] += tracker.r
+    else:
+        row['r'] += AssortativityTracker(G).r
+    record_row(results, row)
+    if profiler is not None:
+        profiler.lap('havel_hakimi_negative', 'logging')
     
-    success = True
+    #check to ensure that we have maintained the degree sequence, keeping 
+    #the missing degree of each node up to date from here on
+    deficit = {}
     for node in original_degree:
         if G.degree(node) < original_degree[node]:
-            success = False
+            deficit[node] = original_degree[node] - G.degree(node)
+    success = not deficit
+    #only needed by the repair below
+    edge_pool = EdgeIndex(G.edges()) if deficit else None
+    if profiler is not None:
+        profiler.lap('havel_hakimi_negative', 'repair_scan')
 
+    #if degree sequence has not been maintained, find the nodes with incorrect
+    #degree and remove edges to rewire to them
+    
     while success == False:
         itr += 1
         start = time.time()
@@ -326,70 +336,227 @@ def havel_hakimi_negative(
                'duplicate_edges': 0, 
                'self_edges': 0,
                'existing_edges': 0, 
+               'repaired_edges': 0,
                'preserved': True,
                'method': 'max',
                'summary': False}
 
-        affected_nodes = []
-        missing_degree = {}
-        for node in original_degree:
-            if G.degree(node) != original_degree[node]:
-                missing_degree[node] = original_degree[node] - G.degree(node)
-                affected_nodes.append(node)
-   
-        for node in affected_nodes:
-            available_edges = 0
-            for target in affected_nodes:
-                if target != node:
-                    if target not in new_neighbors[node]:
-                        available_edges += 1
+        rewired = _repair_round(G, edge_pool, deficit, original_degree, tracker, True,
+                                profiler, 'havel_hakimi_negative')
+        if rewired is None:
+            warnings.warn('no edges left to free stubs for the degree repair', RuntimeWarning)
+            break
+        row['edges_rewired'] += rewired
+        success = not deficit
     
-        stubs1 = []
-        stubs2 = []
-        for node in missing_degree:
-            j = 0
-            while j < missing_degree[node]:
-                stubs1.append(node)
-                j += 1
-       
-        edges = list(G.edges())
-        while len(stubs2) < len(stubs1):
-            edge_to_remove = random.choice(edges)
-            if edge_to_remove[0] not in stubs1:
-                if edge_to_remove[1] not in stubs1:
-                    if G.has_edge(edge_to_remove[0], edge_to_remove[1]) == True:
-                        stubs2.append(edge_to_remove[0])
-                        stubs2.append(edge_to_remove[1])
-                        G.remove_edge(edge_to_remove[0], edge_to_remove[1])
-            edges.remove(edge_to_remove)
-
-        stubs1 = sorted(stubs1, key = original_degree.get, reverse=False)
-        stubs2 = sorted(stubs2, key = original_degree.get, reverse=True)
-        for u, v in zip(stubs1, stubs2):
-            G.add_edge(u, v)
-            row['edges_rewired'] += 1 
-        
-        fails = 0
-        for node in original_degree:
-            if G.degree(node) != original_degree[node]:
-                fails += 1
-        
-        if fails > 0:
-            success = False
-        else:
-            success = True
-         
-        row['r'] += nx.degree_assortativity_coefficient(G)
         row['time'] += time.time() - start
-        after = degree_list(G)
-        row['preserved'] = list(before) == list(after)
+        row['preserved'] = success
+        if row['preserved']:
+            row['r'] += tracker.r
+        else:
+            row['r'] += AssortativityTracker(G).r
         if return_type == 'full':
-            results.loc[len(results)] = row
+            record_row(results, row)
+
+        if profiler is not None:
+            profiler.lap('havel_hakimi_negative', 'logging')
 
         if time.time() - alg_start > max_time:
             break
     
-        results.loc[len(results)] = row
+        record_row(results, row)
     
     return G
 
+
+def _match_positive(nodes, remaining_degree, new_neighbors):
+    """
+    Greedy matching of havel_hakimi_positive. Each node in turn, in the 
+    order of nodes (descending degree), is joined to the first nodes in 
+    that same order that still have remaining degree, until its own runs 
+    out.
+
+    The nodes with remaining degree are kept in a linked list, so each step
+    only visits the nodes it joins to (plus itself), and the whole matching
+    is O(m) rather than O(n^2). As in the original double loop, joining two
+    nodes that are already neighbours still uses up a stub of each; the 
+    repair phase restores the degrees afterwards.
+
+    remaining_degree and new_neighbors are updated in place.
+    """
+    n = len(nodes)
+    #next_alive[i] is the next position in nodes with remaining degree; n ends the list
+    next_alive = list(range(1, n + 1))
+    prev_alive = list(range(-1, n - 1))
+    head = 0
+
+    def unlink(i):
+        nonlocal head
+        if prev_alive[i] == -1:
+            head = next_alive[i]
+        else:
+            next_alive[prev_alive[i]] = next_alive[i]
+        if next_alive[i] < n:
+            prev_alive[next_alive[i]] = prev_alive[i]
+
+    for i, node in enumerate(nodes):
+        if remaining_degree[node] == 0:
+            continue
+        j = head
+        while remaining_degree[node] > 0 and j < n:
+            target = nodes[j]
+            following = next_alive[j]
+            if target != node:
+                new_neighbors[node].add(target)
+                new_neighbors[target].add(node)
+                remaining_degree[node] -= 1
+                remaining_degree[target] -= 1
+                if remaining_degree[target] == 0:
+                    unlink(j)
+            j = following
+        if remaining_degree[node] == 0:
+            unlink(i)
+
+
+def _match_negative(nodes, target_nodes, remaining_degree, new_neighbors):
+    """
+    Greedy matching of havel_hakimi_negative. Each node in turn, in the 
+    order of nodes (ascending degree), is joined to the first nodes of 
+    target_nodes that still have remaining degree, until its own runs out; 
+    target_nodes is then stably re-sorted by remaining degree, descending.
+
+    Rather than re-sorting, targets are kept in one deque per remaining 
+    degree, whose concatenation from the highest degree down is exactly the
+    re-sorted list. A step takes its targets from the front, and the stable
+    sort puts each target whose remaining degree drops from d to d-1 in 
+    front of the nodes already at d-1, in its previous order, so the moved 
+    targets are pushed back onto the front of the next deque down. The 
+    node's own entry is invalidated with a stamp and reinserted where the 
+    stable sort would put it. The matching is O(m + n*d_max) rather than 
+    O(n^2 log n) and produces the same neighbour sets.
+
+    remaining_degree and new_neighbors are updated in place.
+    """
+    buckets = defaultdict(deque)
+    stamp = {}
+    for node in target_nodes:
+        stamp[node] = 0
+        if remaining_degree[node] > 0:
+            buckets[remaining_degree[node]].append((node, 0))
+    top = max(buckets, default=0)
+
+    for node in nodes:
+        degree = remaining_degree[node]
+        if degree == 0:
+            continue
+        #targets taken, with their remaining degree before this step
+        taken = []
+        seen_after = None
+        d = top
+        while len(taken) < degree and d > 0:
+            bucket = buckets.get(d)
+            while bucket and len(taken) < degree:
+                target, target_stamp = bucket.popleft()
+                if stamp[target] != target_stamp:
+                    continue
+                if target == node:
+                    seen_after = len(taken)
+                    continue
+                taken.append((target, d))
+            d -= 1
+        while top > 0 and not buckets.get(top):
+            top -= 1
+
+        for target, _ in taken:
+            new_neighbors[node].add(target)
+            new_neighbors[target].add(node)
+            remaining_degree[target] -= 1
+        remaining_degree[node] -= len(taken)
+
+        #the moved targets, in order, by the deque they now belong to
+        fronts = defaultdict(list)
+        for target, d in taken:
+            if d > 1:
+                fronts[d - 1].append(target)
+        if not taken and seen_after is None:
+            continue
+        stamp[node] += 1
+        new_degree = remaining_degree[node]
+        if new_degree > 0:
+            #place the node by its position in the previous order
+            front = fronts[new_degree]
+            if degree > new_degree + 1:
+                front.insert(0, node)
+            elif seen_after is None:
+                front.append(node)
+            else:
+                position = sum(1 for _, d in taken[:seen_after] if d == degree)
+                front.insert(position, node)
+        for d, front in fronts.items():
+            buckets[d].extendleft((target, stamp[target]) for target in reversed(front))
+            top = max(top, d)
+
+
+def _repair_round(G, edge_pool, deficit, original_degree, tracker, reverse, profiler=None, 
+                  algorithm=None):
+    """
+    One round of the degree repair of the Havel-Hakimi functions.
+
+    Each missing stub of a node in deficit (node -> missing degree) is 
+    freed a partner by removing a random edge of edge_pool whose endpoints 
+    both have full degree; edges touching a deficient node are set aside 
+    for the round, so each is drawn at most once. The stubs are then joined
+    in order of original degree, ascending, to the freed endpoints, sorted 
+    ascending, or descending if reverse. A join that would repeat an 
+    existing edge is skipped, leaving the stubs for the next round.
+
+    G, edge_pool (an EdgeIndex of G's edges), deficit and tracker are 
+    updated in place, so a round costs time linear in the number of stubs
+    and edges drawn rather than in the size of the graph.
+
+    Returns the number of stubs joined (skipped joins included), or None if
+    the pool ran out of edges to free.
+    """
+    stubs1 = [node for node, missing in deficit.items() for _ in range(missing)]
+    stub_nodes = set(deficit)
+    stubs2 = []
+    set_aside = []
+    if profiler is not None:
+        profiler.lap(algorithm, 'repair_scan')
+    while len(stubs2) < len(stubs1):
+        if len(edge_pool) == 0:
+            edge_pool.add_edges_from(set_aside)
+            return None
+        edge = edge_pool.sample(1)[0]
+        edge_pool.remove(edge)
+        u, v = edge
+        if u in stub_nodes or v in stub_nodes:
+            set_aside.append(edge)
+            continue
+        G.remove_edge(u, v)
+        tracker.remove_edges([edge])
+        stubs2.append(u)
+        stubs2.append(v)
+        deficit[u] = deficit.get(u, 0) + 1
+        deficit[v] = deficit.get(v, 0) + 1
+    edge_pool.add_edges_from(set_aside)
+    if profiler is not None:
+        profiler.lap(algorithm, 'repair_stubs')
+
+    stubs1 = sorted(stubs1, key = original_degree.get, reverse=False)
+    stubs2 = sorted(stubs2, key = original_degree.get, reverse=reverse)
+    joined = 0
+    for u, v in zip(stubs1, stubs2):
+        if not G.has_edge(u, v):
+            tracker.add_edges([(u, v)])
+            G.add_edge(u, v)
+            edge_pool.add((u, v))
+            for node in (u, v):
+                deficit[node] -= 1
+                if deficit[node] == 0:
+                    del deficit[node]
+        joined += 1
+    if profiler is not None:
+        profiler.lap(algorithm, 'repair_rewire')
+
+    return joined
@@ -10,9 +10,13 @@ import numpy as np
 import pandas as pd
 import time
 import random
+import math
+import warnings
 from collections import defaultdict
 from .havel_hakimi import havel_hakimi_positive, havel_hakimi_negative
-from .rewiring_helpers import degree_list, check_new_edges, test_sample_sizes
+from .rewiring_helpers import degree_list, check_new_edges, test_sample_sizes, EdgeIndex, record_row, record_rows, AssortativityTracker
+from .compact_graph import CompactGraph, _triangles, _set_edges
+from .swap_kernel import HAVE_NUMBA, build_neighbour_arrays, _clustering_chunk, _seed, _use_jit
 
 def reduce_clustering(
     G: nx.Graph,
@@ -23,7 +27,15 @@ def reduce_clustering(
     max_consecutive_failures=10000,
     timed=False,
     time_limit=600,
-    log_failures=False):
+    log_failures=False,
+    backend='networkx',
+    profiler=None,
+    jit=None,
+    metric='average',
+    proposal='uniform',
+    endgame=None,
+    endgame_window=1000,
+    endgame_budget=10**6):
     """
     Reduces the clustering coefficient of G using same-degree neighbor swaps.
 
@@ -39,11 +51,12 @@ def reduce_clustering(
         Graph to rewire (modified in place).
     name : str
         Name recorded in the results DataFrame.
-    results : pandas.DataFrame
-        Results DataFrame; one row appended per accepted swap (and per failed
+    results : ResultsRecorder or pandas.DataFrame
+        Results to be added to; one row appended per accepted swap (and per failed
         attempt if log_failures is True).
     target_clustering : float, optional
-        Stop once nx.transitivity(G) <= target_clustering. Disabled if None.
+        Stop once the clustering metric is <= target_clustering. Disabled 
+        if None.
     max_iterations : int, optional
         Stop after this many iterations (attempted + accepted). Disabled if None.
     max_consecutive_failures : int
@@ -54,13 +67,69 @@ def reduce_clustering(
         Time limit in seconds.
     log_failures : bool
         If True, log every attempt; if False, log only accepted swaps.
+    backend : str
+        'networkx' to rewire G directly, or 'compact' to convert G to a 
+        CompactGraph, rewire that, and write the edges back into G at the end.
+    profiler : PhaseProfiler, optional
+        Accumulates the time spent sampling swaps, computing triangle deltas,
+        mutating the graph and logging, and counts accepted swaps and 
+        rejections. Disabled if None.
+    jit : bool, optional
+        If True, run the loop on the compiled kernel in swap_kernel, which 
+        keeps sorted int32 neighbour arrays and scores and applies swaps 
+        without allocating. Every proposal gets the same decision as in the
+        Python loop, but the kernel has its own random stream, so the 
+        trajectory, and so the result for a given seed, differs. True 
+        requires the kernel, None uses it if numba is installed and the 
+        other options allow it. The default is None.
+    metric : str
+        Clustering metric that swaps must reduce and target_clustering 
+        applies to: 'average' for the average local clustering (as 
+        nx.average_clustering), or 'transitivity' for the global 
+        transitivity (as nx.transitivity). Both are tracked incrementally
+        from the per-node triangle counts; the number of connected triples
+        only depends on the degrees, so it never changes.
+    proposal : str
+        'uniform' picks the degree class of u uniformly from the classes 
+        with at least two nodes. 'triangles' picks u with probability 
+        proportional to its triangle count, then v uniformly from u's 
+        class, which concentrates proposals where triangles are left.
+    endgame : float, optional
+        Acceptance rate below which the random proposals give way to an
+        exhaustive search. The rate is measured over blocks of 
+        endgame_window iterations. The search sweeps every swap that could 
+        remove a triangle, accepting improving ones, until a sweep finds 
+        none, so the run ends at a proven local minimum instead of after 
+        max_consecutive_failures. Disabled if None.
+    endgame_window : int
+        Number of iterations per acceptance rate measurement.
+    endgame_budget : int, optional
+        Maximum number of swaps the exhaustive search evaluates. A sweep 
+        costs about (edges on triangles) x (size of their degree class) x 
+        (degree) evaluations, which grows quickly with the graph, so the 
+        search stops at the budget, without the local minimum proof, if it
+        has not finished by then. Unlimited if None. The default is 10**6.
 
     Returns
     -------
     G : nx.Graph
         Rewired graph.
     """
+    if backend == 'compact' and not isinstance(G, CompactGraph):
+        H = reduce_clustering(CompactGraph.from_networkx(G), name, results, target_clustering,
+                              max_iterations, max_consecutive_failures, timed, time_limit,
+                              log_failures, profiler=profiler, jit=jit, metric=metric,
+                              proposal=proposal, endgame=endgame, 
+                              endgame_window=endgame_window, endgame_budget=endgame_budget)
+        return H.to_networkx(G)
+
+    if metric not in ('average', 'transitivity'):
+        raise ValueError(f"metric must be 'average' or 'transitivity', not {metric!r}")
+    if proposal not in ('uniform', 'triangles'):
+        raise ValueError(f"proposal must be 'uniform' or 'triangles', not {proposal!r}")
     alg_start = time.time()
+    if profiler is not None:
+        profiler.start()
     itr = 0
     consecutive_failures = 0
 
@@ -74,7 +143,7 @@ def reduce_clustering(
 
     # Same-degree neighbour swaps preserve degrees exactly, so assortativity
     # and each node's 1/C(d_v,2) weight are invariants.
-    r_invariant = nx.degree_assortativity_coefficient(G)
+    r_invariant = AssortativityTracker(G).r
 
     n_nodes = G.number_of_nodes()
     degrees = dict(G.degree())
@@ -84,11 +153,33 @@ def reduce_clustering(
         inv_weight[node] = (2.0 / (n_nodes * d * (d - 1))) if d >= 2 else 0.0
 
     # Per-node triangle counts; maintained incrementally thereafter.
-    t = nx.triangles(G)
+    t = _triangles(G)
     C_avg = sum(t[v] * inv_weight[v] for v in t)
+    # Connected triples, sum_v C(d_v,2), are fixed by the degrees.
+    triples = sum(d * (d - 1) / 2 for d in degrees.values())
+    T = sum(t.values()) / triples if triples else 0.0
+    transitivity = metric == 'transitivity'
+
+    if _use_jit(jit, proposal == 'uniform' and endgame is None, "proposal='triangles' or endgame"):
+        return _reduce_clustering_jit(G, name, results, True, target_clustering, max_iterations,
+                                      max_consecutive_failures, timed, time_limit, log_failures,
+                                      r_invariant, inv_weight, t, C_avg, T, triples, 
+                                      transitivity, degree_classes, usable_degrees, alg_start,
+                                      profiler)
 
     # Cache neighbour sets; update only the four touched nodes per accepted swap.
     neighbours = {n: set(G.neighbors(n)) for n in G.nodes()}
+    # Lists of the same neighbours, to draw b and y from in O(1). A swap 
+    # replaces one neighbour of each touched node, so they are edited in place.
+    neighbour_lists = {n: list(N) for n, N in neighbours.items()}
+
+    if proposal == 'triangles':
+        # Nodes of usable classes, drawn as u with probability ∝ t[u].
+        sampler = _WeightedSampler([n for d in usable_degrees for n in degree_classes[d]], t)
+    block_accepted = 0
+
+    if profiler is not None:
+        profiler.lap('reduce_clustering', 'setup')
 
     while True:
         loop_start = time.time()
@@ -101,103 +192,78 @@ def reduce_clustering(
         if timed and (time.time() - alg_start) > time_limit:
             print(f'exiting due to max time reached, took {time.time() - alg_start}')
             break
-        if target_clustering is not None and C_avg <= target_clustering:
+        if target_clustering is not None and (T if transitivity else C_avg) <= target_clustering:
             print(f'exiting due to target reached, took {time.time() - alg_start}')
             break
+        if proposal == 'triangles' and sampler.total == 0:
+            print(f'exiting due to no triangles left, took {time.time() - alg_start}')
+            break
+        if endgame is not None and itr and itr % endgame_window == 0:
+            if block_accepted < endgame * endgame_window:
+                state = _endgame(G, neighbours, t, inv_weight, degree_classes, transitivity, 
+                                 name, results, r_invariant, itr, alg_start, target_clustering,
+                                 max_iterations, timed, time_limit, log_failures, C_avg, T, 
+                                 triples, endgame_budget, profiler)
+                itr, C_avg, T = state
+                break
+            block_accepted = 0
 
         itr += 1
         accepted = False
         reason = None
 
-        degree = random.choice(usable_degrees)
-        u, v = random.sample(degree_classes[degree], 2)
+        if proposal == 'triangles':
+            u = sampler.sample()
+            v = random.choice(degree_classes[degrees[u]])
+            while v == u:
+                v = random.choice(degree_classes[degrees[u]])
+        else:
+            degree = random.choice(usable_degrees)
+            u, v = random.sample(degree_classes[degree], 2)
 
         N_u = neighbours[u]
         N_v = neighbours[v]
         if not N_u or not N_v:
             consecutive_failures += 1
         else:
-            b = random.choice(tuple(N_u))
-            y = random.choice(tuple(N_v))
+            b = random.choice(neighbour_lists[u])
+            y = random.choice(neighbour_lists[v])
+            if profiler is not None:
+                profiler.lap('reduce_clustering', 'sampling')
 
-            if b == y or b == v or y == u:
-                reason = 'self_edges'
-                consecutive_failures += 1
-            elif b in N_v or y in N_u:
-                reason = 'existing_edges'
+            reason, W, dC, d_triangles = _swap_delta(neighbours, inv_weight, u, b, v, y)
+            if reason is not None:
                 consecutive_failures += 1
             else:
-                N_b = neighbours[b]
-                N_y = neighbours[y]
-
-                # Enumerate affected triangles as sets of third-vertices w.
-                # Destroyed: (u,b,w) for w ∈ W_ub, and (v,y,w) for w ∈ W_vy.
-                W_ub = N_u & N_b
-                W_vy = N_v & N_y
-                # Created: (v,b,w) and (u,y,w). Pre-swap N(v)∩N(b) may include
-                # u (if u∈N_v) or y (if y∈N_b) — neither forms a post-swap
-                # triangle because (u,b) and (v,y) are gone. Same for N(u)∩N(y)
-                # with v and b. Exclude them.
-                W_vb = (N_v & N_b) - {u, y}
-                W_uy = (N_u & N_y) - {v, b}
-
-                # ΔC_avg = sum_v (Δt_v) * inv_weight[v].
-                # Each triangle contributes -1/+1 to all three of its vertices.
-                dC = 0.0
-                if W_ub:
-                    s_w = sum(inv_weight[w] for w in W_ub)
-                    dC -= len(W_ub) * (inv_weight[u] + inv_weight[b]) + s_w
-                if W_vy:
-                    s_w = sum(inv_weight[w] for w in W_vy)
-                    dC -= len(W_vy) * (inv_weight[v] + inv_weight[y]) + s_w
-                if W_vb:
-                    s_w = sum(inv_weight[w] for w in W_vb)
-                    dC += len(W_vb) * (inv_weight[v] + inv_weight[b]) + s_w
-                if W_uy:
-                    s_w = sum(inv_weight[w] for w in W_uy)
-                    dC += len(W_uy) * (inv_weight[u] + inv_weight[y]) + s_w
-
-                if dC < 0:
-                    G.remove_edge(u, b)
-                    G.remove_edge(v, y)
-                    G.add_edge(v, b)
-                    G.add_edge(u, y)
-                    N_u.discard(b); N_u.add(y)
-                    N_v.discard(y); N_v.add(b)
-                    N_b.discard(u); N_b.add(v)
-                    N_y.discard(v); N_y.add(u)
-
-                    # Update per-node triangle counts.
-                    for w in W_ub:
-                        t[u] -= 1; t[b] -= 1; t[w] -= 1
-                    for w in W_vy:
-                        t[v] -= 1; t[y] -= 1; t[w] -= 1
-                    for w in W_vb:
-                        t[v] += 1; t[b] += 1; t[w] += 1
-                    for w in W_uy:
-                        t[u] += 1; t[y] += 1; t[w] += 1
-
+                if profiler is not None:
+                    profiler.lap('reduce_clustering', 'triangle_delta')
+
+                if (d_triangles < 0 if transitivity else dC < 0):
+                    _apply_swap(G, neighbours, t, u, b, v, y, W)
+                    for x, old, new in ((u, b, y), (v, y, b), (b, u, v), (y, v, u)):
+                        row = neighbour_lists[x]
+                        row[row.index(old)] = new
+                    if proposal == 'triangles':
+                        for node in {u, b, v, y}.union(*W):
+                            sampler.update(node, t[node])
                     C_avg += dC
+                    T += 3 * d_triangles / triples
                     accepted = True
+                    block_accepted += 1
                     consecutive_failures = 0
+                    if profiler is not None:
+                        profiler.lap('reduce_clustering', 'mutation')
                 else:
                     consecutive_failures += 1
 
         if accepted or log_failures:
-            row = {'name': name,
-                   'iteration': itr,
-                   'time': time.time() - loop_start,
-                   'r': r_invariant,
-                   'target_r': 0,
-                   'sample_size': 2,
-                   'edges_rewired': 2 if accepted else 0,
-                   'duplicate_edges': 0,
-                   'self_edges': 1 if reason == 'self_edges' else 0,
-                   'existing_edges': 1 if reason == 'existing_edges' else 0,
-                   'preserved': True,
-                   'method': 'reduce_clustering',
-                   'summary': False}
-            results.loc[len(results)] = row
+            record_row(results, _clustering_row(name, itr, time.time() - loop_start, r_invariant,
+                                                accepted, reason, 'reduce_clustering'))
+        if profiler is not None:
+            profiler.lap('reduce_clustering', 'logging')
+            profiler.count('reduce_clustering', 'accepted', accepted)
+            if reason is not None:
+                profiler.count('reduce_clustering', reason)
 
     return G
 
@@ -211,7 +277,14 @@ def reduce_clustering_unconstrained(
     max_consecutive_failures=10000,
     timed=False,
     time_limit=600,
-    log_failures=False):
+    log_failures=False,
+    backend='networkx',
+    profiler=None,
+    jit=None,
+    metric='average',
+    temperature=None,
+    cooling=0.9999,
+    best=None):
     """
     Reduces the clustering coefficient of G via double-edge swaps that preserve
     the degree sequence but NOT degree assortativity. Intended as an empirical
@@ -220,10 +293,27 @@ def reduce_clustering_unconstrained(
 
     Two random edges (u, b) and (v, y) are selected; endpoint orientation is
     randomised so both reachable swap outcomes are equally likely. The swap
-    (u, b), (v, y) -> (v, b), (u, y) is accepted iff the exact change in
-    average clustering is strictly negative.
+    (u, b), (v, y) -> (v, b), (u, y) is accepted iff the exact change in the
+    clustering metric (see the metric parameter) is strictly negative.
 
     Parameters match reduce_clustering. See its docstring for column meanings.
+    In addition:
+
+    temperature : float, optional
+        If given, swaps that increase the metric by delta are also accepted
+        with probability exp(-delta / temperature) (simulated annealing), 
+        which lets the run climb out of local minima. The metric is in its
+        own units, so useful temperatures are of the order of the ΔC of a 
+        single swap. Greedy descent if None.
+    cooling : float
+        Factor the temperature is multiplied by after every iteration.
+    best : dict, optional
+        If given, filled with the lowest value of the metric seen during 
+        the run ('value') and the edges of G at that point ('edges'), which
+        with a temperature need not be where the run ends. The swaps 
+        accepted since the lowest point are logged and undone on a copy of
+        the edge list at the end, so no graph is copied during the run. 
+        Left empty by the jit path.
 
     Notes
     -----
@@ -231,7 +321,22 @@ def reduce_clustering_unconstrained(
     function entry only; call nx.degree_assortativity_coefficient(G) on the
     returned graph for the post-run value.
     """
+    if backend == 'compact' and not isinstance(G, CompactGraph):
+        H = reduce_clustering_unconstrained(CompactGraph.from_networkx(G), name, results,
+                                            target_clustering, max_iterations,
+                                            max_consecutive_failures, timed, time_limit,
+                                            log_failures, profiler=profiler, jit=jit, 
+                                            metric=metric, temperature=temperature, 
+                                            cooling=cooling, best=best)
+        if best:
+            best['edges'] = [(H.labels[x], H.labels[z]) for x, z in best['edges']]
+        return H.to_networkx(G)
+
+    if metric not in ('average', 'transitivity'):
+        raise ValueError(f"metric must be 'average' or 'transitivity', not {metric!r}")
     alg_start = time.time()
+    if profiler is not None:
+        profiler.start()
     itr = 0
     consecutive_failures = 0
 
@@ -241,30 +346,28 @@ def reduce_clustering_unconstrained(
     for node, d in degrees.items():
         inv_weight[node] = (2.0 / (n_nodes * d * (d - 1))) if d >= 2 else 0.0
 
-    t = nx.triangles(G)
+    t = _triangles(G)
     C_avg = sum(t[v] * inv_weight[v] for v in t)
+    triples = sum(d * (d - 1) / 2 for d in degrees.values())
+    T = sum(t.values()) / triples if triples else 0.0
+    transitivity = metric == 'transitivity'
+
+    r_start = AssortativityTracker(G).r
+    if _use_jit(jit, temperature is None, 'temperature'):
+        return _reduce_clustering_jit(G, name, results, False, target_clustering, max_iterations,
+                                      max_consecutive_failures, timed, time_limit, log_failures,
+                                      r_start, inv_weight, t, C_avg, T, triples, 
+                                      transitivity, None, None, alg_start, profiler)
 
     neighbours = {n: set(G.neighbors(n)) for n in G.nodes()}
-    r_start = nx.degree_assortativity_coefficient(G)
 
     # Edge list + index map: O(1) uniform sampling and O(1) swap-pop removal.
-    def _canon(a, b):
-        return (a, b) if a <= b else (b, a)
-
-    edge_list = [_canon(u, v) for u, v in G.edges()]
-    edge_index = {e: i for i, e in enumerate(edge_list)}
+    edge_index = EdgeIndex(G.edges())
+    best_value = T if transitivity else C_avg
+    since_best = []
 
-    def _remove_edge(e):
-        i = edge_index.pop(e)
-        last = edge_list[-1]
-        if i != len(edge_list) - 1:
-            edge_list[i] = last
-            edge_index[last] = i
-        edge_list.pop()
-
-    def _add_edge(e):
-        edge_index[e] = len(edge_list)
-        edge_list.append(e)
+    if profiler is not None:
+        profiler.lap('reduce_clustering_unconstrained', 'setup')
 
     while True:
         loop_start = time.time()
@@ -277,7 +380,7 @@ def reduce_clustering_unconstrained(
         if timed and (time.time() - alg_start) > time_limit:
             print(f'exiting due to max time reached, took {time.time() - alg_start}')
             break
-        if target_clustering is not None and C_avg <= target_clustering:
+        if target_clustering is not None and (T if transitivity else C_avg) <= target_clustering:
             print(f'exiting due to target reached, took {time.time() - alg_start}')
             break
 
@@ -285,92 +388,604 @@ def reduce_clustering_unconstrained(
         accepted = False
         reason = None
 
-        e1, e2 = random.sample(edge_list, 2)
+        e1, e2 = edge_index.sample(2)
         u, b = e1
         v, y = e2
         if random.random() < 0.5:
             u, b = b, u
         if random.random() < 0.5:
             v, y = y, v
+        if profiler is not None:
+            profiler.lap('reduce_clustering_unconstrained', 'sampling')
 
-        if u == v or u == y or b == v or b == y:
-            reason = 'self_edges'
+        reason, W, dC, d_triangles = _swap_delta(neighbours, inv_weight, u, b, v, y)
+        if reason is not None:
             consecutive_failures += 1
         else:
-            N_u = neighbours[u]
-            N_v = neighbours[v]
-            N_b = neighbours[b]
-            N_y = neighbours[y]
-
-            if b in N_v or y in N_u:
-                reason = 'existing_edges'
-                consecutive_failures += 1
+            if profiler is not None:
+                profiler.lap('reduce_clustering_unconstrained', 'triangle_delta')
+
+            improving = d_triangles < 0 if transitivity else dC < 0
+            delta = 3 * d_triangles / triples if transitivity else dC
+            if improving or (temperature is not None and delta > 0 and temperature > 0 and
+                             random.random() < math.exp(-delta / temperature)):
+                _apply_swap(G, neighbours, t, u, b, v, y, W)
+                edge_index.remove(e1)
+                edge_index.remove(e2)
+                edge_index.add((v, b))
+                edge_index.add((u, y))
+
+                C_avg += dC
+                T += 3 * d_triangles / triples
+                accepted = True
+                consecutive_failures = 0
+                if best is not None:
+                    if (T if transitivity else C_avg) < best_value:
+                        best_value = T if transitivity else C_avg
+                        since_best.clear()
+                    else:
+                        since_best.append((u, b, v, y))
+                if profiler is not None:
+                    profiler.lap('reduce_clustering_unconstrained', 'mutation')
             else:
-                W_ub = N_u & N_b
-                W_vy = N_v & N_y
-                W_vb = (N_v & N_b) - {u, y}
-                W_uy = (N_u & N_y) - {v, b}
-
-                dC = 0.0
-                if W_ub:
-                    s_w = sum(inv_weight[w] for w in W_ub)
-                    dC -= len(W_ub) * (inv_weight[u] + inv_weight[b]) + s_w
-                if W_vy:
-                    s_w = sum(inv_weight[w] for w in W_vy)
-                    dC -= len(W_vy) * (inv_weight[v] + inv_weight[y]) + s_w
-                if W_vb:
-                    s_w = sum(inv_weight[w] for w in W_vb)
-                    dC += len(W_vb) * (inv_weight[v] + inv_weight[b]) + s_w
-                if W_uy:
-                    s_w = sum(inv_weight[w] for w in W_uy)
-                    dC += len(W_uy) * (inv_weight[u] + inv_weight[y]) + s_w
-
-                if dC < 0:
-                    G.remove_edge(u, b)
-                    G.remove_edge(v, y)
-                    G.add_edge(v, b)
-                    G.add_edge(u, y)
-                    N_u.discard(b); N_u.add(y)
-                    N_v.discard(y); N_v.add(b)
-                    N_b.discard(u); N_b.add(v)
-                    N_y.discard(v); N_y.add(u)
-
-                    for w in W_ub:
-                        t[u] -= 1; t[b] -= 1; t[w] -= 1
-                    for w in W_vy:
-                        t[v] -= 1; t[y] -= 1; t[w] -= 1
-                    for w in W_vb:
-                        t[v] += 1; t[b] += 1; t[w] += 1
-                    for w in W_uy:
-                        t[u] += 1; t[y] += 1; t[w] += 1
-
-                    _remove_edge(e1)
-                    _remove_edge(e2)
-                    _add_edge(_canon(v, b))
-                    _add_edge(_canon(u, y))
-
-                    C_avg += dC
-                    accepted = True
-                    consecutive_failures = 0
-                else:
-                    consecutive_failures += 1
+                consecutive_failures += 1
 
         if accepted or log_failures:
-            row = {'name': name,
-                   'iteration': itr,
-                   'time': time.time() - loop_start,
-                   'r': r_start,
-                   'target_r': 0,
-                   'sample_size': 2,
-                   'edges_rewired': 2 if accepted else 0,
-                   'duplicate_edges': 0,
-                   'self_edges': 1 if reason == 'self_edges' else 0,
-                   'existing_edges': 1 if reason == 'existing_edges' else 0,
-                   'preserved': True,
-                   'method': 'reduce_clustering_unconstrained',
-                   'summary': False}
-            results.loc[len(results)] = row
+            record_row(results, _clustering_row(name, itr, time.time() - loop_start, r_start,
+                                                accepted, reason, 
+                                                'reduce_clustering_unconstrained'))
+        if profiler is not None:
+            profiler.lap('reduce_clustering_unconstrained', 'logging')
+            profiler.count('reduce_clustering_unconstrained', 'accepted', accepted)
+            if reason is not None:
+                profiler.count('reduce_clustering_unconstrained', reason)
+        if temperature is not None:
+            temperature *= cooling
+
+    if best is not None:
+        best_index = EdgeIndex(edge_index.edge_list)
+        for u, b, v, y in reversed(since_best):
+            best_index.remove_edges_from([(v, b), (u, y)])
+            best_index.add_edges_from([(u, b), (v, y)])
+        best['value'] = best_value
+        best['edges'] = best_index.edge_list
+    return G
+
+
+
+
+
+def rewire_joint(
+    G: nx.Graph,
+    target_assortativity,
+    target_clustering,
+    name,
+    results,
+    tol_r=0.01,
+    tol_clustering=0.01,
+    weight=1.0,
+    metric='average',
+    max_iterations=None,
+    max_consecutive_failures=10000,
+    timed=False,
+    time_limit=600,
+    log_failures=False,
+    backend='networkx',
+    profiler=None):
+    """
+    Rewires G towards a degree assortativity and a clustering target at
+    once, using double-edge swaps that preserve the degree sequence.
+
+    Two random edges (u, b) and (v, y) are selected, with endpoint
+    orientation randomised as in reduce_clustering_unconstrained, and the
+    swap (u, b), (v, y) -> (v, b), (u, y) is scored on both its exact Δr,
+    from an AssortativityTracker, and its exact change in the clustering
+    metric, from the same triangle bookkeeping as reduce_clustering. It is
+    accepted iff it reduces
+
+        |r - target_assortativity| + weight * |C - target_clustering|
+
+    so clustering is raised or lowered as the target requires. Being 
+    greedy on the sum, the search can trade one gap for the other and stall
+    with one target met and the other not; if the run stops with either 
+    target outside its tolerance, a warning names the targets missed.
+
+    Parameters
+    ----------
+    G : nx.Graph
+        Graph to rewire (modified in place).
+    target_assortativity : float
+        Target degree assortativity.
+    target_clustering : float
+        Target value of the clustering metric.
+    name : str
+        Name recorded in the results DataFrame.
+    results : ResultsRecorder or pandas.DataFrame
+        Results to be added to; one row appended per accepted swap (and per
+        failed attempt if log_failures is True).
+    tol_r : float
+        Stop once r is within tol_r of target_assortativity and the metric
+        within tol_clustering of target_clustering.
+    tol_clustering : float
+        See tol_r.
+    weight : float
+        Weight of the clustering gap against the assortativity gap, both 
+        in their own units. If the run stops short of the clustering 
+        target, raise it; if it stops short of the assortativity target, 
+        lower it. The default is 1.0.
+    metric : str
+        'average' or 'transitivity', as in reduce_clustering.
+    max_iterations, max_consecutive_failures, timed, time_limit,
+    log_failures, backend, profiler :
+        As in reduce_clustering.
+
+    Returns
+    -------
+    G : nx.Graph
+        Rewired graph.
+    """
+    if backend == 'compact' and not isinstance(G, CompactGraph):
+        H = rewire_joint(CompactGraph.from_networkx(G), target_assortativity, target_clustering,
+                         name, results, tol_r, tol_clustering, weight, metric, max_iterations,
+                         max_consecutive_failures, timed, time_limit, log_failures,
+                         profiler=profiler)
+        return H.to_networkx(G)
+
+    if metric not in ('average', 'transitivity'):
+        raise ValueError(f"metric must be 'average' or 'transitivity', not {metric!r}")
+    alg_start = time.time()
+    if profiler is not None:
+        profiler.start()
+    itr = 0
+    consecutive_failures = 0
+
+    n_nodes = G.number_of_nodes()
+    degrees = dict(G.degree())
+    inv_weight = {}
+    for node, d in degrees.items():
+        inv_weight[node] = (2.0 / (n_nodes * d * (d - 1))) if d >= 2 else 0.0
+
+    t = _triangles(G)
+    C_avg = sum(t[v] * inv_weight[v] for v in t)
+    triples = sum(d * (d - 1) / 2 for d in degrees.values())
+    T = sum(t.values()) / triples if triples else 0.0
+    transitivity = metric == 'transitivity'
+
+    tracker = AssortativityTracker(G)
+    if np.isnan(tracker.r):
+        raise ValueError('degree assortativity is undefined for this graph')
+    neighbours = {n: set(G.neighbors(n)) for n in G.nodes()}
+    edge_index = EdgeIndex(G.edges())
+
+    def gap(r, C):
+        return abs(r - target_assortativity) + weight * abs(C - target_clustering)
+
+    if profiler is not None:
+        profiler.lap('rewire_joint', 'setup')
 
+    while True:
+        loop_start = time.time()
+        r = tracker.r
+        C = T if transitivity else C_avg
+        if max_iterations is not None and itr >= max_iterations:
+            print(f'exiting due to max iterations reached, took {time.time() - alg_start}')
+            break
+        if consecutive_failures >= max_consecutive_failures:
+            print(f'exiting due to max failures reached, took {time.time() - alg_start}')
+            break
+        if timed and (time.time() - alg_start) > time_limit:
+            print(f'exiting due to max time reached, took {time.time() - alg_start}')
+            break
+        if abs(r - target_assortativity) <= tol_r and abs(C - target_clustering) <= tol_clustering:
+            print(f'exiting due to targets reached, took {time.time() - alg_start}')
+            break
+
+        itr += 1
+        accepted = False
+
+        e1, e2 = edge_index.sample(2)
+        u, b = e1
+        v, y = e2
+        if random.random() < 0.5:
+            u, b = b, u
+        if random.random() < 0.5:
+            v, y = y, v
+        if profiler is not None:
+            profiler.lap('rewire_joint', 'sampling')
+
+        reason, W, dC, d_triangles = _swap_delta(neighbours, inv_weight, u, b, v, y)
+        if reason is not None:
+            consecutive_failures += 1
+        else:
+            r_new = tracker.r_after([(u, b), (v, y)], [(v, b), (u, y)])
+            C_new = C + (3 * d_triangles / triples if transitivity else dC)
+            if profiler is not None:
+                profiler.lap('rewire_joint', 'delta')
+
+            if gap(r_new, C_new) < gap(r, C):
+                _apply_swap(G, neighbours, t, u, b, v, y, W)
+                tracker.swap([(u, b), (v, y)], [(v, b), (u, y)])
+                edge_index.remove(e1)
+                edge_index.remove(e2)
+                edge_index.add((v, b))
+                edge_index.add((u, y))
+
+                C_avg += dC
+                T += 3 * d_triangles / triples
+                accepted = True
+                consecutive_failures = 0
+                if profiler is not None:
+                    profiler.lap('rewire_joint', 'mutation')
+            else:
+                consecutive_failures += 1
+
+        if accepted or log_failures:
+            record_row(results, _clustering_row(name, itr, time.time() - loop_start, tracker.r,
+                                                accepted, reason, 'joint',
+                                                target_assortativity))
+        if profiler is not None:
+            profiler.lap('rewire_joint', 'logging')
+            profiler.count('rewire_joint', 'accepted', accepted)
+            if reason is not None:
+                profiler.count('rewire_joint', reason)
+
+    missed = []
+    if abs(tracker.r - target_assortativity) > tol_r:
+        missed.append(f'r = {tracker.r:.4f} (target {target_assortativity})')
+    C = T if transitivity else C_avg
+    if abs(C - target_clustering) > tol_clustering:
+        missed.append(f'{metric} clustering = {C:.4f} (target {target_clustering})')
+    if missed:
+        warnings.warn(f"rewire_joint stopped with {' and '.join(missed)} outside tolerance; "
+                      f"adjust weight to favour the target missed", stacklevel=2)
     return G
 
+def _swap_delta(neighbours, inv_weight, u, b, v, y):
+    """
+    Scores the swap (u, b), (v, y) -> (v, b), (u, y) from the neighbour sets.
+
+    Returns (reason, W, dC, d_triangles). reason is 'self_edges' or
+    'existing_edges' if the swap is invalid, in which case the rest is
+    (None, 0.0, 0), else None. W holds the third vertices of the destroyed
+    triangles (u, b, w) and (v, y, w) and of the created ones (v, b, w) and
+    (u, y, w), as (W_ub, W_vy, W_vb, W_uy). dC is the change in average
+    clustering and d_triangles the change in the number of triangles.
+    """
+    if u == v or u == y or b == v or b == y:
+        return 'self_edges', None, 0.0, 0
+    N_u = neighbours[u]
+    N_v = neighbours[v]
+    if b in N_v or y in N_u:
+        return 'existing_edges', None, 0.0, 0
+    N_b = neighbours[b]
+    N_y = neighbours[y]
+
+    # Enumerate affected triangles as sets of third-vertices w.
+    # Destroyed: (u,b,w) for w ∈ W_ub, and (v,y,w) for w ∈ W_vy.
+    W_ub = N_u & N_b
+    W_vy = N_v & N_y
+    # Created: (v,b,w) and (u,y,w). Pre-swap N(v)∩N(b) may include
+    # u (if u∈N_v) or y (if y∈N_b) — neither forms a post-swap
+    # triangle because (u,b) and (v,y) are gone. Same for N(u)∩N(y)
+    # with v and b. Exclude them.
+    W_vb = (N_v & N_b) - {u, y}
+    W_uy = (N_u & N_y) - {v, b}
+
+    # ΔC_avg = sum_v (Δt_v) * inv_weight[v].
+    # Each triangle contributes -1/+1 to all three of its vertices.
+    dC = 0.0
+    if W_ub:
+        s_w = sum(inv_weight[w] for w in W_ub)
+        dC -= len(W_ub) * (inv_weight[u] + inv_weight[b]) + s_w
+    if W_vy:
+        s_w = sum(inv_weight[w] for w in W_vy)
+        dC -= len(W_vy) * (inv_weight[v] + inv_weight[y]) + s_w
+    if W_vb:
+        s_w = sum(inv_weight[w] for w in W_vb)
+        dC += len(W_vb) * (inv_weight[v] + inv_weight[b]) + s_w
+    if W_uy:
+        s_w = sum(inv_weight[w] for w in W_uy)
+        dC += len(W_uy) * (inv_weight[u] + inv_weight[y]) + s_w
+
+    d_triangles = len(W_vb) + len(W_uy) - len(W_ub) - len(W_vy)
+    return None, (W_ub, W_vy, W_vb, W_uy), dC, d_triangles
+
+
+def _apply_swap(G, neighbours, t, u, b, v, y, W):
+    """
+    Applies a swap scored by _swap_delta to G, the neighbour sets and the
+    per-node triangle counts t.
+    """
+    W_ub, W_vy, W_vb, W_uy = W
+    G.remove_edge(u, b)
+    G.remove_edge(v, y)
+    G.add_edge(v, b)
+    G.add_edge(u, y)
+    neighbours[u].discard(b); neighbours[u].add(y)
+    neighbours[v].discard(y); neighbours[v].add(b)
+    neighbours[b].discard(u); neighbours[b].add(v)
+    neighbours[y].discard(v); neighbours[y].add(u)
+
+    for w in W_ub:
+        t[u] -= 1; t[b] -= 1; t[w] -= 1
+    for w in W_vy:
+        t[v] -= 1; t[y] -= 1; t[w] -= 1
+    for w in W_vb:
+        t[v] += 1; t[b] += 1; t[w] += 1
+    for w in W_uy:
+        t[u] += 1; t[y] += 1; t[w] += 1
+
+
+def _clustering_row(name, itr, elapsed, r, accepted, reason, method, target_r=0):
+    return {'name': name,
+            'iteration': itr,
+            'time': elapsed,
+            'r': r,
+            'target_r': target_r,
+            'sample_size': 2,
+            'edges_rewired': 2 if accepted else 0,
+            'duplicate_edges': 0,
+            'self_edges': 1 if reason == 'self_edges' else 0,
+            'existing_edges': 1 if reason == 'existing_edges' else 0,
+            'repaired_edges': 0,
+            'preserved': True,
+            'method': method,
+            'summary': False}
+
+
+class _WeightedSampler:
+    """
+    Draws items with probability proportional to non-negative integer
+    weights, which can be changed in O(log n) (a Fenwick tree over the
+    weights).
+    """
+
+    def __init__(self, items, weights):
+        self.items = list(items)
+        self.index = {item: i for i, item in enumerate(self.items)}
+        self.weight = [0]*len(self.items)
+        self.tree = [0]*(len(self.items) + 1)
+        self.total = 0
+        for item in self.items:
+            self.update(item, weights[item])
+
+    def update(self, item, weight):
+        """
+        Sets the weight of item. Items not given to the sampler are ignored.
+        """
+        i = self.index.get(item)
+        if i is None:
+            return
+        delta = weight - self.weight[i]
+        self.weight[i] = weight
+        self.total += delta
+        i += 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def sample(self):
+        remaining = random.randrange(self.total)
+        pos = 0
+        step = 1 << (len(self.items).bit_length() - 1)
+        while step:
+            if pos + step <= len(self.items) and self.tree[pos + step] <= remaining:
+                pos += step
+                remaining -= self.tree[pos]
+            step >>= 1
+        return self.items[pos]
+
+
+def _endgame(
+    G,
+    neighbours,
+    t,
+    inv_weight,
+    degree_classes,
+    transitivity,
+    name,
+    results,
+    r,
+    itr,
+    alg_start,
+    target_clustering,
+    max_iterations,
+    timed,
+    time_limit,
+    log_failures,
+    C_avg,
+    T,
+    triples,
+    budget=None,
+    profiler=None):
+    """
+    Exhaustive final phase of reduce_clustering.
+
+    An improving swap must destroy a triangle through (u, b) or (v, y), and
+    the two roles are interchangeable, so only swaps with (u, b) on a
+    triangle are enumerated: every v of u's degree class and every y of v.
+    The index of such oriented edges is updated after each accepted swap;
+    only edges at the four swapped nodes can gain or lose common neighbours.
+
+    Sweeps the index until a sweep accepts nothing, which proves no single
+    swap improves the metric, a stopping condition of reduce_clustering is
+    met or budget swaps have been evaluated. Each evaluated swap counts as
+    an iteration. Returns (itr, C_avg, T).
+    """
+    def on_triangle(x, z):
+        return (len(degree_classes[len(neighbours[x])]) >= 2
+                and not neighbours[x].isdisjoint(neighbours[z]))
+
+    index = {(x, z) for x in G.nodes() for z in neighbours[x] if on_triangle(x, z)}
+    last_itr = None if budget is None else itr + budget
+    if profiler is not None:
+        profiler.lap('reduce_clustering', 'endgame_index')
 
+    while True:
+        improved = False
+        for u, b in list(index):
+            if (u, b) not in index:
+                continue
+            for v in degree_classes[len(neighbours[u])]:
+                if v == u:
+                    continue
+                for y in neighbours[v]:
+                    loop_start = time.time()
+                    if max_iterations is not None and itr >= max_iterations:
+                        print(f'exiting due to max iterations reached, took {time.time() - alg_start}')
+                        return itr, C_avg, T
+                    if timed and (loop_start - alg_start) > time_limit:
+                        print(f'exiting due to max time reached, took {time.time() - alg_start}')
+                        return itr, C_avg, T
+                    if target_clustering is not None and (T if transitivity else C_avg) <= target_clustering:
+                        print(f'exiting due to target reached, took {time.time() - alg_start}')
+                        return itr, C_avg, T
+                    if last_itr is not None and itr >= last_itr:
+                        print(f'exiting due to endgame budget reached, took {time.time() - alg_start}')
+                        return itr, C_avg, T
+
+                    itr += 1
+                    reason, W, dC, d_triangles = _swap_delta(neighbours, inv_weight, u, b, v, y)
+                    accepted = reason is None and (d_triangles < 0 if transitivity else dC < 0)
+                    if accepted:
+                        _apply_swap(G, neighbours, t, u, b, v, y, W)
+                        C_avg += dC
+                        T += 3 * d_triangles / triples
+                        index -= {(u, b), (b, u), (v, y), (y, v)}
+                        for x in (u, b, v, y):
+                            for z in neighbours[x]:
+                                for edge in ((x, z), (z, x)):
+                                    if on_triangle(*edge):
+                                        index.add(edge)
+                                    else:
+                                        index.discard(edge)
+                        improved = True
+                    if accepted or log_failures:
+                        record_row(results, _clustering_row(name, itr, time.time() - loop_start, r,
+                                                            accepted, reason, 'reduce_clustering'))
+                    if profiler is not None:
+                        profiler.lap('reduce_clustering', 'endgame')
+                        profiler.count('reduce_clustering', 'accepted', accepted)
+                    if accepted:
+                        break
+                else:
+                    continue
+                # (u, b) is gone, move on to the next indexed edge
+                break
+        if not improved:
+            print(f'exiting due to no improving swap left, took {time.time() - alg_start}')
+            return itr, C_avg, T
+
+def _reduce_clustering_jit(
+    G,
+    name,
+    results,
+    constrained,
+    target_clustering,
+    max_iterations,
+    max_consecutive_failures,
+    timed,
+    time_limit,
+    log_failures,
+    r,
+    inv_weight,
+    t,
+    C_avg,
+    T,
+    triples,
+    transitivity,
+    degree_classes,
+    usable_degrees,
+    alg_start,
+    profiler=None,
+    chunk_size=1024):
+    """
+    Compiled version of the reduce_clustering (constrained=True) and 
+    reduce_clustering_unconstrained loops, from the point where their setup
+    has computed inv_weight, t, C_avg and the transitivity T.
+
+    swap_kernel._clustering_chunk runs chunk_size iterations at a time on
+    sorted neighbour arrays. Between chunks, control returns to Python to 
+    append the chunk's rows to results in bulk and check the stopping
+    conditions, in the same order as the Python loops. The rows of a chunk 
+    share its running time equally. The rewired neighbour arrays are 
+    written back to G once at the end.
+    """
+    method = 'reduce_clustering' if constrained else 'reduce_clustering_unconstrained'
+    nodes = list(G.nodes())
+    index = {node: i for i, node in enumerate(nodes)}
+    offset, nbrs = build_neighbour_arrays([[index[w] for w in G.neighbors(node)] for node in nodes])
+    inv_weight_array = np.array([inv_weight[node] for node in nodes], dtype=np.float64)
+    t_array = np.array([t[node] for node in nodes], dtype=np.int64)
+    if constrained:
+        classes = [[index[node] for node in degree_classes[d]] for d in usable_degrees]
+        class_nodes = np.array([i for c in classes for i in c], dtype=np.int64)
+        class_offset = np.zeros(len(classes) + 1, dtype=np.int64)
+        np.cumsum([len(c) for c in classes], out=class_offset[1:])
+        edges = np.zeros((0, 2), dtype=np.int64)
+    else:
+        class_nodes = np.zeros(0, dtype=np.int64)
+        class_offset = np.zeros(1, dtype=np.int64)
+        edges = np.array([(index[u], index[v]) for u, v in G.edges()], dtype=np.int64).reshape(-1, 2)
+    state = np.array([C_avg, 0, T], dtype=np.float64)
+    target = -np.inf if target_clustering is None else float(target_clustering)
+
+    accepted = np.zeros(chunk_size, dtype=np.bool_)
+    reason = np.zeros(chunk_size, dtype=np.int8)
+    _seed(random.getrandbits(32))
+    if profiler is not None:
+        profiler.lap(method, 'setup')
+
+    itr = 0
+    while True:
+        if max_iterations is not None and itr >= max_iterations:
+            print(f'exiting due to max iterations reached, took {time.time() - alg_start}')
+            break
+        if state[1] >= max_consecutive_failures:
+            print(f'exiting due to max failures reached, took {time.time() - alg_start}')
+            break
+        if timed and (time.time() - alg_start) > time_limit:
+            print(f'exiting due to max time reached, took {time.time() - alg_start}')
+            break
+        if state[2 if transitivity else 0] <= target:
+            print(f'exiting due to target reached, took {time.time() - alg_start}')
+            break
+
+        n_iter = chunk_size if max_iterations is None else min(chunk_size, max_iterations - itr)
+        chunk_start = time.time()
+        n_done = _clustering_chunk(nbrs, offset, inv_weight_array, t_array, state, constrained,
+                                   class_nodes, class_offset, edges, transitivity, 
+                                   float(max(triples, 1)), target, 
+                                   max_consecutive_failures, n_iter, accepted, reason)
+        if profiler is not None:
+            profiler.lap(method, 'kernel')
+        if n_done == 0:
+            continue
+        logged = np.ones(n_done, dtype=bool) if log_failures else accepted[:n_done]
+        record_rows(results, {'name': name,
+                              'iteration': itr + 1 + np.flatnonzero(logged),
+                              'time': (time.time() - chunk_start)/n_done,
+                              'r': r,
+                              'target_r': 0,
+                              'sample_size': 2,
+                              'edges_rewired': 2*accepted[:n_done][logged],
+                              'duplicate_edges': 0,
+                              'self_edges': (reason[:n_done][logged] == 1).astype(np.int64),
+                              'existing_edges': (reason[:n_done][logged] == 2).astype(np.int64),
+                              'repaired_edges': 0,
+                              'preserved': True,
+                              'method': method,
+                              'summary': False}, int(logged.sum()))
+        itr += n_done
+        if profiler is not None:
+            profiler.lap(method, 'logging')
+            profiler.count(method, 'accepted', int(accepted[:n_done].sum()))
+            profiler.count(method, 'self_edges', int((reason[:n_done] == 1).sum()))
+            profiler.count(method, 'existing_edges', int((reason[:n_done] == 2).sum()))
+
+    owner = np.repeat(np.arange(len(nodes)), np.diff(offset))
+    keep = owner < nbrs
+    _set_edges(G, np.column_stack((owner[keep], nbrs[keep])))
+    if profiler is not None:
+        profiler.lap(method, 'write_back')
+    return G
@@ -12,13 +12,17 @@ import time
 import random
 from collections import defaultdict
 from .havel_hakimi import havel_hakimi_positive, havel_hakimi_negative
-from .rewiring_helpers import degree_list, check_new_edges, test_sample_sizes
+from .rewiring_helpers import degree_list, check_new_edges, test_sample_sizes, AssortativityTracker, record_row
+from .compact_graph import CompactGraph, _connected_components, _has_path
 
 def connect_components(
     G: nx.Graph,
     name,
     results,
-    max_attempts=50):
+    max_attempts=50,
+    tracker=None,
+    backend='networkx',
+    profiler=None):
     """
     Merges disconnected components of G via random inter-component double-edge
     swaps. Preserves the degree sequence; does NOT preserve assortativity.
@@ -40,10 +44,19 @@ def connect_components(
         Graph to be merged (modified in place).
     name : str
         Name recorded in the results DataFrame.
-    results : pandas.DataFrame
+    results : ResultsRecorder or pandas.DataFrame
         One row appended per executed merge.
     max_attempts : int
         Maximum edge-pair attempts per merge. Default 50.
+    tracker : AssortativityTracker, optional
+        Tracker holding the current assortativity of G, used to record r
+        after each merge. A new one is created if None.
+    backend : str
+        'networkx' to rewire G directly, or 'compact' to convert G to a 
+        CompactGraph, rewire that, and write the edges back into G at the end.
+    profiler : PhaseProfiler, optional
+        Accumulates the time spent swapping edges, checking connectivity and
+        logging, and counts reverted swaps. Disabled if None.
 
     Returns
     -------
@@ -51,6 +64,13 @@ def connect_components(
         Graph with one non-trivial connected component (assuming all merges
         succeeded).
     """
+    if backend == 'compact' and not isinstance(G, CompactGraph):
+        H = connect_components(CompactGraph.from_networkx(G), name, results, max_attempts,
+                               profiler=profiler)
+        return H.to_networkx(G)
+
+    if profiler is not None:
+        profiler.start()
     itr = 0
 
     isolated = [n for n in G.nodes() if G.degree(n) == 0]
@@ -58,12 +78,16 @@ def connect_components(
         print(f'warning: {len(isolated)} isolated node(s) of degree 0 cannot '
               f'be merged by edge swap and will remain as separate components')
 
-    components = [list(c) for c in nx.connected_components(G) if len(c) > 1]
-    r_start = nx.degree_assortativity_coefficient(G)
+    components = [list(c) for c in _connected_components(G) if len(c) > 1]
+    if tracker is None:
+        tracker = AssortativityTracker(G)
+    r_start = tracker.r
     print(f'starting connect_components: {len(components)} non-trivial components, '
           f'r={r_start:.4f}')
 
     components.sort(key=len)
+    if profiler is not None:
+        profiler.lap('connect_components', 'setup')
 
     while len(components) > 1:
         loop_start = time.time()
@@ -83,11 +107,17 @@ def connect_components(
             G.remove_edge(b1, b2)
             G.add_edge(a1, b1)
             G.add_edge(a2, b2)
+            if profiler is not None:
+                profiler.lap('connect_components', 'swap')
 
             # The swap merges iff at least one of (a1,a2) and (b1,b2) is not
             # a bridge. When both are bridges the graph splits instead:
             # verify by checking connectivity of the two main endpoints.
-            if nx.has_path(G, a1, a2):
+            connected = _has_path(G, a1, a2)
+            if profiler is not None:
+                profiler.lap('connect_components', 'path_check')
+            if connected:
+                tracker.swap([(a1, a2), (b1, b2)], [(a1, b1), (a2, b2)])
                 merged = True
                 break
 
@@ -95,6 +125,9 @@ def connect_components(
             G.remove_edge(a2, b2)
             G.add_edge(a1, a2)
             G.add_edge(b1, b2)
+            if profiler is not None:
+                profiler.lap('connect_components', 'swap')
+                profiler.count('connect_components', 'reverted')
 
         if not merged:
             print(f'warning: could not merge on iteration {itr} after '
@@ -109,19 +142,22 @@ def connect_components(
         row = {'name': name,
                'iteration': itr,
                'time': time.time() - loop_start,
-               'r': 0,
+               'r': tracker.r,
                'target_r': 0,
                'sample_size': 2,
                'edges_rewired': 2,
                'duplicate_edges': 0,
                'self_edges': 0,
                'existing_edges': 0,
+               'repaired_edges': 0,
                'preserved': True,
                'method': 'connect_components',
                'summary': False}
-        results.loc[len(results)] = row
+        record_row(results, row)
+        if profiler is not None:
+            profiler.lap('connect_components', 'logging')
 
 
-    print(f'done: r={nx.degree_assortativity_coefficient(G):.4f}')
+    print(f'done: r={tracker.r:.4f}')
     return G
 
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+Running rewire over many graphs and target values in parallel.
+
+@author: shane mannion
+"""
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+import random
+from concurrent.futures import ProcessPoolExecutor
+from .compact_graph import CompactGraph
+from .rewiring_functions import rewire
+from .rewiring_helpers import RESULTS_COLUMNS, ResultsRecorder
+from .rewiring_clustering import reduce_clustering_unconstrained
+
+
+def rewire_many(
+    graphs, 
+    targets, 
+    names=None, 
+    n_jobs=None, 
+    seed=None, 
+    return_graphs=False, 
+    **kwargs):
+    """
+    Rewires every graph to every target assortativity, spreading the 
+    len(graphs) * len(targets) runs of rewire over a process pool.
+
+    Graphs are sent to the workers as a node count and an int32 edge array 
+    rather than as pickled networkx graphs, and come back the same way. Each 
+    run gets its own random stream spawned from seed, so results are 
+    reproducible whatever the number of workers or the order tasks finish in.
+
+    Parameters
+    ----------
+    graphs : list of nx.Graph
+        graphs to rewire. They are not modified.
+    targets : list of float
+        target assortativity values
+    names : list of str, optional
+        name of each graph for the results' name column. Defaults to the 
+        position of the graph in graphs
+    n_jobs : int, optional
+        number of worker processes. None uses one per CPU; 1 runs every task 
+        in this process
+    seed : int, optional
+        seed for the per-task random streams. None draws fresh entropy
+    return_graphs : bool
+        whether to also return the rewired graphs
+    **kwargs
+        passed on to rewire, e.g. sample_size, method, timed, time_limit, 
+        return_type, batch_size or backend
+
+    Returns
+    -------
+    results : pandas.DataFrame
+        the results of every run concatenated, with the columns documented in
+        rewire. Runs are told apart by name and target_r
+
+    rewired : dict, only if return_graphs is True
+        (graph position, target) -> rewired nx.Graph
+    """
+    if names is None:
+        names = [str(i) for i in range(len(graphs))]
+
+    tasks = []
+    labels = []
+    for G in graphs:
+        nodes = list(G.nodes())
+        index = {node: i for i, node in enumerate(nodes)}
+        edges = np.array([(index[u], index[v]) for u, v in G.edges()], dtype=np.int32)
+        labels.append(nodes)
+        tasks.append((len(nodes), edges))
+
+    seeds = np.random.SeedSequence(seed).spawn(len(graphs)*len(targets))
+    jobs = []
+    for i, (n_nodes, edges) in enumerate(tasks):
+        for j, target in enumerate(targets):
+            jobs.append((n_nodes, edges, target, names[i], seeds[i*len(targets) + j], kwargs))
+
+    if n_jobs == 1:
+        outputs = [_rewire_task(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            outputs = list(executor.map(_rewire_task, jobs))
+
+    results = pd.concat([frame for _, frame in outputs], ignore_index=True)
+    for col, dtype in RESULTS_COLUMNS.items():
+        if dtype == 'category':
+            results[col] = results[col].astype('category')
+
+    if not return_graphs:
+        return results
+
+    rewired = {}
+    for i in range(len(graphs)):
+        for j, target in enumerate(targets):
+            edges, _ = outputs[i*len(targets) + j]
+            G = nx.Graph()
+            G.add_nodes_from(labels[i])
+            G.add_edges_from((labels[i][u], labels[i][v]) for u, v in edges.tolist())
+            rewired[(i, target)] = G
+    return results, rewired
+
+
+def _rewire_task(job):
+    """
+    Runs one rewire call in a worker. Returns the rewired edge array and the 
+    results frame.
+    """
+    n_nodes, edges, target, name, seed_sequence, kwargs = job
+    random.seed(int(seed_sequence.generate_state(1, dtype=np.uint64)[0]))
+    if kwargs.get('backend', 'networkx') == 'compact':
+        G = CompactGraph.from_edge_array(n_nodes, edges)
+    else:
+        G = nx.Graph()
+        G.add_nodes_from(range(n_nodes))
+        G.add_edges_from(edges.tolist())
+    G, results = rewire(G, target, name, **kwargs)
+    if isinstance(G, CompactGraph):
+        edge_array = G.edge_array()
+    else:
+        edge_array = np.array(list(G.edges()), dtype=np.int32).reshape(-1, 2)
+    return edge_array, results
+
+
+def reduce_clustering_chains(
+    G,
+    name,
+    n_chains=4,
+    n_jobs=None,
+    seed=None,
+    temperature=None,
+    cooling=0.9999,
+    exchange_every=None,
+    n_rounds=10,
+    **kwargs):
+    """
+    Runs n_chains independently seeded reduce_clustering_unconstrained 
+    chains on G over a process pool and keeps the graph with the lowest 
+    clustering, a tighter estimate of the minimum than a single greedy run.
+
+    With temperature None the chains are greedy restarts. With a 
+    temperature each chain anneals from it, cooling by cooling per 
+    iteration. If exchange_every is also given the chains instead run 
+    parallel tempering: chain i is held at temperature * 0.5**i, and after
+    every round of exchange_every iterations neighbouring chains swap 
+    graphs with probability min(1, exp((C_i - C_j) * (1/T_i - 1/T_j))), 
+    for n_rounds rounds.
+
+    Graphs travel to and from the workers as int32 edge arrays, and every 
+    chain and round gets its own random stream spawned from seed, as in 
+    rewire_many.
+
+    Parameters
+    ----------
+    G : nx.Graph
+        graph to rewire. It is not modified
+    name : str
+        base of the name column; chain i's rows are named f'{name} chain {i}'
+    n_chains : int
+        number of chains
+    n_jobs : int, optional
+        number of worker processes. None uses one per CPU; 1 runs every 
+        chain in this process
+    seed : int, optional
+        seed for the random streams. None draws fresh entropy
+    temperature : float, optional
+        starting (annealing) or highest (tempering) temperature, see 
+        reduce_clustering_unconstrained
+    cooling : float
+        per-iteration cooling factor when annealing
+    exchange_every : int, optional
+        iterations per tempering round. Disabled if None
+    n_rounds : int
+        number of tempering rounds
+    **kwargs
+        passed on to reduce_clustering_unconstrained, e.g. metric, 
+        max_iterations, max_consecutive_failures, timed, time_limit or 
+        backend. With tempering, max_iterations is set by exchange_every
+
+    Returns
+    -------
+    best : nx.Graph
+        the graph with the lowest clustering metric any chain reached at any
+        point of its run, not only at the end of a round
+
+    results : pandas.DataFrame
+        the rows of every chain concatenated, with the columns documented in
+        rewire; iterations are counted across rounds
+
+    chains : pandas.DataFrame
+        one row per chain: its temperature (of the last round when 
+        tempering), final clustering metric, and number of accepted 
+        exchanges
+    """
+    if exchange_every is not None and temperature is None:
+        raise ValueError('parallel tempering needs a temperature')
+    nodes = list(G.nodes())
+    index = {node: i for i, node in enumerate(nodes)}
+    edges = np.array([(index[u], index[v]) for u, v in G.edges()], dtype=np.int32).reshape(-1, 2)
+
+    if exchange_every is None:
+        temperatures = [temperature]*n_chains
+        n_rounds = 1
+    else:
+        temperatures = [temperature*0.5**i for i in range(n_chains)]
+        kwargs = dict(kwargs, max_iterations=exchange_every)
+        cooling = 1.0
+    seeds = np.random.SeedSequence(seed).spawn(n_rounds*n_chains + 1)
+    rng = np.random.default_rng(seeds[-1])
+
+    states = [edges]*n_chains
+    values = [None]*n_chains
+    exchanges = [0]*n_chains
+    frames = []
+    best_edges, best_value = edges, np.inf
+    #one pool for every round, rather than a new set of workers per round
+    executor = None if n_jobs == 1 else ProcessPoolExecutor(max_workers=n_jobs)
+    try:
+        for round_ in range(n_rounds):
+            jobs = [(len(nodes), states[i], f'{name} chain {i}', seeds[round_*n_chains + i],
+                     temperatures[i], cooling, kwargs) for i in range(n_chains)]
+            if executor is None:
+                outputs = [_clustering_task(job) for job in jobs]
+            else:
+                outputs = list(executor.map(_clustering_task, jobs))
+
+            for i, (state, frame, value, lowest_edges, lowest_value) in enumerate(outputs):
+                if exchange_every is not None:
+                    frame['iteration'] += round_*exchange_every
+                frames.append(frame)
+                states[i] = state
+                values[i] = value
+                if lowest_value < best_value:
+                    best_edges, best_value = lowest_edges, lowest_value
+
+            if exchange_every is not None:
+                for i in range(n_chains - 1):
+                    log_p = (values[i] - values[i + 1])*(1/temperatures[i] - 1/temperatures[i + 1])
+                    if log_p >= 0 or rng.random() < np.exp(log_p):
+                        states[i], states[i + 1] = states[i + 1], states[i]
+                        values[i], values[i + 1] = values[i + 1], values[i]
+                        exchanges[i] += 1
+                        exchanges[i + 1] += 1
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    results = pd.concat(frames, ignore_index=True)
+    for col, dtype in RESULTS_COLUMNS.items():
+        if dtype == 'category':
+            results[col] = results[col].astype('category')
+
+    chains = pd.DataFrame({'chain': range(n_chains),
+                           'temperature': temperatures,
+                           'clustering': values,
+                           'exchanges': exchanges})
+    best = nx.Graph()
+    best.add_nodes_from(nodes)
+    best.add_edges_from((nodes[u], nodes[v]) for u, v in best_edges.tolist())
+    return best, results, chains
+
+
+def _clustering_task(job):
+    """
+    Runs one reduce_clustering_unconstrained chain in a worker. Returns the
+    rewired edge array, the results frame and the final clustering metric,
+    then the edge array and metric of the lowest point of the chain.
+    """
+    n_nodes, edges, name, seed_sequence, temperature, cooling, kwargs = job
+    random.seed(int(seed_sequence.generate_state(1, dtype=np.uint64)[0]))
+    G = nx.Graph()
+    G.add_nodes_from(range(n_nodes))
+    G.add_edges_from(edges.tolist())
+    results = ResultsRecorder()
+    best = {}
+    G = reduce_clustering_unconstrained(G, name, results, temperature=temperature, 
+                                        cooling=cooling, best=best, **kwargs)
+    if kwargs.get('metric', 'average') == 'transitivity':
+        value = nx.transitivity(G)
+    else:
+        value = nx.average_clustering(G)
+    edge_array = np.array(list(G.edges()), dtype=np.int32).reshape(-1, 2)
+    if not best or best['value'] >= value:
+        return edge_array, results.to_frame(), value, edge_array, value
+    best_array = np.array(best['edges'], dtype=np.int32).reshape(-1, 2)
+    return edge_array, results.to_frame(), value, best_array, best['value']
@@ -10,9 +10,22 @@ import numpy as np
 import pandas as pd
 import time
 import random
+import threading
+import warnings
+import queue
 from collections import defaultdict
 from .havel_hakimi import havel_hakimi_positive, havel_hakimi_negative
-from .rewiring_helpers import degree_list, check_new_edges, test_sample_sizes
+from .compact_graph import CompactGraph, _set_edges
+from .rewiring_helpers import (degree_list, check_new_edges, test_sample_sizes, AssortativityTracker,
+                               ResultsRecorder, SampleSizeController, RewireCheckpoint,
+                               ResultsStream, ExtremalGraphCache, record_row, record_rows, rematch_stubs,
+                               _edge_index)
+from .swap_kernel import HAVE_NUMBA, build_edge_table, _swap_chunk, _seed, _use_jit
+
+#the options the jit and batched fine tuning loops do not support, for 
+#their errors
+_JIT_OPTIONS = "sample_size='auto', n_candidates > 1, batch_size, checkpoint or repair"
+_BATCH_OPTIONS = "sample_size='auto', n_candidates > 1, checkpoint or repair"
 
 def rewire(
     G, 
@@ -22,7 +35,21 @@ def rewire(
     timed = False, 
     time_limit=600, 
     method='new', 
-    return_type = 'full'):
+    return_type = 'full',
+    resync_every = None,
+    backend = 'networkx',
+    batch_size = None,
+    n_candidates = 1,
+    tolerance = None,
+    checkpoint_path = None,
+    checkpoint_every = 600,
+    jit = None,
+    sink = None,
+    sink_rows = 10000,
+    profiler = None,
+    repair = False,
+    hh_cache = None,
+    unreachable = None):
     """
     Parameters
     ----------
@@ -33,8 +60,10 @@ def rewire(
         desired value for assortativity
     name: str
         name to appear in results data set
-    sample_size : int
-        number of edges to rewire at each iteration
+    sample_size : int or 'auto'
+        number of edges to rewire at each iteration. With 'auto' the fine tuning 
+        phase picks the sample size as it runs (see SampleSizeController), and 
+        the size used is recorded in each row's sample_size column
     timed : bool
         whether or not to impose a maximum time on the algorithm
     time_limit : float
@@ -51,6 +80,90 @@ def rewire(
             'full' : returns detailed results at each algorithm iteration
 
             'summarised': returns only total time taken, total iterations, etc.
+    resync_every: int, optional
+        r is tracked incrementally during the run (see AssortativityTracker).
+        If given, the tracker is recomputed exactly from G after this many 
+        swaps. Disabled if None.
+    backend: string
+        can be 'networkx' or 'compact'
+            'networkx': G is rewired directly
+
+            'compact': G is converted to a CompactGraph (sorted int32 
+                       neighbour rows) for the run and the edges that changed 
+                       are written back into G at the end; unchanged edges 
+                       keep their attributes. The graph itself takes about 
+                       4 bytes per edge end instead of networkx's nested 
+                       dicts, but single edge operations are slower, so it 
+                       pays off on memory-bound graphs or with jit. G must 
+                       not have self-loops.
+    batch_size: int, optional
+        if given, the fine tuning phase proposes batch_size swaps at a time 
+        and checks and applies them as NumPy arrays (see _rewire_batched). 
+        Not supported with sample_size='auto', n_candidates > 1, 
+        checkpoint_path or repair. Disabled if None
+    n_candidates: int
+        number of candidate swaps scored per fine tuning iteration. With more 
+        than one, the candidate bringing r closest to the target is applied
+        (see positively_rewire). The default is 1
+    tolerance: float, optional
+        stop fine tuning once r is within this distance of the target. 
+        Disabled if None.
+    checkpoint_path: str, optional
+        file to save the state of the fine tuning phase to every 
+        checkpoint_every seconds. A pre-empted run can be continued from it 
+        with resume_rewire. Disabled if None
+    checkpoint_every: float
+        seconds between checkpoints. The default is 600
+    jit: bool, optional
+        whether to run the fine tuning phase on the compiled swap kernel 
+        (see _rewire_jit). True requires it, None uses it whenever numba is
+        installed and the other options allow it, and False never uses it.
+        It is not used with sample_size='auto', n_candidates > 1, 
+        batch_size, checkpoint_path or repair. The kernel draws from its own
+        random stream, so the same seed gives a different trajectory, and 
+        different results, than jit=False. The default is None
+    sink: str or callable, optional
+        if given, rows are not kept in memory for the whole run but handed
+        over sink_rows at a time (see ResultsStream). A str is a local .csv 
+        or .parquet file the rows are appended to, a callable is called with
+        each chunk as a DataFrame. The returned results then hold only the 
+        summary row. Cannot be combined with checkpoint_path
+    sink_rows: int
+        rows per chunk handed to sink. The default is 10000
+    profiler: PhaseProfiler, optional
+        if given, accumulates the time spent in each phase of every 
+        algorithm the run goes through (sampling, edge checks, graph 
+        mutation, r updates, logging, ...). Read it afterwards with 
+        profiler.to_frame(). Disabled if None
+    repair: bool
+        whether the fine tuning phase re-matches the endpoints of invalid 
+        pairs instead of rejecting the whole proposal (see positively_rewire).
+        The default is False
+    hh_cache: ExtremalGraphCache or str, optional
+        cache of the Havel-Hakimi graphs of methods 'new' and 'max'. On a 
+        hit the construction is skipped and the cached graph is relabelled 
+        onto G's nodes. A str is a directory for an on-disk cache. Disabled
+        if None
+    unreachable: string, optional
+        what to do with a target beyond the extremal r of G's degree 
+        sequence (see assortativity_bounds)
+            'ignore': rewire towards the target regardless; with method 
+                      'original' and timed=False this may never return
+
+            'warn': as 'ignore', with a warning if the target is beyond 
+                    the bound
+
+            'clamp': the target becomes the bound, with a warning. Method 
+                     'original', whose swaps might never reach it, builds 
+                     the Havel-Hakimi graph instead, as method 'max' does.
+                     Method 'new' already stops at that graph, so no bound
+                     is computed for it
+
+            'raise': raise a ValueError before any rewiring
+        'warn', 'clamp' and 'raise' cost an extra Havel-Hakimi construction
+        to compute the bound. The default, None, is 'warn' for method 
+        'original' with timed=False, the one run that never stops if the 
+        target cannot be reached, and 'ignore' otherwise
 
     Returns:
     --------
@@ -58,78 +171,415 @@ def rewire(
         rewired graph, rewiring done in place
 
     results : pandas.DataFrame()
-        dataframe with all necessary info to plot results
+        dataframe with all necessary info to plot results. Rows are collected 
+        in a ResultsRecorder during the run and the frame is built once at the 
+        end, with the dtypes given in RESULTS_COLUMNS.
         columns:
+        name : the name passed in (categorical)
         iteration : number of loops completed so far (unsuccessful loops included)
         time : time taken for the current loop
         r : assortativity of the graph at the END of the current iteration
+        target_r : the target assortativity (0 for Havel-Hakimi rows)
         sample_size : number of edges being selected at each iteration
                       N.B. The first loop will have a sample size = to the number of edges
                       but the row will be given the sample_size value of the succeeding rows
                       to allow for easy grouping
-        edges_selected : cumulative number of edges sampled (unnsuccessful loops included)
         edges_rewired : cumulative number of edges rewired 
         duplicate_edges : The number of duplicate edges in the list of potential edges (one edge appearing twice = 1 here)
         self_edges : The number of self edges in the list of potential edges
         existing_edges : The number of edges in the list of potential edges that already exist in the graph
+        repaired_edges : The number of edges re-matched by the repair option in an accepted swap
         preserved : If the degree_list has been preserved (only present in first and last rows)
-        method : The method applied. 0 = none (for info about the starting values)
-                                     1 = new method, rewiring_full phase
-                                     2 = new method, second phase
+        method : The method applied (categorical). The first and summary rows hold 
+                 the method passed in, Havel-Hakimi rows 'max' and fine tuning rows 'new'
         summary : Whether or not the row is a summary of the entire rewiring process for a graph
     
 
     """
-    b_start = time.time()
+    if backend == 'compact' and not isinstance(G, CompactGraph):
+        H, results = rewire(CompactGraph.from_networkx(G), target_assortativity, name, 
+                            sample_size, timed, time_limit, method, return_type, 
+                            resync_every, batch_size=batch_size, n_candidates=n_candidates,
+                            tolerance=tolerance, checkpoint_path=checkpoint_path, 
+                            checkpoint_every=checkpoint_every, jit=jit, sink=sink,
+                            sink_rows=sink_rows, profiler=profiler, repair=repair,
+                            hh_cache=hh_cache, unreachable=unreachable)
+        return H.to_networkx(G), results
+
+    if profiler is not None:
+        profiler.start()
+    if isinstance(hh_cache, str):
+        hh_cache = ExtremalGraphCache(hh_cache)
+    tracker = AssortativityTracker(G, resync_every)
+    if unreachable is None:
+        unreachable = 'warn' if method == 'original' and not timed else 'ignore'
+    if unreachable not in ('clamp', 'raise', 'warn', 'ignore'):
+        raise ValueError(f"unreachable must be 'clamp', 'raise', 'warn' or 'ignore', not {unreachable!r}")
+    if method == 'original' and unreachable != 'ignore' or method == 'new' and unreachable == 'raise':
+        direction = 'positive' if tracker.r < target_assortativity else 'negative'
+        bound = assortativity_bounds(G, direction, hh_cache)
+        if (target_assortativity - bound)*(1 if direction == 'positive' else -1) > 0:
+            if unreachable == 'raise':
+                raise ValueError(f'target_assortativity {target_assortativity} cannot be reached '
+                                 f'for this degree sequence, whose {direction} bound is {bound:.4f}')
+            if unreachable == 'warn':
+                warnings.warn(f'target_assortativity {target_assortativity} is beyond the {direction} '
+                              f'bound {bound:.4f} of this degree sequence and may never be reached',
+                              stacklevel=2)
+            else:
+                warnings.warn(f'target_assortativity {target_assortativity} cannot be reached for '
+                              f'this degree sequence, building the extremal graph with r={bound:.4f} '
+                              f'instead', stacklevel=2)
+                target_assortativity = bound
+                method = 'max'
+    #Havel-Hakimi rows have no sample size of their own, log the starting one
+    if sample_size == 'auto':
+        logged_size = SampleSizeController().size
+    else:
+        logged_size = sample_size
     first_row = {'name':name,
                  'iteration': 0, 
                  'time': 0, 
-                 'r': nx.degree_assortativity_coefficient(G),
+                 'r': tracker.r,
                  'target_r': target_assortativity, 
-                 'sample_size': sample_size, 
+                 'sample_size': logged_size, 
                  'edges_rewired': 0,
                  'duplicate_edges': 0, 
                  'self_edges': 0,
                  'existing_edges': 0, 
+                 'repaired_edges': 0,
                  'preserved': True,
                  'method': method,
                  'summary':False}
     
-    results = pd.DataFrame([first_row])
+    if sink is not None:
+        if checkpoint_path is not None:
+            raise ValueError('checkpoint_path cannot be combined with sink')
+        results = ResultsStream(sink, sink_rows)
+        results.append(first_row)
+    else:
+        results = ResultsRecorder([first_row])
 
     before = degree_list(G)
-    if nx.degree_assortativity_coefficient(G) < target_assortativity:
+    checkpoint = None
+    if checkpoint_path is not None:
+        if batch_size is not None:
+            raise ValueError('checkpoint_path cannot be combined with batch_size')
+        context = {'target_assortativity': target_assortativity,
+                   'name': name,
+                   'sample_size': sample_size,
+                   'timed': timed,
+                   'time_limit': time_limit,
+                   'method': method,
+                   'return_type': return_type,
+                   'resync_every': resync_every,
+                   'n_candidates': n_candidates,
+                   'tolerance': tolerance,
+                   'repair': repair,
+                   'before': before}
+        checkpoint = RewireCheckpoint(checkpoint_path, checkpoint_every, context)
+    if profiler is not None:
+        profiler.lap('rewire', 'setup')
+    if tracker.r < target_assortativity:
       if method == 'new':
-        G = havel_hakimi_positive(G, results, name, sample_size, return_type)
-        G = negatively_rewire(G, target_assortativity, name, results, sample_size, timed, time_limit)
+        G = _havel_hakimi(G, 'positive', results, name, logged_size, return_type, tracker,
+                          profiler, hh_cache)
+        G = negatively_rewire(G, target_assortativity, name, results, sample_size, timed, time_limit, tracker=tracker,
+                              batch_size=batch_size, n_candidates=n_candidates, tolerance=tolerance,
+                              checkpoint=checkpoint, jit=jit, profiler=profiler, repair=repair)
       if method == 'original':
-        G = positively_rewire(G, target_assortativity, name, results, sample_size, timed, time_limit)
+        G = positively_rewire(G, target_assortativity, name, results, sample_size, timed, time_limit, tracker=tracker,
+                              batch_size=batch_size, n_candidates=n_candidates, tolerance=tolerance,
+                              checkpoint=checkpoint, jit=jit, profiler=profiler, repair=repair)
       if method == 'max':
-        G = havel_hakimi_positive(G, results, name, sample_size, return_type)
+        G = _havel_hakimi(G, 'positive', results, name, logged_size, return_type, tracker,
+                          profiler, hh_cache)
 
     else:
       if method == 'new':
-        a_start = time.time()
-        G = havel_hakimi_negative(G, results, name, sample_size, return_type)
-        G = positively_rewire(G, target_assortativity, name, results, sample_size, timed, time_limit)
-        a_end = time.time()
+        G = _havel_hakimi(G, 'negative', results, name, logged_size, return_type, tracker,
+                          profiler, hh_cache)
+        G = positively_rewire(G, target_assortativity, name, results, sample_size, timed, time_limit, tracker=tracker,
+                              batch_size=batch_size, n_candidates=n_candidates, tolerance=tolerance,
+                              checkpoint=checkpoint, jit=jit, profiler=profiler, repair=repair)
       if method == 'original':
-        G = negatively_rewire(G, target_assortativity, name, results, sample_size, timed, time_limit)
+        G = negatively_rewire(G, target_assortativity, name, results, sample_size, timed, time_limit, tracker=tracker,
+                              batch_size=batch_size, n_candidates=n_candidates, tolerance=tolerance,
+                              checkpoint=checkpoint, jit=jit, profiler=profiler, repair=repair)
       if method == 'max':
-        G = havel_hakimi_negative(G, results, name, sample_size, return_type)
+        G = _havel_hakimi(G, 'negative', results, name, logged_size, return_type, tracker,
+                          profiler, hh_cache)
+
+    if profiler is not None:
+        profiler.start()
+    G, results = _finish_rewire(G, results, tracker, target_assortativity, method, before, return_type)
+    if profiler is not None:
+        profiler.lap('rewire', 'summary')
+    return G, results
+
+
+def assortativity_bounds(G, direction=None, hh_cache=None):
+    """
+    Estimates the smallest and largest degree assortativity that rewiring 
+    can give a degree sequence, as the r of the graphs built by 
+    havel_hakimi_negative and havel_hakimi_positive. These are the 
+    extremes rewire(method='max') reaches.
+
+    The constructions run on CompactGraph copies, so G is not modified, 
+    and with the random module seeded to 0, so the degree repair step makes
+    the same choices on every call and the bounds only depend on G. The 
+    caller's random state is restored afterwards.
+
+    Parameters
+    ----------
+    G : networkx.Graph, CompactGraph or list of int
+        graph, or a graphical degree sequence
+    direction : str, optional
+        'positive' to compute only the upper bound, 'negative' only the 
+        lower one, or None for both
+    hh_cache : ExtremalGraphCache, optional
+        cache to read the Havel-Hakimi graphs from and store them in, so a
+        following rewire of the same degree sequence can reuse them
+
+    Returns
+    -------
+    (r_min, r_max) : tuple of float, if direction is None
+
+    float : the requested bound otherwise
+    """
+    if isinstance(G, CompactGraph):
+        H = G
+    elif isinstance(G, nx.Graph):
+        H = CompactGraph.from_networkx(G)
+    else:
+        H = CompactGraph.from_networkx(nx.havel_hakimi_graph(list(G)))
+
+    bounds = {}
+    random_state = random.getstate()
+    try:
+        for d in ('negative', 'positive'):
+            if direction is None or direction == d:
+                random.seed(0)
+                H_d = H.copy()
+                tracker = AssortativityTracker(H_d)
+                _havel_hakimi(H_d, d, ResultsRecorder(), 'bounds', 2, 'full', tracker, cache=hh_cache)
+                bounds[d] = tracker.r
+    finally:
+        random.setstate(random_state)
+    if direction is not None:
+        return bounds[direction]
+    return bounds['negative'], bounds['positive']
+
+
+def _havel_hakimi(G, direction, results, name, sample_size, return_type, tracker, profiler=None, 
+                  cache=None):
+    """
+    Runs havel_hakimi_positive or havel_hakimi_negative (direction 
+    'positive' or 'negative') through an ExtremalGraphCache, if given.
+
+    On a miss the graph is built as usual and stored if its degree sequence
+    was preserved. On a hit G's edges are replaced by the cached ones, 
+    relabelled onto G's nodes in ascending degree order, and one 'max' row 
+    is recorded as for the construction step.
+    """
+    if direction == 'positive':
+        construct = havel_hakimi_positive
+    else:
+        construct = havel_hakimi_negative
+    if cache is None:
+        return construct(G, results, name, sample_size, return_type, tracker=tracker, 
+                         profiler=profiler)
+
+    start = time.time()
+    order = sorted(G.nodes(), key=G.degree)
+    degrees = [G.degree(node) for node in order]
+    edges = cache.get(degrees, direction)
+    if edges is None:
+        G = construct(G, results, name, sample_size, return_type, tracker=tracker, 
+                      profiler=profiler)
+        if [G.degree(node) for node in order] == degrees:
+            position = {node: i for i, node in enumerate(order)}
+            cache.put(degrees, direction, [(position[u], position[v]) for u, v in G.edges()])
+        return G
+
+    edges_to_remove = list(G.edges())
+    edges_to_add = [(order[u], order[v]) for u, v in edges.tolist()]
+    G.remove_edges_from(edges_to_remove)
+    G.add_edges_from(edges_to_add)
+    tracker.remove_edges(edges_to_remove)
+    tracker.add_edges(edges_to_add)
+    row = {'name': name,
+           'iteration': 1, 
+           'time': time.time() - start, 
+           'r': tracker.r,
+           'target_r': 0,
+           'sample_size': sample_size, 
+           'edges_rewired': len(edges_to_add),
+           'duplicate_edges': 0, 
+           'self_edges': 0,
+           'existing_edges': 0, 
+           'repaired_edges': 0,
+           'preserved': True,
+           'method': 'max',
+           'summary': False}
+    record_row(results, row)
+    if profiler is not None:
+        profiler.lap(f'havel_hakimi_{direction}', 'cache_hit')
+    return G
+
+
+def resume_rewire(checkpoint):
+    """
+    Continues a rewire run from a file written by its checkpoint_path option.
+
+    The graph, random state, counters and results are restored and the fine 
+    tuning loop carries on from the saved iteration, with the arguments of 
+    the original rewire call. Checkpoints keep being written to the same 
+    file.
+
+    Parameters
+    ----------
+    checkpoint : str
+        path of the checkpoint file
+
+    Returns
+    -------
+    G : networkx.Graph
+        rewired graph, rebuilt from the checkpoint. Node and edge attributes 
+        of the original graph are not restored
+
+    results : pandas.DataFrame()
+        results of the whole run, as returned by rewire
+    """
+    state = RewireCheckpoint.load(checkpoint)
+    context = state['context']
+    loop = state['loop']
+    nodes = state['graph']['nodes']
+    if state['graph']['backend'] == 'compact':
+        G = CompactGraph.from_edge_array(len(nodes), loop['edge_list'], nodes)
+    else:
+        G = nx.Graph()
+        G.add_nodes_from(nodes)
+        G.add_edges_from(loop['edge_list'])
+
+    tracker = AssortativityTracker(G, context['resync_every'])
+    results = state['results']
+    resumed = RewireCheckpoint(checkpoint, state['every'], context)
+    resumed.loop_state = loop
+    random.setstate(state['random_state'])
+    if loop['direction'] == 'positive':
+        rewire_function = positively_rewire
+    else:
+        rewire_function = negatively_rewire
+    G = rewire_function(G, context['target_assortativity'], context['name'], results, 
+                        context['sample_size'], context['timed'], context['time_limit'], 
+                        tracker=tracker, n_candidates=context['n_candidates'], 
+                        tolerance=context['tolerance'], checkpoint=resumed, 
+                        repair=context.get('repair', False))
+
+    G, results = _finish_rewire(G, results, tracker, context['target_assortativity'], 
+                                context['method'], context['before'], context['return_type'])
+    if isinstance(G, CompactGraph):
+        G = G.to_networkx()
+    return G, results
+
+
+def rewire_iter(G, target_assortativity, name, window=1000, **kwargs):
+    """
+    Runs rewire and yields its results lazily, window rows at a time, as the 
+    run progresses.
+
+    rewire runs in a background thread with a ResultsStream handing each 
+    chunk of rows over a queue of bounded length, so at most a few windows 
+    are held in memory however long the run. The thread waits while the 
+    caller is not reading. Closing the generator early stops the run at the
+    next window; G is then left part way rewired.
+
+    Parameters
+    ----------
+    G, target_assortativity, name :
+        as in rewire. G is rewired in place
+    window : int
+        rows per yielded DataFrame. window=1 yields every iteration as it 
+        happens, at the cost of building a DataFrame per row
+    **kwargs
+        passed on to rewire, except checkpoint_path, sink and sink_rows
+
+    Yields
+    ------
+    pandas.DataFrame
+        the next window rows, with the columns documented in rewire. The last
+        one ends with the summary row
+    """
+    chunks = queue.Queue(maxsize=2)
+    stop = threading.Event()
+    done = object()
+
+    def handler(frame):
+        while True:
+            if stop.is_set():
+                raise _StreamClosed()
+            try:
+                chunks.put(frame, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def run():
+        try:
+            rewire(G, target_assortativity, name, sink=handler, sink_rows=window, **kwargs)
+            outcome = done
+        except _StreamClosed:
+            return
+        except BaseException as error:
+            outcome = error
+        while not stop.is_set():
+            try:
+                chunks.put(outcome, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    worker = threading.Thread(target=run, daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = chunks.get()
+            if item is done:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        worker.join()
+
+
+class _StreamClosed(Exception):
+    """
+    Raised inside the worker of rewire_iter to end the run once the 
+    generator has been closed.
+    """
 
+
+def _finish_rewire(G, results, tracker, target_assortativity, method, before, return_type):
+    """
+    Adds the summary row to the results of a rewire run and returns G and the
+    results as rewire does.
+    """
     after = degree_list(G)
     #we now have a dataframe of all of our relevant results
-    summary_row = {'name': results.loc[results.index[-1], 'name'],
-                   'iteration': results.loc[results.index[-1], 'iteration'], 
-                   'time': results['time'].sum(), 
-                   'r': nx.degree_assortativity_coefficient(G),
+    summary_row = {'name': results.last('name'),
+                   'iteration': results.last('iteration'), 
+                   'time': results.sum('time'), 
+                   'r': tracker.r,
                    'target_r': target_assortativity, 
-                   'sample_size': sample_size, 
-                   'edges_rewired': results['edges_rewired'].sum(),
-                   'duplicate_edges': results['duplicate_edges'].sum(), 
-                   'self_edges': results['self_edges'].sum(),
-                   'existing_edges': results['existing_edges'].sum(), 
+                   'sample_size': results.last('sample_size'), 
+                   'edges_rewired': results.sum('edges_rewired'),
+                   'duplicate_edges': results.sum('duplicate_edges'), 
+                   'self_edges': results.sum('self_edges'),
+                   'existing_edges': results.sum('existing_edges'), 
+                   'repaired_edges': results.sum('repaired_edges'),
                    'preserved': list(before) == list(after),
                    'method': 0,
                    'summary': True}
@@ -141,8 +591,8 @@ def rewire(
     if method == 'max':
         summary_row['method'] = 'max'
 
-    results.loc[len(results)] = summary_row
-    b_end = time.time()
+    results.append(summary_row)
+    results = results.to_frame()
     if return_type == 'summary':
         summarised_results = results.loc[(results['summary']==1)]
         return G, summarised_results
@@ -151,6 +601,168 @@ def rewire(
         return G, results
 
 
+def rewire_ladder(
+    G, 
+    targets, 
+    name, 
+    sample_size = 2, 
+    timed = False, 
+    time_limit = 600, 
+    method = 'new', 
+    snapshot = 'graph', 
+    return_type = 'full',
+    resync_every = None,
+    backend = 'networkx',
+    batch_size = None,
+    n_candidates = 1,
+    tolerance = None,
+    jit = None,
+    profiler = None,
+    repair = False,
+    hh_cache = None):
+    """
+    Rewires G through several target assortativity values in a single 
+    monotone walk, taking a snapshot of the graph as each target is reached. 
+    Replaces one rewire call per target, each repeating the Havel-Hakimi 
+    phase and the fine tuning from scratch.
+
+    Parameters
+    ----------
+    G : networkx.Graph
+        graph to be rewired. Left at the state of the last target reached
+    targets : list of float
+        target assortativity values, in any order
+    name : str
+        name to appear in results data set
+    sample_size, timed, time_limit, return_type, resync_every, backend, batch_size,
+    n_candidates, tolerance, jit, profiler, repair, hh_cache :
+        as in rewire. time_limit applies to the whole walk
+    method : string
+        can be 'new' or 'original'
+            new: the maximally assortative graph is built once and r is 
+                 lowered through the targets in descending order
+
+            original: r is raised through the targets above the starting 
+                      value, and lowered through those below it starting from
+                      a copy of the original graph
+    snapshot : string
+        can be 'graph' or 'edges'
+            'graph' : a copy of the graph at each target
+
+            'edges' : an (m, 2) array of the edges at each target, much 
+                      cheaper to store. nx.Graph(edges.tolist()) rebuilds it
+
+    Returns
+    -------
+    G : networkx.Graph
+        rewired graph, rewiring done in place
+
+    snapshots : dict
+        target -> snapshot, for every target reached before the time limit
+
+    results : pandas.DataFrame()
+        one row per iteration as in rewire, plus a summary row at each target
+        with the totals of the walk up to that point
+    """
+    if backend == 'compact' and not isinstance(G, CompactGraph):
+        H, snapshots, results = rewire_ladder(CompactGraph.from_networkx(G), targets, name, 
+                                              sample_size, timed, time_limit, method, snapshot, 
+                                              return_type, resync_every, batch_size=batch_size,
+                                              n_candidates=n_candidates, tolerance=tolerance,
+                                              jit=jit, profiler=profiler, repair=repair,
+                                              hh_cache=hh_cache)
+        if snapshot == 'graph':
+            snapshots = {t: S.to_networkx() for t, S in snapshots.items()}
+        return H.to_networkx(G), snapshots, results
+
+    b_start = time.time()
+    if isinstance(hh_cache, str):
+        hh_cache = ExtremalGraphCache(hh_cache)
+    targets = sorted(targets)
+    tracker = AssortativityTracker(G, resync_every)
+    if sample_size == 'auto':
+        logged_size = SampleSizeController().size
+    else:
+        logged_size = sample_size
+    first_row = {'name':name,
+                 'iteration': 0, 
+                 'time': 0, 
+                 'r': tracker.r,
+                 'target_r': targets[0], 
+                 'sample_size': logged_size, 
+                 'edges_rewired': 0,
+                 'duplicate_edges': 0, 
+                 'self_edges': 0,
+                 'existing_edges': 0, 
+                 'repaired_edges': 0,
+                 'preserved': True,
+                 'method': method,
+                 'summary':False}
+    results = ResultsRecorder([first_row])
+    before = degree_list(G)
+
+    #each walk is (graph, tracker, direction, targets in the order they are crossed)
+    if method == 'new':
+        G = _havel_hakimi(G, 'positive', results, name, logged_size, return_type, tracker,
+                          profiler, hh_cache)
+        walks = [(G, tracker, 'negative', targets[::-1])]
+    else:
+        above = [t for t in targets if t > tracker.r]
+        below = [t for t in targets if t <= tracker.r][::-1]
+        walks = [(G, tracker, 'positive', above)]
+        if below:
+            G_below = G.copy() if above else G
+            walks.append((G_below, AssortativityTracker(G_below, resync_every), 'negative', below))
+
+    tol = 0 if tolerance is None else tolerance
+    snapshots = {}
+    for H, walk_tracker, direction, walk_targets in walks:
+        for target in walk_targets:
+            remaining = time_limit - (time.time() - b_start)
+            if direction == 'positive':
+                H = positively_rewire(H, target, name, results, sample_size, timed, remaining, 
+                                      tracker=walk_tracker, batch_size=batch_size, 
+                                      n_candidates=n_candidates, tolerance=tolerance, jit=jit,
+                                      profiler=profiler, repair=repair)
+                reached = walk_tracker.r >= target - tol
+            else:
+                H = negatively_rewire(H, target, name, results, sample_size, timed, remaining, 
+                                      tracker=walk_tracker, batch_size=batch_size, 
+                                      n_candidates=n_candidates, tolerance=tolerance, jit=jit,
+                                      profiler=profiler, repair=repair)
+                reached = walk_tracker.r <= target + tol
+            if not reached:
+                break
+
+            if snapshot == 'edges':
+                if isinstance(H, CompactGraph):
+                    snapshots[target] = np.asarray(H.labels)[H.edge_array()]
+                else:
+                    snapshots[target] = np.array(list(H.edges()))
+            else:
+                snapshots[target] = H.copy()
+
+            summary_row = {'name': name,
+                           'iteration': results.last('iteration'), 
+                           'time': results.sum('time'), 
+                           'r': walk_tracker.r,
+                           'target_r': target, 
+                           'sample_size': results.last('sample_size'), 
+                           'edges_rewired': results.sum('edges_rewired'),
+                           'duplicate_edges': results.sum('duplicate_edges'), 
+                           'self_edges': results.sum('self_edges'),
+                           'existing_edges': results.sum('existing_edges'), 
+                           'repaired_edges': results.sum('repaired_edges'),
+                           'preserved': list(before) == list(degree_list(H)),
+                           'method': method,
+                           'summary': True}
+            results.append(summary_row)
+
+    results = results.to_frame()
+    if return_type == 'summary':
+        results = results.loc[(results['summary']==1)]
+    return G, snapshots, results
+
 
 
 def positively_rewire(
@@ -161,7 +773,15 @@ def positively_rewire(
     sample_size = 2, 
     timed = True, 
     time_limit=600,
-    property_checks=False):
+    property_checks=False,
+    tracker=None,
+    batch_size=None,
+    n_candidates=1,
+    tolerance=None,
+    checkpoint=None,
+    jit=None,
+    profiler=None,
+    repair=False):
     
     """
     Function for fine tuning the assortativity value of a graph.
@@ -174,12 +794,13 @@ def positively_rewire(
     target_assortativity: double
       desired assortativity value
 
-    results: pandas.DataFrame
-      DataFrame to be added to. One row per iteration. Must have columns as in 
+    results: ResultsRecorder or pandas.DataFrame
+      results to be added to. One row per iteration. Must have columns as in 
       rewire function
 
-    sample_size: int
-      number of edges to be rewired per iteration. The default is 2
+    sample_size: int or 'auto'
+      number of edges to be rewired per iteration. The default is 2. With 
+      'auto' a SampleSizeController adjusts it during the run
 
     timed: bool
       whether or not to stop the algorithm after a certain amount of time. The default 
@@ -188,6 +809,49 @@ def positively_rewire(
     time_limit: double
       time after which to stop iterating. The default is 600 seconds.
 
+    tracker: AssortativityTracker, optional
+      tracker holding the current assortativity of G. A new one is created 
+      if None.
+
+    batch_size: int, optional
+      if given, proposals are drawn batch_size at a time and checked and 
+      applied as NumPy arrays (see _rewire_batched) rather than one per 
+      iteration. Not supported with sample_size='auto', n_candidates > 1, 
+      checkpoint or repair. Disabled if None.
+
+    n_candidates: int
+      number of candidate swaps drawn per iteration. With more than one, the 
+      valid candidate whose r lands closest to the target is applied, and 
+      only if it closes some of the gap or reaches the target, which ends 
+      the run (see _best_candidate). The default is 1, which applies any
+      valid swap. The counts in each row cover all the candidates drawn
+
+    tolerance: double, optional
+      stop once r is within this distance of the target rather than once it
+      reaches it. Disabled if None.
+
+    checkpoint: RewireCheckpoint, optional
+      saves the loop state periodically. If its loop_state is set, the loop 
+      resumes from that state instead of starting afresh
+
+    jit: bool, optional
+      whether to run the loop on the compiled swap kernel (see _rewire_jit).
+      True requires it, None uses it whenever numba is installed and the 
+      other options allow it, and False never uses it. The kernel follows a
+      different trajectory than the Python loop for the same seed. The 
+      default is None
+
+    profiler: PhaseProfiler, optional
+      accumulates the time spent sampling, checking, mutating the graph, 
+      updating r and logging. Disabled if None
+
+    repair: bool
+      if True, a proposal with invalid pairs is not rejected outright: the 
+      valid pairs are kept and the endpoints of the invalid ones re-matched 
+      among themselves (see rematch_stubs). The proposal is only rejected 
+      if that fails. Re-matched edges are counted in repaired_edges. Not 
+      supported with n_candidates > 1. The default is False
+
     Returns
     -------
     G: nx.Graph
@@ -198,9 +862,42 @@ def positively_rewire(
     """
 
     alg_start = time.time()
+    if profiler is not None:
+        profiler.start()
     itr = 1
-    r = nx.degree_assortativity_coefficient(G)
-    while r < target_assortativity:
+    if tracker is None:
+        tracker = AssortativityTracker(G)
+    controller = None
+    if sample_size == 'auto':
+        controller = SampleSizeController(max_size=min(64, G.number_of_edges()))
+        sample_size = controller.size
+    tol = 0 if tolerance is None else tolerance
+    if repair and n_candidates > 1:
+        raise ValueError('repair cannot be combined with n_candidates > 1')
+    if _use_jit(jit, controller is None and n_candidates == 1 and batch_size is None 
+                and checkpoint is None and not repair, _JIT_OPTIONS):
+        return _rewire_jit(G, target_assortativity, name, results, sample_size, timed, 
+                           time_limit, tracker, 'positive', itr, tol, profiler=profiler)
+    if batch_size is not None:
+        if controller is not None or n_candidates > 1 or checkpoint is not None or repair:
+            raise ValueError(f'batch_size cannot be combined with {_BATCH_OPTIONS}')
+        return _rewire_batched(G, target_assortativity, name, results, sample_size, timed, 
+                               time_limit, tracker, batch_size, 'positive', itr, tol, profiler)
+    r = tracker.r
+    if checkpoint is not None and checkpoint.loop_state is not None:
+        #resuming, so pick the loop up exactly where the checkpoint left it
+        state = checkpoint.loop_state
+        checkpoint.loop_state = None
+        edge_index = _edge_index(G, state['edge_list'])
+        itr = state['itr']
+        sample_size = state['sample_size']
+        controller = state['controller']
+        alg_start = time.time() - state['elapsed']
+    else:
+        edge_index = _edge_index(G)
+    if profiler is not None:
+        profiler.lap('positively_rewire', 'setup')
+    while r < target_assortativity - tol:
         loop_start = time.time()
         itr += 1
         #define dictionary to track relevant info for each loop
@@ -214,34 +911,76 @@ def positively_rewire(
                'duplicate_edges': 0, 
                'self_edges': 0,
                'existing_edges': 0, 
+               'repaired_edges': 0,
                'preserved': True,
                'method': 'new',
                'summary': False}
 
-        edges = list(G.edges())                
-        edges_to_remove = random.sample(edges, sample_size)
-        deg_dict = {}
-        nodes = []
-        for edge in edges_to_remove:
-            for node in edge:
-                nodes.append(node)
-                deg_dict[node] = G.degree(node)
-    
-        nodes_sorted = sorted(nodes, key=deg_dict.get)
-        potential_edges = [[nodes_sorted[i], nodes_sorted[i+1]] for i in range(0,len(nodes_sorted),2)]
-        G.remove_edges_from(edges_to_remove)
-        edges_to_add, row = check_new_edges(potential_edges, G, row)
-                
-        if len(edges_to_add) == sample_size:
-            G.add_edges_from(edges_to_add)
-            row['edges_rewired'] += sample_size
+        if n_candidates > 1:
+            swap = _best_candidate(G, tracker, edge_index, sample_size, n_candidates, 
+                                   target_assortativity, 'positive', row)
+            if profiler is not None:
+                profiler.lap('positively_rewire', 'candidates')
+            accepted = swap is not None
+            if accepted:
+                edges_to_remove, edges_to_add = swap
+                G.remove_edges_from(edges_to_remove)
+                G.add_edges_from(edges_to_add)
+                edge_index.remove_edges_from(edges_to_remove)
+                edge_index.add_edges_from(edges_to_add)
+                row['edges_rewired'] += sample_size
         else:
-            G.add_edges_from(edges_to_remove)
+            edges_to_remove = edge_index.sample(sample_size)
+            nodes = [node for edge in edges_to_remove for node in edge]
+            #the tracker's degrees, fixed for the run, are a list read from
+            #the degree array on the compact backend
+            nodes_sorted = sorted(nodes, key=tracker.degree.__getitem__)
+            potential_edges = [[nodes_sorted[i], nodes_sorted[i+1]] for i in range(0,len(nodes_sorted),2)]
+            if profiler is not None:
+                profiler.lap('positively_rewire', 'sampling')
+            G.remove_edges_from(edges_to_remove)
+            edges_to_add, row = check_new_edges(potential_edges, G, row)
+            if profiler is not None:
+                profiler.lap('positively_rewire', 'check')
+                
+            accepted = len(edges_to_add) == sample_size
+            if not accepted and repair:
+                rematched = rematch_stubs(potential_edges, edges_to_add, G, tracker.degree, 'positive')
+                if rematched is not None:
+                    edges_to_add = edges_to_add + rematched
+                    row['repaired_edges'] += len(rematched)
+                    accepted = True
+            if accepted:
+                G.add_edges_from(edges_to_add)
+                edge_index.remove_edges_from(edges_to_remove)
+                edge_index.add_edges_from(edges_to_add)
+                row['edges_rewired'] += sample_size
+            else:
+                G.add_edges_from(edges_to_remove)
+        if profiler is not None:
+            profiler.lap('positively_rewire', 'mutation')
+            profiler.count('positively_rewire', 'accepted', accepted)
 
-        r = nx.degree_assortativity_coefficient(G)
+        if accepted:
+            tracker.swap(edges_to_remove, edges_to_add)
+        r_before = r
+        r = tracker.r
+        if profiler is not None:
+            profiler.lap('positively_rewire', 'assortativity')
         row['r'] = r
         row['time'] += time.time() - loop_start
-        results.loc[len(results)] = row
+        record_row(results, row)
+        if controller is not None:
+            sample_size = controller.update(row['edges_rewired'] > 0, r - r_before, row['time'])
+        if checkpoint is not None and checkpoint.due():
+            checkpoint.save(G, results, {'direction': 'positive',
+                                         'itr': itr,
+                                         'sample_size': sample_size,
+                                         'controller': controller,
+                                         'edge_list': edge_index.edge_list,
+                                         'elapsed': time.time() - alg_start})
+        if profiler is not None:
+            profiler.lap('positively_rewire', 'logging')
 
         time_elapsed = time.time() - alg_start
         
@@ -259,7 +998,15 @@ def negatively_rewire(
     results, 
     sample_size = 2, 
     timed = False, 
-    time_limit=600):
+    time_limit=600,
+    tracker=None,
+    batch_size=None,
+    n_candidates=1,
+    tolerance=None,
+    checkpoint=None,
+    jit=None,
+    profiler=None,
+    repair=False):
     
     """
     Function for fine tuning the assortativity value of a graph.
@@ -272,12 +1019,13 @@ def negatively_rewire(
     target_assortativity: double
       desired assortativity value
 
-    results: pandas.DataFrame
-      DataFrame to be added to. One row per iteration. Must have columns as in rewire 
+    results: ResultsRecorder or pandas.DataFrame
+      results to be added to. One row per iteration. Must have columns as in rewire 
       function
 
-    sample_size: int
-      number of edges to be rewired per iteration. The default is 2
+    sample_size: int or 'auto'
+      number of edges to be rewired per iteration. The default is 2. With 
+      'auto' a SampleSizeController adjusts it during the run
 
     timed: bool
       whether or not to stop the algorithm after a certain amount of time. The default 
@@ -286,6 +1034,49 @@ def negatively_rewire(
     time_limit: double
       time after which to stop iterating. The default is 600 seconds.
 
+    tracker: AssortativityTracker, optional
+      tracker holding the current assortativity of G. A new one is created 
+      if None.
+
+    batch_size: int, optional
+      if given, proposals are drawn batch_size at a time and checked and 
+      applied as NumPy arrays (see _rewire_batched) rather than one per 
+      iteration. Not supported with sample_size='auto', n_candidates > 1, 
+      checkpoint or repair. Disabled if None.
+
+    n_candidates: int
+      number of candidate swaps drawn per iteration. With more than one, the 
+      valid candidate whose r lands closest to the target is applied, and 
+      only if it closes some of the gap or reaches the target, which ends 
+      the run (see _best_candidate). The default is 1, which applies any
+      valid swap. The counts in each row cover all the candidates drawn
+
+    tolerance: double, optional
+      stop once r is within this distance of the target rather than once it
+      reaches it. Disabled if None.
+
+    checkpoint: RewireCheckpoint, optional
+      saves the loop state periodically. If its loop_state is set, the loop 
+      resumes from that state instead of starting afresh
+
+    jit: bool, optional
+      whether to run the loop on the compiled swap kernel (see _rewire_jit).
+      True requires it, None uses it whenever numba is installed and the 
+      other options allow it, and False never uses it. The kernel follows a
+      different trajectory than the Python loop for the same seed. The 
+      default is None
+
+    profiler: PhaseProfiler, optional
+      accumulates the time spent sampling, checking, mutating the graph, 
+      updating r and logging. Disabled if None
+
+    repair: bool
+      if True, a proposal with invalid pairs is not rejected outright: the 
+      valid pairs are kept and the endpoints of the invalid ones re-matched 
+      among themselves (see rematch_stubs). The proposal is only rejected 
+      if that fails. Re-matched edges are counted in repaired_edges. Not 
+      supported with n_candidates > 1. The default is False
+
     Returns
     -------
     G: nx.Graph
@@ -296,9 +1087,42 @@ def negatively_rewire(
     """
     
     alg_start = time.time()
+    if profiler is not None:
+        profiler.start()
     itr = 0
-    r = nx.degree_assortativity_coefficient(G)
-    while r > target_assortativity:
+    if tracker is None:
+        tracker = AssortativityTracker(G)
+    controller = None
+    if sample_size == 'auto':
+        controller = SampleSizeController(max_size=min(64, G.number_of_edges()))
+        sample_size = controller.size
+    tol = 0 if tolerance is None else tolerance
+    if repair and n_candidates > 1:
+        raise ValueError('repair cannot be combined with n_candidates > 1')
+    if _use_jit(jit, controller is None and n_candidates == 1 and batch_size is None 
+                and checkpoint is None and not repair, _JIT_OPTIONS):
+        return _rewire_jit(G, target_assortativity, name, results, sample_size, timed, 
+                           time_limit, tracker, 'negative', itr, tol, profiler=profiler)
+    if batch_size is not None:
+        if controller is not None or n_candidates > 1 or checkpoint is not None or repair:
+            raise ValueError(f'batch_size cannot be combined with {_BATCH_OPTIONS}')
+        return _rewire_batched(G, target_assortativity, name, results, sample_size, timed, 
+                               time_limit, tracker, batch_size, 'negative', itr, tol, profiler)
+    r = tracker.r
+    if checkpoint is not None and checkpoint.loop_state is not None:
+        #resuming, so pick the loop up exactly where the checkpoint left it
+        state = checkpoint.loop_state
+        checkpoint.loop_state = None
+        edge_index = _edge_index(G, state['edge_list'])
+        itr = state['itr']
+        sample_size = state['sample_size']
+        controller = state['controller']
+        alg_start = time.time() - state['elapsed']
+    else:
+        edge_index = _edge_index(G)
+    if profiler is not None:
+        profiler.lap('negatively_rewire', 'setup')
+    while r > target_assortativity + tol:
         loop_start = time.time()
         itr += 1
         #define dictionary to track relevant info for each loop
@@ -312,36 +1136,78 @@ def negatively_rewire(
                'duplicate_edges': 0, 
                'self_edges': 0,
                'existing_edges': 0, 
+               'repaired_edges': 0,
                'preserved': True,
                'method': 'new',
                'summary': False}
 
-        edges = list(G.edges())                
-        edges_to_remove = random.sample(edges, sample_size)
-        deg_dict = {}
-        nodes = []
-        for edge in edges_to_remove:
-            for node in edge:
-                nodes.append(node)
-                deg_dict[node] = G.degree(node)
-    
-        nodes_sorted = sorted(nodes, key = deg_dict.get)
-        n_nodes = int(len(nodes_sorted)/2)
+        if n_candidates > 1:
+            swap = _best_candidate(G, tracker, edge_index, sample_size, n_candidates, 
+                                   target_assortativity, 'negative', row)
+            if profiler is not None:
+                profiler.lap('negatively_rewire', 'candidates')
+            accepted = swap is not None
+            if accepted:
+                edges_to_remove, edges_to_add = swap
+                G.remove_edges_from(edges_to_remove)
+                G.add_edges_from(edges_to_add)
+                edge_index.remove_edges_from(edges_to_remove)
+                edge_index.add_edges_from(edges_to_add)
+                row['edges_rewired'] += sample_size
+        else:
+            edges_to_remove = edge_index.sample(sample_size)
+            nodes = [node for edge in edges_to_remove for node in edge]
+            #the tracker's degrees, fixed for the run, are a list read from
+            #the degree array on the compact backend
+            nodes_sorted = sorted(nodes, key = tracker.degree.__getitem__)
+            n_nodes = int(len(nodes_sorted)/2)
         
-        potential_edges = [(nodes_sorted[i], nodes_sorted[len(nodes) - 1 - i]) for i in range(n_nodes)]
-        G.remove_edges_from(edges_to_remove)
-        edges_to_add, row = check_new_edges(potential_edges, G, row)
+            potential_edges = [(nodes_sorted[i], nodes_sorted[len(nodes) - 1 - i]) for i in range(n_nodes)]
+            if profiler is not None:
+                profiler.lap('negatively_rewire', 'sampling')
+            G.remove_edges_from(edges_to_remove)
+            edges_to_add, row = check_new_edges(potential_edges, G, row)
+            if profiler is not None:
+                profiler.lap('negatively_rewire', 'check')
         
-        if len(edges_to_add) == len(potential_edges):
-            G.add_edges_from(edges_to_add)
-            row['edges_rewired'] += sample_size
-        else:
-            G.add_edges_from(edges_to_remove)
+            accepted = len(edges_to_add) == len(potential_edges)
+            if not accepted and repair:
+                rematched = rematch_stubs(potential_edges, edges_to_add, G, tracker.degree, 'negative')
+                if rematched is not None:
+                    edges_to_add = edges_to_add + rematched
+                    row['repaired_edges'] += len(rematched)
+                    accepted = True
+            if accepted:
+                G.add_edges_from(edges_to_add)
+                edge_index.remove_edges_from(edges_to_remove)
+                edge_index.add_edges_from(edges_to_add)
+                row['edges_rewired'] += sample_size
+            else:
+                G.add_edges_from(edges_to_remove)
+        if profiler is not None:
+            profiler.lap('negatively_rewire', 'mutation')
+            profiler.count('negatively_rewire', 'accepted', accepted)
 
-        r = nx.degree_assortativity_coefficient(G)
+        if accepted:
+            tracker.swap(edges_to_remove, edges_to_add)
+        r_before = r
+        r = tracker.r
+        if profiler is not None:
+            profiler.lap('negatively_rewire', 'assortativity')
         row['time'] += time.time() - loop_start
         row['r'] = r
-        results.loc[len(results)] = row
+        record_row(results, row)
+        if controller is not None:
+            sample_size = controller.update(row['edges_rewired'] > 0, r_before - r, row['time'])
+        if checkpoint is not None and checkpoint.due():
+            checkpoint.save(G, results, {'direction': 'negative',
+                                         'itr': itr,
+                                         'sample_size': sample_size,
+                                         'controller': controller,
+                                         'edge_list': edge_index.edge_list,
+                                         'elapsed': time.time() - alg_start})
+        if profiler is not None:
+            profiler.lap('negatively_rewire', 'logging')
         time_elapsed = time.time() - alg_start
 
         if timed == True:
@@ -351,3 +1217,352 @@ def negatively_rewire(
     return G
 
 
+
+
+def _rewire_jit(
+    G, 
+    target_assortativity, 
+    name, 
+    results, 
+    sample_size, 
+    timed, 
+    time_limit, 
+    tracker, 
+    direction, 
+    itr,
+    tol=0,
+    chunk_size=1024,
+    profiler=None):
+    """
+    Compiled version of the positively_rewire / negatively_rewire loop.
+
+    The graph is copied into an int64 edge array and a hashed edge set, and
+    swap_kernel._swap_chunk runs the proposal / check / swap steps on them 
+    chunk_size iterations at a time. Between chunks, control returns to 
+    Python to append the chunk's rows to results in bulk and check the time
+    limit. The rows of a chunk share its running time equally. The final 
+    edge array is written back to G, and S_p to the tracker, once at the 
+    end.
+
+    The kernel has its own random stream, seeded from the random module, so
+    runs are reproducible with random.seed but do not follow the same 
+    trajectory as the Python loop. direction is 'positive' (raising r) or 
+    'negative' (lowering r). profiler, if given, gets the time spent in the 
+    kernel and in logging its results, under '_rewire_jit'.
+    """
+    alg_start = time.time()
+    def reached(r):
+        if direction == 'positive':
+            return r >= target_assortativity - tol
+        return r <= target_assortativity + tol
+
+    k = sample_size
+    if k > G.number_of_edges():
+        raise ValueError('sample_size is larger than the number of edges')
+    denominator = 2*tracker.m*tracker.S_2 - tracker.S_1*tracker.S_1
+    if reached(tracker.r) or denominator == 0:
+        #r is already there, or is undefined and no swap can change it
+        return G
+
+    nodes, edges, deg = _edge_arrays(G, tracker)
+    edge_table = build_edge_table(edges, len(nodes))
+    state = np.array([tracker.S_p, 0], dtype=np.int64)
+
+    accepted = np.zeros(chunk_size, dtype=np.bool_)
+    duplicate_edges = np.zeros(chunk_size, dtype=np.float64)
+    self_edges = np.zeros(chunk_size, dtype=np.int64)
+    existing_edges = np.zeros(chunk_size, dtype=np.int64)
+    r_out = np.zeros(chunk_size, dtype=np.float64)
+    n_accepted = 0
+    _seed(random.getrandbits(32))
+    if profiler is not None:
+        profiler.lap('_rewire_jit', 'setup')
+
+    while True:
+        chunk_start = time.time()
+        n_done = _swap_chunk(edges, edge_table, state, deg, len(nodes), k, 
+                             direction == 'positive', target_assortativity, tol, 
+                             4.0*tracker.m, float(tracker.S_1*tracker.S_1), 
+                             float(denominator), chunk_size, accepted, duplicate_edges, 
+                             self_edges, existing_edges, r_out)
+        if profiler is not None:
+            profiler.lap('_rewire_jit', 'kernel')
+        record_rows(results, {'name': name,
+                              'iteration': np.arange(itr + 1, itr + n_done + 1),
+                              'time': (time.time() - chunk_start)/n_done,
+                              'r': r_out[:n_done],
+                              'target_r': target_assortativity,
+                              'sample_size': sample_size,
+                              'edges_rewired': accepted[:n_done]*sample_size,
+                              'duplicate_edges': duplicate_edges[:n_done],
+                              'self_edges': self_edges[:n_done],
+                              'existing_edges': existing_edges[:n_done],
+                              'repaired_edges': 0,
+                              'preserved': True,
+                              'method': 'new',
+                              'summary': False}, n_done)
+        itr += n_done
+        n_accepted += int(accepted[:n_done].sum())
+        if profiler is not None:
+            profiler.lap('_rewire_jit', 'logging')
+            profiler.count('_rewire_jit', 'accepted', int(accepted[:n_done].sum()))
+
+        if reached(r_out[n_done - 1]):
+            break
+        if timed == True:
+            if time.time() - alg_start > time_limit:
+                break
+
+    _write_back(G, tracker, edges, int(state[0]), n_accepted)
+    if profiler is not None:
+        profiler.lap('_rewire_jit', 'write_back')
+    return G
+
+
+def _rewire_batched(
+    G, 
+    target_assortativity, 
+    name, 
+    results, 
+    sample_size, 
+    timed, 
+    time_limit, 
+    tracker, 
+    batch_size, 
+    direction, 
+    itr,
+    tol=0,
+    profiler=None):
+    """
+    Batched version of the positively_rewire / negatively_rewire loop, on 
+    NumPy arrays.
+
+    Each batch draws batch_size groups of sample_size edges from the edge 
+    array, all distinct, sorts and pairs the endpoints of every group by 
+    degree as the loop does, and checks all the pairs for self, existing and
+    duplicate edges at once. The groups that pass are applied together: 
+    their new edges overwrite the rows of the edges they remove, and the 
+    sorted array of edge keys used for the existing edge checks is updated
+    in one pass. One row is recorded per group, the rows of a batch sharing
+    its running time, and the batch is cut at the first group reaching the
+    target.
+
+    Every group is checked against the graph at the start of its batch with
+    its own edges taken out, as in the loop. A group proposing an edge that
+    an earlier group of the batch adds is rejected, with that edge counted 
+    as existing, as the loop would. The accepted groups are therefore a 
+    sequence of valid degree preserving swaps, and the only difference from
+    the loop is that a group never samples an edge added earlier in its 
+    batch, which is negligible while batch_size*sample_size is small next 
+    to m. The random stream is numpy's, seeded from the random module, so 
+    runs are reproducible with random.seed but do not follow the loop's 
+    trajectory. direction is 'positive' (raising r) or 'negative' (lowering
+    r). profiler, if given, gets the time spent under '_rewire_batched'.
+    """
+    alg_start = time.time()
+    def reached(r):
+        if direction == 'positive':
+            return r >= target_assortativity - tol
+        return r <= target_assortativity + tol
+
+    k = sample_size
+    m = G.number_of_edges()
+    if k > m:
+        raise ValueError('sample_size is larger than the number of edges')
+    denominator = 2*tracker.m*tracker.S_2 - tracker.S_1*tracker.S_1
+    if reached(tracker.r) or denominator == 0:
+        #r is already there, or is undefined and no swap can change it
+        return G
+
+    nodes, edges, deg = _edge_arrays(G, tracker)
+    n = len(nodes)
+    keys = np.sort(edges[:, 0]*n + edges[:, 1])
+    if direction == 'positive':
+        left = np.arange(0, 2*k, 2)
+        right = left + 1
+    else:
+        left = np.arange(k)
+        right = 2*k - 1 - left
+    n_groups = min(batch_size, m//k)
+    others = ~np.eye(k, dtype=bool)
+    S_p = tracker.S_p
+    n_accepted = 0
+    rng = np.random.default_rng(random.getrandbits(64))
+    if profiler is not None:
+        profiler.lap('_rewire_batched', 'setup')
+
+    while True:
+        batch_start = time.time()
+        idx = rng.choice(m, size=(n_groups, k), replace=False)
+        old = edges[idx]
+        old_keys = old[:, :, 0]*n + old[:, :, 1]
+        #sort each group's endpoints by degree, stable as sorted() is, and pair them
+        ends = old.reshape(n_groups, 2*k)
+        ends = np.take_along_axis(ends, np.argsort(deg[ends], axis=1, kind='stable'), axis=1)
+        u = np.minimum(ends[:, left], ends[:, right])
+        v = np.maximum(ends[:, left], ends[:, right])
+        new_keys = u*n + v
+        if profiler is not None:
+            profiler.lap('_rewire_batched', 'sampling')
+
+        #the checks of check_new_edges, in its order: existing, self, duplicate
+        pos = np.minimum(np.searchsorted(keys, new_keys), m - 1)
+        own = (new_keys[:, :, None] == old_keys[:, None, :]).any(axis=2)
+        existing = (keys[pos] == new_keys) & ~own
+        self_edge = u == v
+        same = (new_keys[:, :, None] == new_keys[:, None, :]) & others
+        duplicate = same.any(axis=2) & ~existing & ~self_edge
+        valid = ~(existing | self_edge | duplicate).any(axis=1)
+        #an edge proposed by several valid groups goes to the first of them;
+        #the later ones find it existing
+        group = np.repeat(np.flatnonzero(valid), k)
+        proposed = new_keys[valid].ravel()
+        order = np.lexsort((group, proposed))
+        proposed = proposed[order]
+        group = group[order]
+        first = np.ones(len(proposed), dtype=bool)
+        first[1:] = proposed[1:] != proposed[:-1]
+        taken = ~first
+        clashes = np.bincount(group[taken], minlength=n_groups)
+        accepted = valid & (clashes == 0)
+        if profiler is not None:
+            profiler.lap('_rewire_batched', 'check')
+
+        gain = (deg[u]*deg[v]).sum(axis=1) - (deg[old[:, :, 0]]*deg[old[:, :, 1]]).sum(axis=1)
+        S_p_after = S_p + np.cumsum(gain*accepted)
+        r_after = (4.0*tracker.m*S_p_after - float(tracker.S_1*tracker.S_1))/float(denominator)
+        if direction == 'positive':
+            hit = np.flatnonzero(r_after >= target_assortativity - tol)
+        else:
+            hit = np.flatnonzero(r_after <= target_assortativity + tol)
+        n_done = int(hit[0]) + 1 if len(hit) else n_groups
+        accepted = accepted[:n_done]
+        S_p = int(S_p_after[n_done - 1])
+        if profiler is not None:
+            profiler.lap('_rewire_batched', 'assortativity')
+
+        rows = idx[:n_done][accepted].ravel()
+        edges[rows, 0] = u[:n_done][accepted].ravel()
+        edges[rows, 1] = v[:n_done][accepted].ravel()
+        removed = old_keys[:n_done][accepted].ravel()
+        added = np.sort(new_keys[:n_done][accepted].ravel())
+        keys = np.delete(keys, np.searchsorted(keys, removed))
+        keys = np.insert(keys, np.searchsorted(keys, added), added)
+        if profiler is not None:
+            profiler.lap('_rewire_batched', 'mutation')
+
+        record_rows(results, {'name': name,
+                              'iteration': np.arange(itr + 1, itr + n_done + 1),
+                              'time': (time.time() - batch_start)/n_done,
+                              'r': r_after[:n_done],
+                              'target_r': target_assortativity,
+                              'sample_size': sample_size,
+                              'edges_rewired': accepted*sample_size,
+                              'duplicate_edges': 0.5*duplicate[:n_done].sum(axis=1),
+                              'self_edges': self_edge[:n_done].sum(axis=1),
+                              'existing_edges': existing[:n_done].sum(axis=1) + clashes[:n_done],
+                              'repaired_edges': 0,
+                              'preserved': True,
+                              'method': 'new',
+                              'summary': False}, n_done)
+        itr += n_done
+        n_accepted += int(accepted.sum())
+        if profiler is not None:
+            profiler.lap('_rewire_batched', 'logging')
+            profiler.count('_rewire_batched', 'accepted', int(accepted.sum()))
+
+        if len(hit):
+            break
+        if timed == True:
+            if time.time() - alg_start > time_limit:
+                break
+
+    _write_back(G, tracker, edges, S_p, n_accepted)
+    if profiler is not None:
+        profiler.lap('_rewire_batched', 'write_back')
+    return G
+
+
+def _edge_arrays(G, tracker):
+    """
+    Returns the nodes of G as a list, its edges as an (m, 2) int64 array of
+    positions in that list with u < v in each row, and the tracker's degree
+    of each node as an int64 array.
+    """
+    nodes = list(G.nodes())
+    if isinstance(G, CompactGraph):
+        edges = G.edge_array().astype(np.int64)
+    else:
+        index = {node: i for i, node in enumerate(nodes)}
+        pairs = np.array([(index[u], index[v]) for u, v in G.edges()], dtype=np.int64).reshape(-1, 2)
+        edges = np.column_stack((pairs.min(axis=1), pairs.max(axis=1)))
+    deg = np.array([tracker.degree[node] for node in nodes], dtype=np.int64)
+    return nodes, edges, deg
+
+
+def _write_back(G, tracker, edges, S_p, n_accepted):
+    """
+    Writes the edge array left by _rewire_jit or _rewire_batched back to G,
+    and its S_p and number of accepted swaps to the tracker.
+    """
+    _set_edges(G, edges)
+    tracker.S_p = S_p
+    tracker.updates += n_accepted
+    if tracker.resync_every is not None and tracker.updates >= tracker.resync_every:
+        tracker.resync()
+
+
+def _best_candidate(
+    G, 
+    tracker, 
+    edge_index, 
+    sample_size, 
+    n_candidates, 
+    target_assortativity, 
+    direction, 
+    row):
+    """
+    Draws n_candidates proposals the way positively_rewire ('positive') or 
+    negatively_rewire ('negative') does and scores the valid ones with
+    tracker.r_after, which costs O(sample_size) each.
+
+    Returns (edges_to_remove, edges_to_add) for the candidate leaving r 
+    closest to the target. If no valid candidate gets closer than r is now,
+    the closest one that reaches or crosses the target is returned instead,
+    which ends the run: near the target every swap may overshoot by more 
+    than the remaining gap, and rejecting them all would never terminate. 
+    Returns None if there is neither. G is left unchanged; the checks are 
+    counted into row.
+    """
+    best = None
+    best_gap = abs(target_assortativity - tracker.r)
+    crossing = None
+    crossing_gap = np.inf
+    for _ in range(n_candidates):
+        edges_to_remove = edge_index.sample(sample_size)
+        nodes = [node for edge in edges_to_remove for node in edge]
+        nodes_sorted = sorted(nodes, key=tracker.degree.__getitem__)
+        if direction == 'positive':
+            potential_edges = [[nodes_sorted[i], nodes_sorted[i+1]] for i in range(0,len(nodes_sorted),2)]
+        else:
+            n_nodes = int(len(nodes_sorted)/2)
+            potential_edges = [(nodes_sorted[i], nodes_sorted[len(nodes) - 1 - i]) for i in range(n_nodes)]
+
+        G.remove_edges_from(edges_to_remove)
+        edges_to_add, row = check_new_edges(potential_edges, G, row)
+        G.add_edges_from(edges_to_remove)
+        if len(edges_to_add) == sample_size:
+            r_new = tracker.r_after(edges_to_remove, edges_to_add)
+            gap = abs(target_assortativity - r_new)
+            if direction == 'positive':
+                crosses = r_new >= target_assortativity
+            else:
+                crosses = r_new <= target_assortativity
+            if gap < best_gap:
+                best = (edges_to_remove, edges_to_add)
+                best_gap = gap
+            elif crosses and gap < crossing_gap:
+                crossing = (edges_to_remove, edges_to_add)
+                crossing_gap = gap
+
+    return best if best is not None else crossing
@@ -10,6 +10,12 @@ import numpy as np
 import pandas as pd
 import time
 import random
+import os
+import pickle
+import hashlib
+from array import array
+from collections import Counter, OrderedDict, defaultdict
+from .compact_graph import CompactGraph
 
 
 def degree_list(G):
@@ -17,7 +23,7 @@ def degree_list(G):
     Parameters
     ----------
 
-    G : networkx.Graph OR list
+    G : networkx.Graph, CompactGraph OR list
 
 
     Returns
@@ -29,19 +35,960 @@ def degree_list(G):
     if type(G) == nx.classes.graph.Graph:
         degree_dict = dict(G.degree())
         degree_list = list(degree_dict.values())
+    elif isinstance(G, CompactGraph):
+        degree_list = G.deg.tolist()
     else:
         degree_list = G
     degree_list.sort()
 
     return np.array(degree_list)
 
+class AssortativityTracker:
+    """
+    Tracks the degree assortativity of a graph incrementally.
+
+    Keeps the sufficient statistics of the Pearson correlation over edge ends,
+    so that r can be updated from only the edges removed and added by a swap
+    rather than recomputed over the whole graph. Each undirected edge (u, v)
+    contributes both (d_u, d_v) and (d_v, d_u), giving
+
+        r = (S_p/m - (S_1/2m)^2) / (S_2/2m - (S_1/2m)^2)
+
+    with S_p = sum of d_u*d_v, S_1 = sum of d_u + d_v and S_2 = sum of
+    d_u^2 + d_v^2 over the m edges.
+
+    Degrees are read once from G and held fixed, which is exact for any
+    degree-preserving rewiring. The statistics are kept as Python ints so
+    updates do not accumulate floating point error.
+
+    Parameters
+    ----------
+    G : networkx.Graph
+        graph to track. Must be the graph the edge updates are applied to.
+    resync_every : int, optional
+        recompute the statistics exactly from G after this many updates, as a
+        guard against G being modified without informing the tracker.
+        Disabled if None.
+    """
+
+    def __init__(self, G, resync_every=None):
+        self.G = G
+        self.resync_every = resync_every
+        self.resync()
+
+    def resync(self):
+        """
+        Recomputes the degrees and statistics from scratch, O(m). For a
+        CompactGraph, degree is a list indexed by node read from its degree
+        array, and the statistics are summed over its edge array.
+        """
+        if isinstance(self.G, CompactGraph):
+            deg = self.G.deg.astype(np.int64)
+            edges = self.G.edge_array()
+            du = deg[edges[:, 0]]
+            dv = deg[edges[:, 1]]
+            self.degree = deg.tolist()
+            self.m = len(edges)
+            self.S_1 = int((du + dv).sum())
+            self.S_2 = int((du*du + dv*dv).sum())
+            self.S_p = int((du*dv).sum())
+            self.updates = 0
+            return
+        self.degree = dict(self.G.degree())
+        self.m = 0
+        self.S_1 = 0
+        self.S_2 = 0
+        self.S_p = 0
+        self.updates = 0
+        self.add_edges(self.G.edges())
+
+    def add_edges(self, edges):
+        degree = self.degree
+        for u, v in edges:
+            du = degree[u]
+            dv = degree[v]
+            self.m += 1
+            self.S_1 += du + dv
+            self.S_2 += du*du + dv*dv
+            self.S_p += du*dv
+
+    def remove_edges(self, edges):
+        degree = self.degree
+        for u, v in edges:
+            du = degree[u]
+            dv = degree[v]
+            self.m -= 1
+            self.S_1 -= du + dv
+            self.S_2 -= du*du + dv*dv
+            self.S_p -= du*dv
+
+    def swap(self, edges_removed, edges_added):
+        """
+        Records a rewiring step in which edges_removed were replaced by
+        edges_added, resyncing from G if resync_every updates have passed.
+        """
+        self.remove_edges(edges_removed)
+        self.add_edges(edges_added)
+        self.updates += 1
+        if self.resync_every is not None and self.updates >= self.resync_every:
+            self.resync()
+
+    def r_after(self, edges_removed, edges_added):
+        """
+        The value r would take if edges_removed were replaced by edges_added,
+        without applying the change. Assumes the swap preserves degrees, so 
+        only S_p moves.
+        """
+        degree = self.degree
+        S_p = self.S_p
+        for u, v in edges_removed:
+            S_p -= degree[u]*degree[v]
+        for u, v in edges_added:
+            S_p += degree[u]*degree[v]
+        denominator = 2*self.m*self.S_2 - self.S_1*self.S_1
+        if self.m == 0 or denominator == 0:
+            return float('nan')
+        return (4*self.m*S_p - self.S_1*self.S_1)/denominator
+
+    @property
+    def r(self):
+        """
+        Current degree assortativity; nan if undefined, e.g. for a regular graph.
+        """
+        # Multiplied through by 4m^2 so everything but the final division is
+        # exact integer arithmetic.
+        denominator = 2*self.m*self.S_2 - self.S_1*self.S_1
+        if self.m == 0 or denominator == 0:
+            return float('nan')
+        return (4*self.m*self.S_p - self.S_1*self.S_1)/denominator
+
+
+class EdgeIndex:
+    """
+    Edge list plus an index map, giving O(1) uniform sampling, insertion and
+    removal of edges without copying the edge list. Removal swaps the last 
+    edge into the freed slot. The index is keyed by canon(u, v), so (u, v) 
+    and (v, u) refer to the same entry; edges keep the orientation they 
+    were added with.
+
+    Parameters
+    ----------
+    edges : iterable of 2-tuples
+        initial edges, e.g. G.edges()
+    """
+
+    def __init__(self, edges):
+        self.edge_list = [tuple(edge) for edge in edges]
+        self.edge_index = {self.canon(*e): i for i, e in enumerate(self.edge_list)}
+
+    @staticmethod
+    def canon(a, b):
+        """
+        Orientation-free key of the edge (a, b): the pair ordered by hash, 
+        so node labels need not be comparable, or a frozenset if the hashes 
+        tie. Cheaper to build and hash than a frozenset for every edge.
+        """
+        ha = hash(a)
+        hb = hash(b)
+        if ha < hb:
+            return (a, b)
+        if hb < ha:
+            return (b, a)
+        return frozenset((a, b))
+
+    def __len__(self):
+        return len(self.edge_list)
+
+    def __contains__(self, edge):
+        return self.canon(*edge) in self.edge_index
+
+    def sample(self, k):
+        """
+        Returns k distinct edges chosen uniformly at random.
+        """
+        return random.sample(self.edge_list, k)
+
+    def add(self, edge):
+        self.edge_index[self.canon(*edge)] = len(self.edge_list)
+        self.edge_list.append(tuple(edge))
+
+    def remove(self, edge):
+        i = self.edge_index.pop(self.canon(*edge))
+        last = self.edge_list[-1]
+        if i != len(self.edge_list) - 1:
+            self.edge_list[i] = last
+            self.edge_index[self.canon(*last)] = i
+        self.edge_list.pop()
+
+    def add_edges_from(self, edges):
+        for edge in edges:
+            self.add(edge)
+
+    def remove_edges_from(self, edges):
+        for edge in edges:
+            self.remove(edge)
+
+
+class CompactEdgeIndex:
+    """
+    EdgeIndex for a CompactGraph, held in flat integer arrays rather than a
+    list of tuples and a dict: the edges as an (m, 2) int32 array stored
+    row by row, and an open addressing hash table (linear probing) mapping
+    the key min(u, v)*n + max(u, v) of each edge to its row. The table has
+    between 2 and 4 slots of 12 bytes per edge, so the index takes 32 to 56
+    bytes per edge (about 42 for 200,000 edges) where EdgeIndex takes about
+    200. It samples the same rows as EdgeIndex for the same random state.
+
+    Parameters
+    ----------
+    n : int
+        number of nodes of the graph
+    edges : (m, 2) array or iterable of 2-tuples of int
+        initial edges, e.g. H.edge_array()
+    """
+
+    #Fibonacci hashing: bits 32 and up of key*_MULT mix every bit of the key
+    _MULT = 0x9E3779B97F4A7C15
+
+    def __init__(self, n, edges):
+        edges = np.asarray(edges, dtype=np.int32).reshape(-1, 2)
+        self.n = n
+        self.edges = array('i', edges.tobytes())
+        bits = max(2*len(edges) - 1, 1).bit_length()
+        self.mask = (1 << bits) - 1
+        keys = np.full(self.mask + 1, -1, dtype=np.int64)
+        rows = np.zeros(self.mask + 1, dtype=np.int32)
+        #linear probing, one probe step for every pending key at a time: a 
+        #key takes its slot if it is free and no earlier key wants it, and 
+        #moves on otherwise, so every slot it passed is filled
+        pending = np.arange(len(edges))
+        edge_keys = edges.min(axis=1).astype(np.int64)*n + edges.max(axis=1)
+        slot = ((edge_keys.astype(np.uint64)*np.uint64(self._MULT)) >> np.uint64(32)).astype(np.int64) & self.mask
+        while len(pending):
+            free = keys[slot] == -1
+            first = np.zeros(len(pending), dtype=bool)
+            first[np.unique(slot, return_index=True)[1]] = True
+            placed = free & first
+            keys[slot[placed]] = edge_keys[pending[placed]]
+            rows[slot[placed]] = pending[placed]
+            pending = pending[~placed]
+            slot = (slot[~placed] + 1) & self.mask
+        self.keys = array('q', keys.tobytes())
+        self.rows = array('i', rows.tobytes())
+
+    def _slot(self, u, v):
+        """
+        Slot holding the edge (u, v), or the empty slot where it would go.
+        """
+        key = u*self.n + v if u < v else v*self.n + u
+        keys = self.keys
+        mask = self.mask
+        i = ((key*self._MULT) >> 32) & mask
+        k = keys[i]
+        while k != key and k != -1:
+            i = (i + 1) & mask
+            k = keys[i]
+        return i, key
+
+    @property
+    def edge_list(self):
+        e = self.edges
+        return list(zip(e[0::2], e[1::2]))
+
+    def __len__(self):
+        return len(self.edges)//2
+
+    def __contains__(self, edge):
+        return self.keys[self._slot(*edge)[0]] != -1
+
+    def sample(self, k):
+        """
+        Returns k distinct edges chosen uniformly at random.
+        """
+        e = self.edges
+        return [(e[2*i], e[2*i + 1]) for i in random.sample(range(len(e)//2), k)]
+
+    def add(self, edge):
+        u, v = edge
+        i, key = self._slot(u, v)
+        self.keys[i] = key
+        self.rows[i] = len(self.edges)//2
+        self.edges.append(u)
+        self.edges.append(v)
+
+    def remove(self, edge):
+        e = self.edges
+        keys = self.keys
+        rows = self.rows
+        mask = self.mask
+        i, key = self._slot(*edge)
+        if keys[i] == -1:
+            raise KeyError(edge)
+        row = rows[i]
+        #backward shift deletion: later keys of the probe run move up into 
+        #the hole, so lookups never meet tombstones
+        j = i
+        while True:
+            j = (j + 1) & mask
+            k = keys[j]
+            if k == -1:
+                break
+            if (j - (((k*self._MULT) >> 32) & mask)) & mask >= (j - i) & mask:
+                keys[i] = k
+                rows[i] = rows[j]
+                i = j
+        keys[i] = -1
+        #the last edge fills the freed row
+        last = len(e)//2 - 1
+        if row != last:
+            u = e[2*last]
+            v = e[2*last + 1]
+            e[2*row] = u
+            e[2*row + 1] = v
+            rows[self._slot(u, v)[0]] = row
+        del e[2*last:]
+
+    def add_edges_from(self, edges):
+        for edge in edges:
+            self.add(edge)
+
+    def remove_edges_from(self, edges):
+        for edge in edges:
+            self.remove(edge)
+
+
+def _edge_index(G, edges=None):
+    """
+    Edge index of G's edges, or of edges if given: a CompactEdgeIndex for a
+    CompactGraph, an EdgeIndex otherwise.
+    """
+    if isinstance(G, CompactGraph):
+        return CompactEdgeIndex(G.n, G.edge_array() if edges is None else edges)
+    return EdgeIndex(G.edges() if edges is None else edges)
+
+
+#column schema of the results DataFrame returned by rewire(), with the dtype
+#each column is stored as. 'category' columns are stored as integer codes
+RESULTS_COLUMNS = {'name': 'category',
+                   'iteration': np.int64,
+                   'time': np.float64,
+                   'r': np.float64,
+                   'target_r': np.float64,
+                   'sample_size': np.int64,
+                   'edges_rewired': np.int64,
+                   'duplicate_edges': np.float64,
+                   'self_edges': np.int64,
+                   'existing_edges': np.int64,
+                   'repaired_edges': np.int64,
+                   'preserved': np.bool_,
+                   'method': 'category',
+                   'summary': np.bool_}
+
+
+class ResultsRecorder:
+    """
+    Collects results rows into growable NumPy column buffers, to be turned 
+    into a DataFrame once at the end of a run. Appending a row is amortised 
+    O(1), where results.loc[len(results)] = row copies the whole frame.
+
+    Parameters
+    ----------
+    rows : list of dict, optional
+        rows to start with
+    columns : dict, optional
+        column name -> dtype, or 'category' for string-like columns. The 
+        default is RESULTS_COLUMNS
+    capacity : int
+        initial number of rows allocated. Buffers double when full.
+    """
+
+    def __init__(self, rows=None, columns=None, capacity=1024):
+        if columns is None:
+            columns = RESULTS_COLUMNS
+        self.columns = dict(columns)
+        self.n_rows = 0
+        self.capacity = max(capacity, 1)
+        self.buffers = {}
+        self.categories = {}
+        for col, dtype in self.columns.items():
+            if dtype == 'category':
+                self.buffers[col] = np.zeros(self.capacity, dtype=np.int32)
+                self.categories[col] = {}
+            else:
+                self.buffers[col] = np.zeros(self.capacity, dtype=dtype)
+        if rows is not None:
+            for row in rows:
+                self.append(row)
+
+    def __len__(self):
+        return self.n_rows
+
+    def _grow(self):
+        self.capacity *= 2
+        for col, buffer in self.buffers.items():
+            new_buffer = np.zeros(self.capacity, dtype=buffer.dtype)
+            new_buffer[:self.n_rows] = buffer[:self.n_rows]
+            self.buffers[col] = new_buffer
+
+    def append(self, row):
+        """
+        Adds one row. row must have a value for every column.
+        """
+        if self.n_rows == self.capacity:
+            self._grow()
+        i = self.n_rows
+        for col, buffer in self.buffers.items():
+            value = row[col]
+            if col in self.categories:
+                codes = self.categories[col]
+                if value not in codes:
+                    codes[value] = len(codes)
+                value = codes[value]
+            buffer[i] = value
+        self.n_rows += 1
+
+    def extend(self, columns, n_rows):
+        """
+        Adds n_rows rows at once. columns maps every column to either an 
+        array of n_rows values or a single value shared by all the rows; 
+        'category' columns take a single value.
+        """
+        while self.n_rows + n_rows > self.capacity:
+            self._grow()
+        i = self.n_rows
+        for col, buffer in self.buffers.items():
+            value = columns[col]
+            if col in self.categories:
+                codes = self.categories[col]
+                if value not in codes:
+                    codes[value] = len(codes)
+                value = codes[value]
+            buffer[i:i + n_rows] = value
+        self.n_rows += n_rows
+
+    def column(self, col):
+        """
+        Returns the values recorded so far for col as an array.
+        """
+        values = self.buffers[col][:self.n_rows]
+        if col in self.categories:
+            lookup = np.array(list(self.categories[col]), dtype=object)
+            return lookup[values]
+        return values
+
+    def last(self, col):
+        """
+        Returns the value of col in the most recent row.
+        """
+        value = self.buffers[col][self.n_rows - 1]
+        if col in self.categories:
+            return list(self.categories[col])[value]
+        return value.item()
+
+    def sum(self, col):
+        return self.buffers[col][:self.n_rows].sum().item()
+
+    def to_frame(self):
+        """
+        Returns the recorded rows as a pandas.DataFrame.
+        """
+        data = {}
+        for col, buffer in self.buffers.items():
+            values = buffer[:self.n_rows].copy()
+            if col in self.categories:
+                categories = list(self.categories[col])
+                data[col] = pd.Categorical.from_codes(values, categories=categories)
+            else:
+                data[col] = values
+        return pd.DataFrame(data, columns=list(self.columns))
+
+
+class ResultsStream(ResultsRecorder):
+    """
+    ResultsRecorder that holds at most chunk_rows rows in memory. Each time 
+    the buffers fill, the rows are passed to handler as a DataFrame and 
+    dropped, so memory stays flat however long the run. Running totals are
+    kept so that len, last and sum still cover every row recorded; column 
+    only covers the rows not yet handed over.
+
+    to_frame hands over the remaining rows and returns only the summary 
+    rows, the full table having gone to handler.
+
+    Parameters
+    ----------
+    handler : callable or str
+        called with each chunk as a pandas.DataFrame. A str is taken as a 
+        file path and wrapped in a ChunkedFileSink
+    chunk_rows : int
+        number of rows per chunk
+    columns : dict, optional
+        as in ResultsRecorder
+    """
+
+    def __init__(self, handler, chunk_rows=10000, columns=None):
+        if isinstance(handler, str):
+            handler = ChunkedFileSink(handler)
+        self.handler = handler
+        self.chunk_rows = max(chunk_rows, 1)
+        self.n_flushed = 0
+        self.flushed_sums = {}
+        self.summary_rows = []
+        super().__init__(columns=columns, capacity=self.chunk_rows)
+
+    def __len__(self):
+        return self.n_flushed + self.n_rows
+
+    def append(self, row):
+        #flush before rather than after, so last always has a row to read
+        if self.n_rows == self.chunk_rows:
+            self.flush()
+        super().append(row)
+        if row.get('summary', False):
+            self.summary_rows.append(dict(row))
+
+    def extend(self, columns, n_rows):
+        """
+        As ResultsRecorder.extend, handing full chunks over on the way. The 
+        rows must not be summary rows.
+        """
+        start = 0
+        while start < n_rows:
+            if self.n_rows == self.chunk_rows:
+                self.flush()
+            size = min(n_rows - start, self.chunk_rows - self.n_rows)
+            part = {col: value[start:start + size] if np.ndim(value) else value
+                    for col, value in columns.items()}
+            super().extend(part, size)
+            start += size
+
+    def flush(self):
+        """
+        Passes the rows held in memory to handler and clears them.
+        """
+        if self.n_rows == 0:
+            return
+        for col, buffer in self.buffers.items():
+            if col not in self.categories:
+                total = buffer[:self.n_rows].sum().item()
+                self.flushed_sums[col] = self.flushed_sums.get(col, 0) + total
+        frame = super().to_frame()
+        self.n_flushed += self.n_rows
+        self.n_rows = 0
+        self.handler(frame)
+
+    def sum(self, col):
+        return self.flushed_sums.get(col, 0) + super().sum(col)
+
+    def to_frame(self):
+        self.flush()
+        if hasattr(self.handler, 'close'):
+            self.handler.close()
+        recorder = ResultsRecorder(self.summary_rows, self.columns)
+        return recorder.to_frame()
+
+
+class ChunkedFileSink:
+    """
+    Appends DataFrame chunks to a local CSV or Parquet file, for use as the 
+    handler of a ResultsStream. The file is replaced if it exists. Parquet 
+    needs pyarrow; categorical columns are written as strings so every 
+    chunk has the same schema.
+
+    Parameters
+    ----------
+    path : str
+        file to write
+    file_format : str, optional
+        'csv' or 'parquet'. Inferred from the extension of path if None: 
+        .parquet and .pq are Parquet, anything else CSV
+    """
+
+    def __init__(self, path, file_format=None):
+        if file_format is None:
+            file_format = 'parquet' if path.endswith(('.parquet', '.pq')) else 'csv'
+        if file_format not in ('csv', 'parquet'):
+            raise ValueError(f"file_format must be 'csv' or 'parquet', not {file_format!r}")
+        self.path = path
+        self.file_format = file_format
+        self.n_chunks = 0
+        self.writer = None
+
+    def __call__(self, frame):
+        if self.file_format == 'csv':
+            frame.to_csv(self.path, mode='w' if self.n_chunks == 0 else 'a', 
+                         header=self.n_chunks == 0, index=False)
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            for col in frame.columns:
+                if isinstance(frame[col].dtype, pd.CategoricalDtype):
+                    frame[col] = frame[col].astype(str)
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self.writer is None:
+                self.writer = pq.ParquetWriter(self.path, table.schema)
+            self.writer.write_table(table)
+        self.n_chunks += 1
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+def record_row(results, row):
+    """
+    Appends row to results, which may be a ResultsRecorder or a 
+    pandas.DataFrame. A DataFrame that already has columns only gets the 
+    keys of row it has columns for, so frames built for an older schema, 
+    e.g. without 'repaired_edges', keep working.
+    """
+    if isinstance(results, ResultsRecorder):
+        results.append(row)
+    else:
+        if len(results.columns):
+            row = {col: row[col] for col in results.columns if col in row}
+        results.loc[len(results)] = row
+
+
+def record_rows(results, columns, n_rows):
+    """
+    Appends n_rows rows to results at once, with columns as in 
+    ResultsRecorder.extend. A DataFrame gets them one by one through 
+    record_row.
+    """
+    if isinstance(results, ResultsRecorder):
+        results.extend(columns, n_rows)
+        return
+    for i in range(n_rows):
+        row = {}
+        for col, value in columns.items():
+            row[col] = value[i].item() if np.ndim(value) else value
+        record_row(results, row)
+
+
+class SampleSizeController:
+    """
+    Chooses the sample size of the fine tuning loops on the fly.
+
+    Small sample sizes are accepted often but move r slowly; large ones move
+    r further per swap but are rejected more often. The controller measures
+    the progress towards the target per second over windows of iterations,
+    and hill-climbs the sample size on that rate: it keeps stepping in the 
+    same direction (growing or shrinking by a factor of 1.5) while the rate 
+    improves, and turns around when it drops.
+
+    Parameters
+    ----------
+    initial : int
+        sample size to start from
+    min_size : int
+        smallest sample size allowed
+    max_size : int
+        largest sample size allowed
+    window : int
+        number of iterations measured before each adjustment
+
+    Attributes
+    ----------
+    size : int
+        the sample size to use for the next iteration
+    acceptance_rate : float
+        fraction of iterations accepted in the last complete window
+    dr_per_accepted : float
+        mean progress in r per accepted swap in the last complete window
+    """
+
+    def __init__(self, initial=2, min_size=2, max_size=64, window=100):
+        self.min_size = min_size
+        self.max_size = max(min_size, max_size)
+        self.size = min(max(initial, self.min_size), self.max_size)
+        self.window = window
+        self.direction = 1
+        self.last_rate = None
+        self.acceptance_rate = 0
+        self.dr_per_accepted = 0
+        self._reset()
+
+    def _reset(self):
+        self.n = 0
+        self.n_accepted = 0
+        self.progress = 0
+        self.elapsed = 0
+
+    def _step(self):
+        if self.direction > 0:
+            return min(self.max_size, max(self.size + 1, int(self.size*1.5)))
+        return max(self.min_size, int(self.size/1.5))
+
+    def update(self, accepted, progress, elapsed):
+        """
+        Records one iteration and returns the sample size for the next.
+
+        Parameters
+        ----------
+        accepted : bool
+            whether the iteration's swap was applied
+        progress : float
+            change in r during the iteration, signed so that movement 
+            towards the target is positive
+        elapsed : float
+            time taken by the iteration
+        """
+        self.n += 1
+        self.n_accepted += accepted
+        self.progress += progress
+        self.elapsed += elapsed
+        if self.n < self.window:
+            return self.size
+
+        rate = self.progress/max(self.elapsed, 1e-9)
+        self.acceptance_rate = self.n_accepted/self.n
+        self.dr_per_accepted = self.progress/self.n_accepted if self.n_accepted else 0
+        if self.last_rate is not None and rate < self.last_rate:
+            self.direction = -self.direction
+        new_size = self._step()
+        if new_size == self.size:
+            #at a bound, so try the other way next time
+            self.direction = -self.direction
+        self.size = new_size
+        self.last_rate = rate
+        self._reset()
+        return self.size
+
+
+class RewireCheckpoint:
+    """
+    Periodically saves the state of a fine tuning loop to a local file, so a
+    pre-empted rewire run can be continued with resume_rewire.
+
+    The file holds the graph's nodes and its edges in EdgeIndex order, the
+    state of the random module, the loop's iteration counter, sample size 
+    and SampleSizeController, and the results recorded so far. With the same 
+    state, the loop makes the same choices, so a resumed run follows the same
+    trajectory as an uninterrupted one (time-based decisions aside).
+
+    Parameters
+    ----------
+    path : str
+        file to write. It is replaced atomically on each save
+    every : float
+        seconds between saves
+    context : dict, optional
+        the arguments needed to restart the run, stored alongside the state
+    """
+
+    def __init__(self, path, every=600, context=None):
+        self.path = path
+        self.every = every
+        self.context = {} if context is None else context
+        self.last_save = time.time()
+        self.loop_state = None
+
+    def due(self):
+        return time.time() - self.last_save >= self.every
+
+    def save(self, G, results, loop_state):
+        """
+        Writes G, results and loop_state (a dict of the loop's variables, 
+        including 'edge_list') to path.
+        """
+        if isinstance(G, CompactGraph):
+            graph = {'backend': 'compact', 'nodes': G.labels}
+        else:
+            graph = {'backend': 'networkx', 'nodes': list(G.nodes())}
+        state = {'context': self.context,
+                 'every': self.every,
+                 'graph': graph,
+                 'loop': loop_state,
+                 'random_state': random.getstate(),
+                 'results': results}
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+        self.last_save = time.time()
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+
+class PhaseProfiler:
+    """
+    Accumulates the time spent in each phase of the rewiring algorithms, 
+    and event counters, as a side table to the results.
+
+    Pass one as the profiler argument of rewire, rewire_ladder, the 
+    Havel-Hakimi phases, the fine tuning loops, reduce_clustering* or 
+    connect_components. The instrumented code calls lap at the end of each
+    phase, charging the time since the previous lap to that phase, so the 
+    phases of a loop add up to its running time. With profiler=None each 
+    call site costs one `is not None` check.
+
+    Attributes
+    ----------
+    times : dict
+        (algorithm, phase) -> total seconds
+    calls : dict
+        (algorithm, phase) -> number of laps
+    counters : dict
+        (algorithm, counter) -> count
+    """
+
+    def __init__(self):
+        self.times = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.counters = defaultdict(int)
+        self.last = time.perf_counter()
+
+    def start(self):
+        """
+        Starts timing the first phase of an algorithm from now.
+        """
+        self.last = time.perf_counter()
+
+    def lap(self, algorithm, phase):
+        now = time.perf_counter()
+        key = (algorithm, phase)
+        self.times[key] += now - self.last
+        self.calls[key] += 1
+        self.last = now
+
+    def count(self, algorithm, counter, n=1):
+        self.counters[(algorithm, counter)] += n
+
+    def to_frame(self):
+        """
+        Returns one row per phase (kind 'phase': total time and number of 
+        laps) and per counter (kind 'counter': time 0 and the count).
+        """
+        rows = []
+        for (algorithm, phase), total in self.times.items():
+            rows.append({'algorithm': algorithm,
+                         'phase': phase,
+                         'kind': 'phase',
+                         'time': total,
+                         'count': self.calls[(algorithm, phase)]})
+        for (algorithm, counter), n in self.counters.items():
+            rows.append({'algorithm': algorithm,
+                         'phase': counter,
+                         'kind': 'counter',
+                         'time': 0.0,
+                         'count': n})
+        return pd.DataFrame(rows, columns=['algorithm', 'phase', 'kind', 'time', 'count'])
+
+
+class ExtremalGraphCache:
+    """
+    In-memory and on-disk LRU cache of the graphs built by 
+    havel_hakimi_positive and havel_hakimi_negative, which depend only on 
+    the degree sequence.
+
+    A graph is stored as an (m, 2) int32 array of node positions in the 
+    degree sequence sorted ascending, under a SHA-256 hash of that sequence 
+    and the direction. Any graph with the same degree sequence can reuse it
+    by mapping position i to its own i-th node in ascending degree order: 
+    nodes of equal degree are interchangeable, so the result has the same 
+    degrees and the same r.
+
+    Parameters
+    ----------
+    path : str, optional
+        directory for the on-disk cache, created if missing. Memory only if
+        None
+    max_entries : int
+        number of graphs kept in memory
+    max_disk_entries : int, optional
+        number of graphs kept on disk, the least recently used being 
+        deleted first. Unbounded if None
+    """
+
+    def __init__(self, path=None, max_entries=16, max_disk_entries=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def key(degrees, direction):
+        """
+        Hash of the sorted degree sequence and the direction, 'positive' or
+        'negative'.
+        """
+        sequence = np.sort(np.asarray(degrees, dtype=np.int64))
+        digest = hashlib.sha256(sequence.tobytes())
+        digest.update(direction.encode())
+        return digest.hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.path, f'{key}.npy')
+
+    def get(self, degrees, direction):
+        """
+        Returns the cached edge array for the degree sequence, or None.
+        """
+        key = self.key(degrees, direction)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        if self.path is not None and os.path.exists(self._file(key)):
+            edges = np.load(self._file(key))
+            #refresh the access time used for eviction
+            os.utime(self._file(key))
+            self._remember(key, edges)
+            self.hits += 1
+            return edges
+        self.misses += 1
+        return None
+
+    def put(self, degrees, direction, edges):
+        """
+        Stores edges, an (m, 2) array of positions in the sorted degree 
+        sequence.
+        """
+        key = self.key(degrees, direction)
+        edges = np.asarray(edges, dtype=np.int32).reshape(-1, 2)
+        self._remember(key, edges)
+        if self.path is not None:
+            tmp_path = f'{self._file(key)}.tmp.npy'
+            np.save(tmp_path, edges)
+            os.replace(tmp_path, self._file(key))
+            self._evict_disk()
+
+    def _remember(self, key, edges):
+        self.entries[key] = edges
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _evict_disk(self):
+        if self.max_disk_entries is None:
+            return
+        files = [os.path.join(self.path, f) for f in os.listdir(self.path) 
+                 if f.endswith('.npy') and not f.endswith('.tmp.npy')]
+        files.sort(key=os.path.getmtime)
+        for f in files[:max(0, len(files) - self.max_disk_entries)]:
+            os.remove(f)
+
+
 def check_new_edges(potential_edges, G, row):
     """
     Takes the edges that will be potentially added to the Graph and checks
-    for any issues
+    for any issues. Each edge is counted, in order of precedence, as an 
+    existing edge if G already has it, a self edge, or a duplicate (0.5 per
+    copy) if the same unordered pair appears more than once in 
+    potential_edges. The pairs are counted once up front, so the check is 
+    O(k) in the number of edges rather than O(k^2).
+
     Parameters
     ---------
-    potential_edges : list of lists
+    potential_edges : list of lists or tuples
         the edges to be checked
     
     G : networkx.Graph
@@ -52,31 +999,81 @@ def check_new_edges(potential_edges, G, row):
     Returns
     -------
     edges_to_add : list of lists
-        the checked edges
+        the checked edges, in their original order
 
     row : dict
         the information to go into the results DataFrame
 
     """
+    multiplicity = Counter(EdgeIndex.canon(u, v) for u, v in potential_edges)
     edges_to_add = []
     for edge in potential_edges:
-        if G.has_edge(edge[0], edge[1]) == False:
-            if edge[0] != edge[1]:
-                if [edge[1], edge[0]] not in potential_edges:
-                    if potential_edges.count(edge) == 1:
-                        edges_to_add.append(edge)
-                    else:
-                        row['duplicate_edges'] += 0.5
-                else:
-                    row['duplicate_edges'] += 0.5
-            else:
-                row['self_edges'] += 1
-        else:
+        u, v = edge
+        if G.has_edge(u, v):
             row['existing_edges'] += 1
+        elif u == v:
+            row['self_edges'] += 1
+        elif multiplicity[EdgeIndex.canon(u, v)] > 1:
+            row['duplicate_edges'] += 0.5
+        else:
+            edges_to_add.append(edge)
 
     return edges_to_add, row 
 
 
+def rematch_stubs(potential_edges, edges_to_add, G, degree, direction):
+    """
+    Re-pairs the endpoints of the edges check_new_edges rejected among 
+    themselves, keeping the edges it accepted, so that one bad pair does 
+    not sink the whole proposal.
+
+    The rejected endpoints (stubs) are sorted by degree and taken lowest 
+    first. Each is paired with the first remaining stub that gives a valid 
+    edge: not a self edge, not in G and not already being added. For 
+    'positive' the candidates are tried from the nearest degree upwards, as
+    in the positive pairing; for 'negative' from the highest degree down. 
+    Every stub gets exactly one new edge, so degrees are preserved.
+
+    Parameters
+    ----------
+    potential_edges : list
+        the proposed edges passed to check_new_edges
+    edges_to_add : list
+        the edges check_new_edges accepted
+    G : networkx.Graph
+        graph with the sampled edges already removed
+    degree : dict or list
+        degree of each node
+    direction : str
+        'positive' or 'negative'
+
+    Returns
+    -------
+    list of tuples or None
+        the re-matched edges, or None if some stub could not be paired
+    """
+    accepted = {EdgeIndex.canon(u, v) for u, v in edges_to_add}
+    stubs = [node for u, v in potential_edges if EdgeIndex.canon(u, v) not in accepted 
+             for node in (u, v)]
+    stubs.sort(key=degree.__getitem__)
+    rematched = []
+    while stubs:
+        u = stubs.pop(0)
+        candidates = range(len(stubs)) if direction == 'positive' else range(len(stubs) - 1, -1, -1)
+        for i in candidates:
+            v = stubs[i]
+            e = EdgeIndex.canon(u, v)
+            if u != v and e not in accepted and not G.has_edge(u, v):
+                break
+        else:
+            return None
+        stubs.pop(i)
+        accepted.add(e)
+        rematched.append((u, v))
+
+    return rematched
+
+
 def test_sample_sizes(G, name, sample_size, direction,results=None, n_tests=1000):
     """
     Function to test the success rate of a given sample size on a graph.
@@ -101,11 +1098,11 @@ def test_sample_sizes(G, name, sample_size, direction,results=None, n_tests=1000
            'successes': 0,
            'p_success': 0} 
     
+    edge_index = EdgeIndex(G.edges())
     while j < n_tests:
         #define dictionary to track relevant info for each loop
 
-        edges = list(G.edges())                
-        edges_to_remove = random.sample(edges, sample_size)
+        edges_to_remove = edge_index.sample(sample_size)
         deg_dict = {}
         nodes = []
         for edge in edges_to_remove:
@@ -175,11 +1172,11 @@ def test_minimum(G, name, sample_size=2, n_fails=0):
     row = def_row
     results = pd.DataFrame([row])
 
+    edge_index = EdgeIndex(G.edges())
     while j < n_fails:
         #define dictionary to track relevant info for each loop
 
-        edges = list(G.edges())                
-        edges_to_remove = random.sample(edges, sample_size)
+        edges_to_remove = edge_index.sample(sample_size)
         deg_dict = {}
         nodes = []
         for edge in edges_to_remove:
@@ -197,10 +1194,12 @@ def test_minimum(G, name, sample_size=2, n_fails=0):
             row['can_rewire'] += 1
             G.remove_edges_from(edges_to_remove)
             G.add_edges_from(edges_to_add)
+            edge_index.remove_edges_from(edges_to_remove)
+            edge_index.add_edges_from(edges_to_add)
             r_new = nx.degree_assortativity_coefficient(G)
             if r_new < row['r']:
                 row['reduces'] += 1
-                print(f'manages to reduce from {row['r']} to {r_new}')
+                print(f"manages to reduce from {row['r']} to {r_new}")
                 results.loc[len(results)] = row
 
                 j = 0
@@ -253,11 +1252,11 @@ def test_maximum(G, name, sample_size=2, n_fails=0):
     row = def_row
     results = pd.DataFrame([row])
 
+    edge_index = EdgeIndex(G.edges())
     while j < n_fails:
         #define dictionary to track relevant info for each loop
 
-        edges = list(G.edges())                
-        edges_to_remove = random.sample(edges, sample_size)
+        edges_to_remove = edge_index.sample(sample_size)
         deg_dict = {}
         nodes = []
         for edge in edges_to_remove:
@@ -274,10 +1273,12 @@ def test_maximum(G, name, sample_size=2, n_fails=0):
             row['can_rewire'] += 1
             G.remove_edges_from(edges_to_remove)
             G.add_edges_from(edges_to_add)
+            edge_index.remove_edges_from(edges_to_remove)
+            edge_index.add_edges_from(edges_to_add)
             r_new = nx.degree_assortativity_coefficient(G)
             if r_new > row['r']:
                 row['increases'] += 1
-                print(f'manages to increase from {row['r']} to {r_new}')
+                print(f"manages to increase from {row['r']} to {r_new}")
                 results.loc[len(results)] = row
 
                 j = 0
@@ -0,0 +1,452 @@
+# -*- coding: utf-8 -*-
+"""
+Compiled swap kernel for the fine tuning loops, used when numba is installed.
+
+@author: shane mannion
+"""
+
+import numpy as np
+
+try:
+    import numba
+    HAVE_NUMBA = True
+    _jit = numba.njit(cache=True, nogil=True)
+except ImportError:
+    HAVE_NUMBA = False
+    def _jit(f):
+        return f
+
+
+def _use_jit(jit, supported=True, options=''):
+    """
+    Whether a loop runs on its compiled kernel, given the loop's jit 
+    argument: True requires the kernel, None uses it whenever numba is 
+    installed and supported is True, and False never uses it. options names
+    the arguments that make supported False, for the error jit=True raises.
+    """
+    if jit is None:
+        return HAVE_NUMBA and supported
+    if jit and not HAVE_NUMBA:
+        raise ImportError('jit=True requires numba')
+    if jit and not supported:
+        raise ValueError(f'jit=True cannot be combined with {options}')
+    return bool(jit)
+
+
+#markers for free and deleted slots of the edge hash table
+_EMPTY = -1
+_DELETED = -2
+
+
+@_jit
+def _slot(key, mask):
+    h = (key ^ (key >> 17))*2654435761
+    return (h ^ (h >> 15)) & mask
+
+
+@_jit
+def _table_contains(table, key):
+    mask = len(table) - 1
+    i = _slot(key, mask)
+    while table[i] != _EMPTY:
+        if table[i] == key:
+            return True
+        i = (i + 1) & mask
+    return False
+
+
+@_jit
+def _table_insert(table, key):
+    """
+    Inserts key, which must not be in the table. Returns 1 if a deleted slot
+    was reused, else 0.
+    """
+    mask = len(table) - 1
+    i = _slot(key, mask)
+    while table[i] != _EMPTY and table[i] != _DELETED:
+        i = (i + 1) & mask
+    reused = 1 if table[i] == _DELETED else 0
+    table[i] = key
+    return reused
+
+
+@_jit
+def _table_remove(table, key):
+    mask = len(table) - 1
+    i = _slot(key, mask)
+    while table[i] != key:
+        i = (i + 1) & mask
+    table[i] = _DELETED
+
+
+@_jit
+def _table_fill(table, edges, n):
+    table[:] = _EMPTY
+    for e in range(edges.shape[0]):
+        _table_insert(table, edges[e, 0]*n + edges[e, 1])
+
+
+def build_edge_table(edges, n):
+    """
+    Returns an open addressing hash table holding the key u*n + v of every
+    row (u, v) of edges, with u < v. The table has at least four slots per
+    edge, so probes stay short.
+    """
+    size = 8
+    while size < 4*len(edges):
+        size *= 2
+    table = np.empty(size, dtype=np.int64)
+    _table_fill(table, edges, n)
+    return table
+
+
+@_jit
+def _swap_chunk(
+    edges,
+    table,
+    state,
+    deg,
+    n,
+    k,
+    positive,
+    target,
+    tol,
+    four_m,
+    s1_sq,
+    denominator,
+    n_iter,
+    accepted,
+    duplicate_edges,
+    self_edges,
+    existing_edges,
+    r_out):
+    """
+    Runs up to n_iter iterations of the positively_rewire (positive=True) or
+    negatively_rewire loop on integer arrays, stopping early once r is within
+    tol of target.
+
+    edges is the (m, 2) int64 edge array with u < v in each row, and table
+    the hash table of its keys from build_edge_table. An accepted swap writes
+    its new edges over the rows of the edges it removes, so m and the table
+    size never change. state holds [S_p, deleted slots in table] and is
+    updated in place; the other statistics of the AssortativityTracker are
+    fixed and enter through four_m = 4m, s1_sq = S_1^2 and
+    denominator = 2m*S_2 - S_1^2.
+
+    The counts of each iteration are written to accepted, duplicate_edges,
+    self_edges, existing_edges and r_out. Returns the number of iterations
+    run.
+    """
+    m = edges.shape[0]
+    idx = np.empty(k, dtype=np.int64)
+    nodes = np.empty(2*k, dtype=np.int64)
+    node_deg = np.empty(2*k, dtype=np.int64)
+    a = np.empty(k, dtype=np.int64)
+    b = np.empty(k, dtype=np.int64)
+    S_p = state[0]
+    for it in range(n_iter):
+        #k distinct edges, uniformly at random
+        for j in range(k):
+            while True:
+                e = np.random.randint(0, m)
+                fresh = True
+                for i in range(j):
+                    if idx[i] == e:
+                        fresh = False
+                        break
+                if fresh:
+                    break
+            idx[j] = e
+            nodes[2*j] = edges[e, 0]
+            nodes[2*j + 1] = edges[e, 1]
+        for i in range(2*k):
+            node_deg[i] = deg[nodes[i]]
+        #stable, as sorted() is in the Python loops
+        order = np.argsort(node_deg, kind='mergesort')
+        for j in range(k):
+            if positive:
+                a[j] = nodes[order[2*j]]
+                b[j] = nodes[order[2*j + 1]]
+            else:
+                a[j] = nodes[order[j]]
+                b[j] = nodes[order[2*k - 1 - j]]
+
+        #the same checks, in the same order, as check_new_edges with the
+        #sampled edges taken out of the graph
+        for j in range(k):
+            _table_remove(table, edges[idx[j], 0]*n + edges[idx[j], 1])
+        state[1] += k
+        n_dup = 0
+        n_self = 0
+        n_existing = 0
+        for j in range(k):
+            u = min(a[j], b[j])
+            v = max(a[j], b[j])
+            if u != v and _table_contains(table, u*n + v):
+                n_existing += 1
+            elif u == v:
+                n_self += 1
+            else:
+                for i in range(k):
+                    if i != j and ((a[i] == a[j] and b[i] == b[j]) or
+                                   (a[i] == b[j] and b[i] == a[j])):
+                        n_dup += 1
+                        break
+
+        ok = n_existing == 0 and n_self == 0 and n_dup == 0
+        if ok:
+            for j in range(k):
+                e = idx[j]
+                S_p -= deg[edges[e, 0]]*deg[edges[e, 1]]
+                u = min(a[j], b[j])
+                v = max(a[j], b[j])
+                edges[e, 0] = u
+                edges[e, 1] = v
+                S_p += deg[u]*deg[v]
+                state[1] -= _table_insert(table, u*n + v)
+        else:
+            for j in range(k):
+                state[1] -= _table_insert(table, edges[idx[j], 0]*n + edges[idx[j], 1])
+
+        if 4*state[1] > len(table):
+            _table_fill(table, edges, n)
+            state[1] = 0
+
+        r = (four_m*S_p - s1_sq)/denominator
+        accepted[it] = ok
+        duplicate_edges[it] = 0.5*n_dup
+        self_edges[it] = n_self
+        existing_edges[it] = n_existing
+        r_out[it] = r
+        state[0] = S_p
+        if positive:
+            if r >= target - tol:
+                return it + 1
+        elif r <= target + tol:
+            return it + 1
+
+    return n_iter
+
+
+@_jit
+def _seed(seed):
+    np.random.seed(seed)
+
+
+def build_neighbour_arrays(neighbours):
+    """
+    Returns (offset, nbrs) for a list holding the neighbours of nodes 
+    0..n-1: node i's neighbours are nbrs[offset[i]:offset[i+1]], sorted. 
+    nbrs is int32. The row lengths are the node degrees, which the swaps of
+    the clustering kernel never change, so rows stay full and sorted.
+    """
+    offset = np.zeros(len(neighbours) + 1, dtype=np.int64)
+    np.cumsum([len(row) for row in neighbours], out=offset[1:])
+    nbrs = np.empty(offset[-1], dtype=np.int32)
+    for i, row in enumerate(neighbours):
+        nbrs[offset[i]:offset[i + 1]] = sorted(row)
+    return offset, nbrs
+
+
+@_jit
+def _row_position(nbrs, offset, a, x):
+    """
+    Position of x in the row of a, by binary search, or -1.
+    """
+    lo = offset[a]
+    hi = offset[a + 1]
+    while lo < hi:
+        mid = (lo + hi) >> 1
+        if nbrs[mid] < x:
+            lo = mid + 1
+        else:
+            hi = mid
+    if lo < offset[a + 1] and nbrs[lo] == x:
+        return lo
+    return -1
+
+
+@_jit
+def _row_replace(nbrs, offset, a, old, new):
+    """
+    Replaces old by new in the row of a, shifting the entries between them
+    so the row stays sorted.
+    """
+    i = _row_position(nbrs, offset, a, old)
+    if new > old:
+        while i + 1 < offset[a + 1] and nbrs[i + 1] < new:
+            nbrs[i] = nbrs[i + 1]
+            i += 1
+    else:
+        while i > offset[a] and nbrs[i - 1] > new:
+            nbrs[i] = nbrs[i - 1]
+            i -= 1
+    nbrs[i] = new
+
+
+@_jit
+def _common_neighbours(nbrs, offset, a, b, skip_1, skip_2, inv_weight, t, step):
+    """
+    Merges the rows of a and b, skipping skip_1 and skip_2 (-1 to skip 
+    nothing). Returns the number of common neighbours w and the sum of 
+    their inv_weight, and adds step to t[w] for each.
+    """
+    i = offset[a]
+    j = offset[b]
+    count = 0
+    s_w = 0.0
+    while i < offset[a + 1] and j < offset[b + 1]:
+        if nbrs[i] < nbrs[j]:
+            i += 1
+        elif nbrs[i] > nbrs[j]:
+            j += 1
+        else:
+            w = nbrs[i]
+            if w != skip_1 and w != skip_2:
+                count += 1
+                s_w += inv_weight[w]
+                t[w] += step
+            i += 1
+            j += 1
+    return count, s_w
+
+
+@_jit
+def _clustering_chunk(
+    nbrs,
+    offset,
+    inv_weight,
+    t,
+    state,
+    constrained,
+    class_nodes,
+    class_offset,
+    edges,
+    transitivity,
+    triples,
+    target,
+    max_consecutive_failures,
+    n_iter,
+    accepted,
+    reason):
+    """
+    Runs up to n_iter iterations of the reduce_clustering (constrained=True)
+    or reduce_clustering_unconstrained loop on the arrays from 
+    build_neighbour_arrays, stopping early once the clustering metric is at
+    most target or max_consecutive_failures is reached. The metric is the
+    average clustering, or the global transitivity if transitivity is True,
+    in which case triples is the (invariant) number of connected triples.
+
+    The constrained loop draws a degree class, then two nodes of it, from 
+    class_nodes[class_offset[c]:class_offset[c+1]] for each usable class c.
+    The unconstrained one draws two distinct rows of the (m, 2) int64 
+    edges array, which accepted swaps overwrite with their new edges. 
+
+    ΔC_avg and the change in the number of triangles are computed as in the
+    Python loops, from the four sets of common neighbours, and a swap is 
+    accepted iff the one for the metric is negative. The triangle counts t
+    and the rows are updated in place. state holds 
+    [C_avg, consecutive failures, transitivity] and is updated in place.
+
+    For each iteration accepted and reason (0 none, 1 self edges, 2 
+    existing edges) are written to the output arrays. Returns the number of
+    iterations run.
+    """
+    n_classes = len(class_offset) - 1
+    m = edges.shape[0]
+    C_avg = state[0]
+    failures = int(state[1])
+    T = state[2]
+    for it in range(n_iter):
+        if failures >= max_consecutive_failures or (T if transitivity else C_avg) <= target:
+            state[0] = C_avg
+            state[1] = failures
+            state[2] = T
+            return it
+        accepted[it] = False
+        reason[it] = 0
+        if constrained:
+            c = np.random.randint(0, n_classes)
+            size = class_offset[c + 1] - class_offset[c]
+            i = np.random.randint(0, size)
+            j = np.random.randint(0, size - 1)
+            if j >= i:
+                j += 1
+            u = class_nodes[class_offset[c] + i]
+            v = class_nodes[class_offset[c] + j]
+            if offset[u + 1] == offset[u]:
+                failures += 1
+                continue
+            b = nbrs[offset[u] + np.random.randint(0, offset[u + 1] - offset[u])]
+            y = nbrs[offset[v] + np.random.randint(0, offset[v + 1] - offset[v])]
+            if b == y or b == v or y == u:
+                reason[it] = 1
+                failures += 1
+                continue
+        else:
+            e1 = np.random.randint(0, m)
+            e2 = np.random.randint(0, m - 1)
+            if e2 >= e1:
+                e2 += 1
+            u = edges[e1, 0]
+            b = edges[e1, 1]
+            v = edges[e2, 0]
+            y = edges[e2, 1]
+            if np.random.random() < 0.5:
+                u, b = b, u
+            if np.random.random() < 0.5:
+                v, y = y, v
+            if u == v or u == y or b == v or b == y:
+                reason[it] = 1
+                failures += 1
+                continue
+        if _row_position(nbrs, offset, v, b) >= 0 or _row_position(nbrs, offset, u, y) >= 0:
+            reason[it] = 2
+            failures += 1
+            continue
+
+        #step 0 leaves t alone while the delta is scored
+        n_ub, s_ub = _common_neighbours(nbrs, offset, u, b, -1, -1, inv_weight, t, 0)
+        n_vy, s_vy = _common_neighbours(nbrs, offset, v, y, -1, -1, inv_weight, t, 0)
+        n_vb, s_vb = _common_neighbours(nbrs, offset, v, b, u, y, inv_weight, t, 0)
+        n_uy, s_uy = _common_neighbours(nbrs, offset, u, y, v, b, inv_weight, t, 0)
+        dC = 0.0
+        if n_ub:
+            dC -= n_ub*(inv_weight[u] + inv_weight[b]) + s_ub
+        if n_vy:
+            dC -= n_vy*(inv_weight[v] + inv_weight[y]) + s_vy
+        if n_vb:
+            dC += n_vb*(inv_weight[v] + inv_weight[b]) + s_vb
+        if n_uy:
+            dC += n_uy*(inv_weight[u] + inv_weight[y]) + s_uy
+        d_triangles = n_vb + n_uy - n_ub - n_vy
+        if not (d_triangles < 0 if transitivity else dC < 0):
+            failures += 1
+            continue
+
+        _common_neighbours(nbrs, offset, u, b, -1, -1, inv_weight, t, -1)
+        _common_neighbours(nbrs, offset, v, y, -1, -1, inv_weight, t, -1)
+        _common_neighbours(nbrs, offset, v, b, u, y, inv_weight, t, 1)
+        _common_neighbours(nbrs, offset, u, y, v, b, inv_weight, t, 1)
+        t[u] += n_uy - n_ub
+        t[b] += n_vb - n_ub
+        t[v] += n_vb - n_vy
+        t[y] += n_uy - n_vy
+        _row_replace(nbrs, offset, u, b, y)
+        _row_replace(nbrs, offset, v, y, b)
+        _row_replace(nbrs, offset, b, u, v)
+        _row_replace(nbrs, offset, y, v, u)
+        if not constrained:
+            edges[e1, 0] = v
+            edges[e1, 1] = b
+            edges[e2, 0] = u
+            edges[e2, 1] = y
+        C_avg += dC
+        T += 3*d_triangles/triples
+        failures = 0
+        accepted[it] = True
+
+    state[0] = C_avg
+    state[1] = failures
+    state[2] = T
+    return n_iter
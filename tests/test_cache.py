@@ -0,0 +1,66 @@
+import os
+import random
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from degree_preserving_rewiring import dpr
+
+
+def edge_array(seed):
+    return np.random.default_rng(seed).integers(0, 50, size=(40, 2))
+
+
+def test_memory_hit():
+    cache = dpr.ExtremalGraphCache()
+    degrees = [1, 2, 2, 3]
+    assert cache.get(degrees, 'positive') is None
+    cache.put(degrees, 'positive', edge_array(0))
+    np.testing.assert_array_equal(cache.get([3, 2, 1, 2], 'positive'), edge_array(0))
+    #the direction is part of the key
+    assert cache.get(degrees, 'negative') is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_disk_hit(tmp_path):
+    dpr.ExtremalGraphCache(str(tmp_path)).put([1, 1, 2], 'negative', edge_array(1))
+    cache = dpr.ExtremalGraphCache(str(tmp_path))
+    assert not cache.entries
+    np.testing.assert_array_equal(cache.get([1, 1, 2], 'negative'), edge_array(1))
+    assert cache.hits == 1
+    assert len(cache.entries) == 1
+
+
+def test_lru_eviction(tmp_path):
+    cache = dpr.ExtremalGraphCache(max_entries=2)
+    for i in range(2):
+        cache.put([i], 'positive', edge_array(i))
+    cache.get([0], 'positive')
+    cache.put([2], 'positive', edge_array(2))
+    assert cache.get([1], 'positive') is None
+    assert cache.get([0], 'positive') is not None
+    assert cache.get([2], 'positive') is not None
+
+    cache = dpr.ExtremalGraphCache(str(tmp_path), max_disk_entries=2)
+    for i in range(2):
+        cache.put([i], 'positive', edge_array(i))
+        os.utime(cache._file(cache.key([i], 'positive')), (i, i))
+    cache.put([2], 'positive', edge_array(2))
+    on_disk = {f for f in os.listdir(tmp_path)}
+    assert on_disk == {f'{cache.key([i], "positive")}.npy' for i in (1, 2)}
+
+
+@pytest.mark.parametrize('target', [0.3, -0.3])
+def test_cached_run_matches_uncached(target, tmp_path):
+    G = nx.barabasi_albert_graph(400, 3, seed=13)
+    random.seed(13)
+    expected, expected_results = dpr.rewire(G.copy(), target, 'g', method='max')
+    cache = dpr.ExtremalGraphCache(str(tmp_path))
+    for _ in range(2):
+        random.seed(13)
+        H, results = dpr.rewire(G.copy(), target, 'g', method='max', hh_cache=cache)
+        assert sorted(map(sorted, H.edges())) == sorted(map(sorted, expected.edges()))
+        assert results['r'].iloc[-1] == pytest.approx(expected_results['r'].iloc[-1])
+    assert (cache.misses, cache.hits) == (1, 1)
+    assert len(os.listdir(tmp_path)) == 1
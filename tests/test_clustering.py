@@ -0,0 +1,102 @@
+import random
+import warnings
+
+import networkx as nx
+import pytest
+
+from degree_preserving_rewiring import dpr
+
+
+def test_rewire_joint_reaches_both_targets():
+    random.seed(1)
+    G = nx.gnm_random_graph(1000, 5000, seed=1)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        dpr.rewire_joint(G, 0.2, 0.05, 'joint', dpr.ResultsRecorder(), timed=True, time_limit=60)
+    assert abs(nx.degree_assortativity_coefficient(G) - 0.2) <= 0.01
+    assert abs(nx.average_clustering(G) - 0.05) <= 0.01
+
+
+def test_rewire_joint_warns_on_missed_target():
+    random.seed(1)
+    G = nx.gnm_random_graph(200, 1000, seed=1)
+    with pytest.warns(UserWarning, match='clustering'):
+        dpr.rewire_joint(G, 0.0, 0.9, 'joint', dpr.ResultsRecorder(), max_iterations=2000)
+
+
+JIT = [False, pytest.param(True, marks=pytest.mark.skipif(not dpr.HAVE_NUMBA, 
+                                                           reason='needs numba'))]
+
+
+@pytest.mark.parametrize('backend', ['networkx', 'compact'])
+@pytest.mark.parametrize('jit', JIT)
+def test_reduce_clustering_unconstrained_preserves_degrees(backend, jit):
+    random.seed(2)
+    G = nx.powerlaw_cluster_graph(400, 3, 0.6, seed=2)
+    before = dict(G.degree())
+    C = nx.average_clustering(G)
+    dpr.reduce_clustering_unconstrained(G, 'c', dpr.ResultsRecorder(), max_iterations=5000,
+                                        backend=backend, jit=jit)
+    assert dict(G.degree()) == before
+    assert nx.average_clustering(G) < C
+
+
+@pytest.mark.parametrize('backend', ['networkx', 'compact'])
+@pytest.mark.parametrize('jit', JIT)
+@pytest.mark.parametrize('metric', ['average', 'transitivity'])
+def test_reduce_clustering_preserves_degrees_and_r(backend, jit, metric):
+    random.seed(2)
+    G = nx.powerlaw_cluster_graph(400, 3, 0.6, seed=2)
+    before = dict(G.degree())
+    r = nx.degree_assortativity_coefficient(G)
+    C = nx.transitivity(G) if metric == 'transitivity' else nx.average_clustering(G)
+    results = dpr.ResultsRecorder()
+    dpr.reduce_clustering(G, 'c', results, max_iterations=5000, backend=backend, jit=jit,
+                          metric=metric)
+    assert dict(G.degree()) == before
+    assert nx.degree_assortativity_coefficient(G) == pytest.approx(r)
+    assert (nx.transitivity(G) if metric == 'transitivity' else nx.average_clustering(G)) < C
+    assert len(results) == results.sum('edges_rewired')//2
+
+
+def test_reduce_clustering_endgame_stops_at_budget():
+    random.seed(2)
+    G = nx.powerlaw_cluster_graph(400, 5, 0.9, seed=2)
+    results = dpr.ResultsRecorder()
+    #a threshold of 1 starts the endgame after the first window
+    dpr.reduce_clustering(G, 'c', results, endgame=1.0, endgame_window=100, 
+                          endgame_budget=2000, log_failures=True)
+    assert results.last('iteration') == 100 + 2000
+
+
+def test_weighted_sampler_follows_the_weights(monkeypatch):
+    from degree_preserving_rewiring.dpr.rewiring_clustering import _WeightedSampler
+    rng = random.Random(3)
+    items = [f'n{i}' for i in range(37)]
+    weights = {item: rng.randrange(5) for item in items}
+    sampler = _WeightedSampler(items, weights)
+    for _ in range(200):
+        item = rng.choice(items)
+        weights[item] = rng.randrange(5)
+        sampler.update(item, weights[item])
+    sampler.update('not an item', 3)
+    assert sampler.total == sum(weights.values())
+    #every draw in [0, total) lands on the item whose cumulative weight 
+    #range holds it, so each item is drawn with probability weight/total
+    expected = [item for item in items for _ in range(weights[item])]
+    draws = iter(range(sampler.total))
+    monkeypatch.setattr(random, 'randrange', lambda n: next(draws))
+    assert [sampler.sample() for _ in range(len(expected))] == expected
+
+
+def test_triangle_proposals_keep_degrees_and_r():
+    random.seed(4)
+    G = nx.powerlaw_cluster_graph(400, 3, 0.6, seed=4)
+    before = dict(G.degree())
+    r = nx.degree_assortativity_coefficient(G)
+    C = nx.average_clustering(G)
+    dpr.reduce_clustering(G, 'c', dpr.ResultsRecorder(), max_iterations=3000, 
+                          proposal='triangles')
+    assert dict(G.degree()) == before
+    assert nx.degree_assortativity_coefficient(G) == pytest.approx(r)
+    assert nx.average_clustering(G) < C
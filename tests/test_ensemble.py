@@ -0,0 +1,35 @@
+import networkx as nx
+import pandas as pd
+
+from degree_preserving_rewiring import dpr
+
+
+def without_time(results):
+    return results.drop(columns='time').reset_index(drop=True)
+
+
+def test_rewire_many_reproducible_across_n_jobs():
+    graphs = [nx.gnm_random_graph(200, 800, seed=1), nx.barabasi_albert_graph(200, 3, seed=2)]
+    runs = [dpr.rewire_many(graphs, [0.1, -0.1], n_jobs=n_jobs, seed=7, return_graphs=True,
+                            method='original')
+            for n_jobs in (1, 2)]
+    (results_1, graphs_1), (results_2, graphs_2) = runs
+    pd.testing.assert_frame_equal(without_time(results_1), without_time(results_2))
+    assert graphs_1.keys() == graphs_2.keys()
+    for key, G in graphs_1.items():
+        assert sorted(map(sorted, G.edges())) == sorted(map(sorted, graphs_2[key].edges()))
+        assert sorted(d for _, d in G.degree()) == sorted(d for _, d in graphs[key[0]].degree())
+
+
+def test_reduce_clustering_chains_reproducible_across_n_jobs():
+    G = nx.powerlaw_cluster_graph(300, 3, 0.5, seed=3)
+    runs = [dpr.reduce_clustering_chains(G, 'c', n_chains=3, n_jobs=n_jobs, seed=8, 
+                                         temperature=1e-4, exchange_every=500, n_rounds=3)
+            for n_jobs in (1, 2)]
+    (best_1, results_1, chains_1), (best_2, results_2, chains_2) = runs
+    pd.testing.assert_frame_equal(without_time(results_1), without_time(results_2))
+    pd.testing.assert_frame_equal(chains_1, chains_2)
+    assert sorted(map(sorted, best_1.edges())) == sorted(map(sorted, best_2.edges()))
+    assert dict(best_1.degree()) == dict(G.degree())
+    #the best graph is at least as good as where any chain ended
+    assert nx.average_clustering(best_1) <= chains_1['clustering'].min() + 1e-12
@@ -0,0 +1,87 @@
+import random
+
+import networkx as nx
+import pytest
+
+from degree_preserving_rewiring import dpr
+from degree_preserving_rewiring.dpr.havel_hakimi import _match_negative, _match_positive
+
+
+def baseline_matching(G, direction):
+    """
+    The greedy matching of the original havel_hakimi_positive / 
+    havel_hakimi_negative: a double loop over the nodes, with the targets
+    re-sorted after every node in the negative case.
+    """
+    original_degree = {}
+    remaining_degree = {}
+    nodes = []
+    for edge in G.edges():
+        for node in edge:
+            if node not in nodes:
+                nodes.append(node)
+            original_degree[node] = G.degree(node)
+            remaining_degree[node] = original_degree[node]
+    if direction == 'positive':
+        nodes = sorted(nodes, key=original_degree.get, reverse=True)
+        target_nodes = nodes
+    else:
+        nodes = sorted(nodes, key=original_degree.get, reverse=False)
+        target_nodes = list(reversed(nodes))
+    new_neighbors = {node: set() for node in original_degree}
+    for node in nodes:
+        for target in target_nodes:
+            if remaining_degree[node] > 0 and remaining_degree[target] > 0 and node != target:
+                new_neighbors[node].add(target)
+                new_neighbors[target].add(node)
+                remaining_degree[node] -= 1
+                remaining_degree[target] -= 1
+        if direction == 'negative':
+            target_nodes = sorted(target_nodes, key=remaining_degree.get, reverse=True)
+    return nodes, original_degree, remaining_degree, new_neighbors
+
+
+GRAPHS = [
+    lambda seed: nx.gnm_random_graph(200, 800, seed=seed),
+    lambda seed: nx.barabasi_albert_graph(200, 3, seed=seed),
+    lambda seed: nx.powerlaw_cluster_graph(200, 2, 0.3, seed=seed),
+]
+
+
+@pytest.mark.parametrize('make_graph', GRAPHS)
+@pytest.mark.parametrize('seed', range(3))
+def test_positive_matching_matches_baseline(make_graph, seed):
+    G = make_graph(seed)
+    nodes, original_degree, expected_remaining, expected = baseline_matching(G, 'positive')
+    remaining = dict(original_degree)
+    new_neighbors = {node: set() for node in original_degree}
+    _match_positive(nodes, remaining, new_neighbors)
+    assert new_neighbors == expected
+    assert remaining == expected_remaining
+
+
+@pytest.mark.parametrize('make_graph', GRAPHS)
+@pytest.mark.parametrize('seed', range(3))
+def test_negative_matching_matches_baseline(make_graph, seed):
+    G = make_graph(seed)
+    nodes, original_degree, expected_remaining, expected = baseline_matching(G, 'negative')
+    remaining = dict(original_degree)
+    new_neighbors = {node: set() for node in original_degree}
+    _match_negative(nodes, list(reversed(nodes)), remaining, new_neighbors)
+    assert new_neighbors == expected
+    assert remaining == expected_remaining
+
+
+@pytest.mark.parametrize('direction', ['positive', 'negative'])
+@pytest.mark.parametrize('backend', ['networkx', 'compact'])
+def test_havel_hakimi_preserves_degrees(direction, backend):
+    random.seed(6)
+    G = nx.barabasi_albert_graph(300, 3, seed=6)
+    before = dict(G.degree())
+    H = G if backend == 'networkx' else dpr.CompactGraph.from_networkx(G)
+    havel_hakimi = dpr.havel_hakimi_positive if direction == 'positive' else dpr.havel_hakimi_negative
+    H = havel_hakimi(H, dpr.ResultsRecorder(), 'hh', 2, 'full')
+    if backend == 'compact':
+        H = H.to_networkx()
+    assert dict(H.degree()) == before
+    assert nx.number_of_selfloops(H) == 0
@@ -0,0 +1,208 @@
+import random
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+import pytest
+
+from degree_preserving_rewiring import dpr
+
+
+def random_swaps(G, tracker, n_swaps, rng):
+    edges = list(G.edges())
+    done = 0
+    while done < n_swaps:
+        (u, b), (v, y) = rng.sample(edges, 2)
+        if len({u, b, v, y}) < 4 or G.has_edge(u, y) or G.has_edge(v, b):
+            continue
+        G.remove_edges_from([(u, b), (v, y)])
+        G.add_edges_from([(u, y), (v, b)])
+        tracker.swap([(u, b), (v, y)], [(u, y), (v, b)])
+        edges = list(G.edges())
+        done += 1
+
+
+@pytest.mark.parametrize('make_graph', [
+    lambda: nx.gnm_random_graph(300, 1200, seed=1),
+    lambda: nx.barabasi_albert_graph(300, 3, seed=1),
+])
+def test_tracker_matches_networkx(make_graph):
+    G = make_graph()
+    tracker = dpr.AssortativityTracker(G)
+    assert tracker.r == pytest.approx(nx.degree_assortativity_coefficient(G), abs=1e-12)
+    rng = random.Random(0)
+    for _ in range(5):
+        random_swaps(G, tracker, 50, rng)
+        assert tracker.r == pytest.approx(nx.degree_assortativity_coefficient(G), abs=1e-12)
+
+
+def test_tracker_r_after_leaves_state_alone():
+    G = nx.barabasi_albert_graph(200, 2, seed=2)
+    tracker = dpr.AssortativityTracker(G)
+    r = tracker.r
+    (u, b), (v, y) = [e for e in G.edges() if 0 not in e][:2]
+    predicted = tracker.r_after([(u, b), (v, y)], [(u, y), (v, b)])
+    assert tracker.r == r
+    tracker.swap([(u, b), (v, y)], [(u, y), (v, b)])
+    assert tracker.r == pytest.approx(predicted)
+
+
+def test_tracker_regular_graph_is_nan():
+    assert np.isnan(dpr.AssortativityTracker(nx.cycle_graph(10)).r)
+
+
+def test_edge_index_mixed_labels():
+    index = dpr.EdgeIndex([(1, 'a'), ('b', 2), (3, 4)])
+    assert ('a', 1) in index
+    index.remove(('a', 1))
+    index.add((5, 'c'))
+    assert ('a', 1) not in index
+    assert ('c', 5) in index
+    assert sorted(map(str, index.edge_list)) == sorted(map(str, [('b', 2), (3, 4), (5, 'c')]))
+
+
+def test_compact_edge_index_matches_edge_index():
+    H = dpr.CompactGraph.from_networkx(nx.gnm_random_graph(50, 200, seed=4))
+    compact = dpr.CompactEdgeIndex(H.n, H.edge_array())
+    index = dpr.EdgeIndex(H.edges())
+    rng = random.Random(5)
+    for _ in range(500):
+        state = random.getstate()
+        removed = index.sample(2)
+        random.setstate(state)
+        assert compact.sample(2) == removed
+        index.remove_edges_from(removed)
+        compact.remove_edges_from(removed)
+        while len(index) < 200:
+            edge = tuple(rng.sample(range(H.n), 2))
+            if edge not in index:
+                index.add(edge)
+                compact.add(edge)
+        assert all(edge in compact for edge in index.edge_list)
+        assert all((edge in compact) == (edge in index) for edge in removed)
+    assert len(compact) == len(index)
+    assert compact.edge_list == index.edge_list
+    missing = next(edge for edge in removed if edge not in index)
+    with pytest.raises(KeyError):
+        compact.remove(missing)
+
+
+def test_record_row_old_schema():
+    columns = [c for c in dpr.RESULTS_COLUMNS if c != 'repaired_edges']
+    results = pd.DataFrame(columns=columns)
+    row = {c: 0 for c in dpr.RESULTS_COLUMNS}
+    dpr.record_row(results, row)
+    assert list(results.columns) == columns
+    assert len(results) == 1
+
+
+def test_compact_graph_round_trip():
+    G = nx.gnm_random_graph(100, 400, seed=3)
+    nx.set_edge_attributes(G, 1, 'w')
+    H = dpr.CompactGraph.from_networkx(G)
+    assert H.number_of_edges() == G.number_of_edges()
+    assert all(H.has_edge(u, v) and H.has_edge(v, u) for u, v in G.edges())
+    u, v = next(iter(G.edges()))
+    x, y = next((x, y) for x, y in G.edges() if len({u, v, x, y}) == 4 
+                and not G.has_edge(u, y) and not G.has_edge(x, v))
+    H.remove_edge(u, v)
+    H.remove_edge(x, y)
+    H.add_edge(u, y)
+    H.add_edge(x, v)
+    H.to_networkx(G)
+    assert G.has_edge(u, y) and not G.has_edge(u, v)
+    assert G.edges[u, y].get('w') is None
+    assert all(G.edges[e].get('w') == 1 for e in G.edges() if e not in {(u, y), (y, u), (x, v), (v, x)})
+    with pytest.raises(ValueError):
+        H.add_edge(u, u)
+
+
+def test_results_recorder_extend_matches_append():
+    rows = [{'name': 'x', 'iteration': i, 'time': 0.5, 'r': i/10, 'target_r': 0.3,
+             'sample_size': 2, 'edges_rewired': 2*(i % 2), 'duplicate_edges': 0.0,
+             'self_edges': 0, 'existing_edges': i % 3, 'repaired_edges': 0,
+             'preserved': True, 'method': 'new', 'summary': False} for i in range(3000)]
+    appended = dpr.ResultsRecorder()
+    for row in rows:
+        appended.append(row)
+    extended = dpr.ResultsRecorder()
+    columns = {col: np.array([row[col] for row in rows]) for col in dpr.RESULTS_COLUMNS}
+    columns['name'] = 'x'
+    columns['method'] = 'new'
+    extended.extend(columns, len(rows))
+    pd.testing.assert_frame_equal(appended.to_frame(), extended.to_frame())
+
+
+def baseline_check_new_edges(potential_edges, G, row):
+    """
+    The original check_new_edges, which finds reversed duplicates only when
+    the edges are lists.
+    """
+    edges_to_add = []
+    for edge in potential_edges:
+        if G.has_edge(edge[0], edge[1]) == False:
+            if edge[0] != edge[1]:
+                if [edge[1], edge[0]] not in potential_edges:
+                    if potential_edges.count(edge) == 1:
+                        edges_to_add.append(edge)
+                    else:
+                        row['duplicate_edges'] += 0.5
+                else:
+                    row['duplicate_edges'] += 0.5
+            else:
+                row['self_edges'] += 1
+        else:
+            row['existing_edges'] += 1
+    return edges_to_add, row
+
+
+def empty_row():
+    return {'duplicate_edges': 0, 'self_edges': 0, 'existing_edges': 0}
+
+
+def test_check_new_edges_matches_baseline_on_lists():
+    G = nx.gnm_random_graph(12, 20, seed=4)
+    rng = random.Random(4)
+    for _ in range(2000):
+        potential_edges = [[rng.randrange(12), rng.randrange(12)] for _ in range(rng.randint(1, 10))]
+        expected = baseline_check_new_edges(potential_edges, G, empty_row())
+        assert dpr.check_new_edges(potential_edges, G, empty_row()) == expected
+
+
+def test_check_new_edges_counts_reversed_tuples():
+    #the original missed these, as [2, 1] is never in a list of tuples, and 
+    #added both copies of the same edge
+    G = nx.Graph([(0, 5)])
+    edges_to_add, row = dpr.check_new_edges([(1, 2), (2, 1), (3, 4)], G, empty_row())
+    assert edges_to_add == [(3, 4)]
+    assert row == {'duplicate_edges': 1.0, 'self_edges': 0, 'existing_edges': 0}
+    assert baseline_check_new_edges([(1, 2), (2, 1), (3, 4)], G, empty_row())[0] == [(1, 2), (2, 1), (3, 4)]
+
+
+@pytest.mark.parametrize('direction', ['positive', 'negative'])
+def test_rematch_stubs_keeps_degrees_and_simplicity(direction):
+    G = nx.barabasi_albert_graph(60, 3, seed=5)
+    degree = dict(G.degree())
+    rng = random.Random(5)
+    n_rematched = 0
+    for _ in range(500):
+        removed = rng.sample(list(G.edges()), 5)
+        G.remove_edges_from(removed)
+        nodes = sorted((node for edge in removed for node in edge), key=degree.get)
+        if direction == 'positive':
+            potential_edges = [(nodes[i], nodes[i + 1]) for i in range(0, len(nodes), 2)]
+        else:
+            potential_edges = [(nodes[i], nodes[-1 - i]) for i in range(len(nodes)//2)]
+        edges_to_add, _ = dpr.check_new_edges(potential_edges, G, empty_row())
+        rematched = None
+        if len(edges_to_add) < len(potential_edges):
+            rematched = dpr.rematch_stubs(potential_edges, edges_to_add, G, degree, direction)
+        if rematched is None:
+            G.add_edges_from(removed)
+            continue
+        n_rematched += 1
+        G.add_edges_from(edges_to_add + rematched)
+        assert len(edges_to_add) + len(rematched) == len(removed)
+        assert dict(G.degree()) == degree
+        assert nx.number_of_selfloops(G) == 0
+    assert n_rematched > 0
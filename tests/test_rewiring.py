@@ -0,0 +1,275 @@
+import random
+import threading
+import time
+
+import networkx as nx
+import pandas as pd
+import pytest
+
+from degree_preserving_rewiring import dpr
+
+
+@pytest.mark.parametrize('target', [0.1, -0.2])
+def test_best_of_k_finishes_untimed(target):
+    # every candidate near the target overshoots by more than the remaining
+    # gap, so the run only ends if a crossing candidate is accepted
+    random.seed(1)
+    G = nx.barabasi_albert_graph(3000, 3, seed=1)
+    H, results = dpr.rewire(G, target, 'k', method='original', n_candidates=16, 
+                            timed=False, jit=False)
+    r = nx.degree_assortativity_coefficient(H)
+    if target > 0:
+        assert r >= target
+    else:
+        assert r <= target
+
+
+def degrees(G):
+    return sorted(d for _, d in G.degree())
+
+
+JIT = [False, pytest.param(True, marks=pytest.mark.skipif(not dpr.HAVE_NUMBA, 
+                                                           reason='needs numba'))]
+
+
+@pytest.mark.parametrize('backend', ['networkx', 'compact'])
+@pytest.mark.parametrize('jit', JIT)
+@pytest.mark.parametrize('method', ['new', 'original', 'max'])
+@pytest.mark.parametrize('target', [0.2, -0.2])
+def test_rewire_preserves_degrees(backend, jit, method, target):
+    random.seed(3)
+    G = nx.barabasi_albert_graph(500, 3, seed=3)
+    before = degrees(G)
+    H, results = dpr.rewire(G, target, 'g', backend=backend, jit=jit, method=method)
+    assert isinstance(H, nx.Graph)
+    assert degrees(H) == before
+    assert results['preserved'].iloc[-1]
+    #the tracked r the results end on is the graph's
+    assert results['r'].iloc[-1] == pytest.approx(nx.degree_assortativity_coefficient(H))
+    if method != 'max':
+        assert results['r'].iloc[-1] == pytest.approx(target, abs=0.01)
+
+
+@pytest.mark.parametrize('options', [{'repair': True}, {'n_candidates': 4}, 
+                                     {'sample_size': 'auto'}, {'sample_size': 6},
+                                     {'batch_size': 32}])
+def test_rewire_options_preserve_degrees(options):
+    random.seed(4)
+    G = nx.gnm_random_graph(400, 1600, seed=4)
+    before = degrees(G)
+    H, results = dpr.rewire(G, 0.25, 'g', method='original', **options)
+    assert degrees(H) == before
+    assert results['r'].iloc[-1] == pytest.approx(nx.degree_assortativity_coefficient(H))
+
+
+@pytest.mark.parametrize('backend', ['networkx', 'compact'])
+@pytest.mark.parametrize('target', [0.2, -0.2])
+def test_batched_rewire_keeps_degrees_and_reaches_target(backend, target):
+    random.seed(6)
+    G = nx.barabasi_albert_graph(500, 3, seed=6)
+    before = degrees(G)
+    H, results = dpr.rewire(G, target, 'b', method='original', backend=backend, 
+                            batch_size=64, timed=False)
+    assert degrees(H) == before
+    assert nx.number_of_selfloops(H) == 0
+    rows = results[results['method'] == 'new']
+    #one row per group, ending on the first group that reaches the target
+    assert (rows['iteration'].diff().iloc[1:] == 1).all()
+    assert (rows['r'].iloc[:-1] < target).all() if target > 0 else (rows['r'].iloc[:-1] > target).all()
+    assert results['r'].iloc[-1] == pytest.approx(nx.degree_assortativity_coefficient(H))
+    assert results['r'].iloc[-1] == pytest.approx(target, abs=0.01)
+
+
+def test_batched_rewire_follows_the_sequential_loop():
+    #batches are checked against the graph at their start, which should not
+    #change how many proposals it takes or how often they are rejected
+    G = nx.barabasi_albert_graph(2000, 3, seed=7)
+    random.seed(7)
+    _, sequential = dpr.rewire(G.copy(), 0.1, 's', method='original', jit=False, timed=False)
+    random.seed(7)
+    _, batched = dpr.rewire(G.copy(), 0.1, 's', method='original', batch_size=256, timed=False)
+    sequential = sequential[sequential['method'] == 'new']
+    batched = batched[batched['method'] == 'new']
+    assert len(batched) == pytest.approx(len(sequential), rel=0.15)
+    assert (batched['edges_rewired'] > 0).mean() == pytest.approx(
+        (sequential['edges_rewired'] > 0).mean(), abs=0.05)
+
+
+@pytest.mark.parametrize('options', [{'sample_size': 'auto'}, {'repair': True},
+                                     {'checkpoint_path': 'unused.pkl'},
+                                     pytest.param({'jit': True}, marks=pytest.mark.skipif(
+                                         not dpr.HAVE_NUMBA, reason='needs numba'))])
+def test_batched_rewire_rejects_unsupported_options(options):
+    G = nx.barabasi_albert_graph(100, 3, seed=1)
+    with pytest.raises(ValueError):
+        dpr.rewire(G, 0.2, 'b', method='original', batch_size=16, **options)
+
+
+@pytest.mark.parametrize('method, order', [('new', [0.2, 0.05, -0.15]), 
+                                           ('original', [0.05, 0.2, -0.15])])
+def test_rewire_ladder_one_row_per_rung(method, order):
+    random.seed(8)
+    G = nx.barabasi_albert_graph(400, 3, seed=8)
+    before = degrees(G)
+    H, snapshots, results = dpr.rewire_ladder(G, [0.2, -0.15, 0.05], 'l', method=method)
+    rungs = results[results['summary']]
+    assert list(rungs['target_r']) == order
+    assert list(snapshots) == order
+    for target, r in zip(rungs['target_r'], rungs['r']):
+        assert degrees(snapshots[target]) == before
+        assert nx.degree_assortativity_coefficient(snapshots[target]) == pytest.approx(r)
+        assert r == pytest.approx(target, abs=0.01)
+
+
+@pytest.mark.parametrize('backend', ['networkx', 'compact'])
+def test_checkpoint_resume_matches_uninterrupted_run(backend, tmp_path, monkeypatch):
+    G = nx.gnm_random_graph(300, 1200, seed=5)
+    random.seed(5)
+    full, full_results = dpr.rewire(G.copy(), 0.2, 'g', method='original', backend=backend,
+                                    checkpoint_path=str(tmp_path / 'full.pkl'), 
+                                    checkpoint_every=0)
+
+    #keep the checkpoint written part way through as if the run stopped there
+    save = dpr.RewireCheckpoint.save
+    stop_at = len(full_results)//2
+
+    def save_and_keep(self, H, results, loop_state):
+        save(self, H, results, loop_state)
+        if loop_state['itr'] == stop_at:
+            (tmp_path / 'mid.pkl').write_bytes((tmp_path / 'run.pkl').read_bytes())
+
+    monkeypatch.setattr(dpr.RewireCheckpoint, 'save', save_and_keep)
+    random.seed(5)
+    dpr.rewire(G.copy(), 0.2, 'g', method='original', backend=backend,
+               checkpoint_path=str(tmp_path / 'run.pkl'), checkpoint_every=0)
+    monkeypatch.undo()
+
+    resumed, resumed_results = dpr.resume_rewire(str(tmp_path / 'mid.pkl'))
+    assert sorted(map(sorted, resumed.edges())) == sorted(map(sorted, full.edges()))
+    columns = [c for c in dpr.RESULTS_COLUMNS if c != 'time']
+    pd.testing.assert_frame_equal(resumed_results[columns], full_results[columns])
+
+
+def comparable(results):
+    results = results.drop(columns='time').reset_index(drop=True)
+    for col in ('name', 'method'):
+        results[col] = results[col].astype(str)
+    return results
+
+
+def test_rewire_iter_streams_rows_in_order():
+    G = nx.gnm_random_graph(300, 1200, seed=9)
+    random.seed(9)
+    H, expected = dpr.rewire(G.copy(), 0.2, 'g', method='original', jit=False)
+    random.seed(9)
+    chunks = list(dpr.rewire_iter(G, 0.2, 'g', window=50, method='original', jit=False))
+    assert all(len(chunk) == 50 for chunk in chunks[:-1])
+    assert chunks[-1]['summary'].iloc[-1]
+    pd.testing.assert_frame_equal(comparable(pd.concat(chunks)), comparable(expected))
+    assert sorted(map(sorted, G.edges())) == sorted(map(sorted, H.edges()))
+
+
+def test_rewire_iter_close_stops_the_run():
+    G = nx.gnm_random_graph(2000, 8000, seed=10)
+    before = set(threading.enumerate())
+    #an unreachable target would never end on its own
+    chunks = dpr.rewire_iter(G, 0.99, 'g', window=10, method='original', jit=False,
+                             unreachable='ignore')
+    next(chunks)
+    assert set(threading.enumerate()) - before
+    chunks.close()
+    assert not set(threading.enumerate()) - before
+    edges = sorted(map(sorted, G.edges()))
+    assert sorted(map(sorted, G.edges())) == edges
+
+
+def test_csv_sink_chunks_match_results(tmp_path):
+    G = nx.gnm_random_graph(300, 1200, seed=11)
+    random.seed(11)
+    H, expected = dpr.rewire(G.copy(), -0.2, 'g', method='original', jit=False)
+    random.seed(11)
+    path = str(tmp_path / 'rows.csv')
+    H, summary = dpr.rewire(G.copy(), -0.2, 'g', method='original', jit=False,
+                            sink=path, sink_rows=64)
+    assert len(summary) == 1 and summary['summary'].iloc[0]
+    streamed = pd.read_csv(path)
+    assert len(streamed) == len(expected)
+    pd.testing.assert_frame_equal(comparable(streamed), comparable(expected), check_dtype=False)
+
+
+def test_phase_profiler_laps_cover_the_run():
+    random.seed(12)
+    G = nx.gnm_random_graph(500, 2500, seed=12)
+    profiler = dpr.PhaseProfiler()
+    start = time.perf_counter()
+    H, results = dpr.rewire(G, 0.3, 'g', method='new', jit=False, profiler=profiler)
+    elapsed = time.perf_counter() - start
+    laps = profiler.to_frame().set_index(['algorithm', 'phase'])
+    fine_tuning = results[(results['method'] == 'new') & ~results['summary']].iloc[1:]
+    for phase in ('sampling', 'check', 'mutation', 'assortativity', 'logging'):
+        assert laps.loc[('negatively_rewire', phase), 'count'] == len(fine_tuning)
+    assert laps.loc[('negatively_rewire', 'accepted'), 'count'] == (fine_tuning['edges_rewired'] > 0).sum()
+    for key in [('rewire', 'setup'), ('havel_hakimi_positive', 'construction'), ('rewire', 'summary')]:
+        assert laps.loc[key, 'count'] == 1
+    #the laps are back to back, so they add up to the run
+    total = laps.loc[laps['kind'] == 'phase', 'time'].sum()
+    assert 0.8*elapsed <= total <= elapsed
+
+
+def test_rewire_with_repair_keeps_degrees():
+    random.seed(6)
+    G = nx.barabasi_albert_graph(400, 3, seed=6)
+    before = dict(G.degree())
+    H, results = dpr.rewire(G, 0.3, 'g', method='original', sample_size=8, repair=True)
+    assert dict(H.degree()) == before
+    assert nx.number_of_selfloops(H) == 0
+    assert results['repaired_edges'].sum() > 0
+    assert results['r'].iloc[-1] == pytest.approx(nx.degree_assortativity_coefficient(H))
+
+
+def test_assortativity_bounds_bracket_random_rewires():
+    G = nx.barabasi_albert_graph(300, 3, seed=14)
+    edges = sorted(map(sorted, G.edges()))
+    random.seed(14)
+    state = random.getstate()
+    r_min, r_max = dpr.assortativity_bounds(G)
+    assert sorted(map(sorted, G.edges())) == edges
+    assert random.getstate() == state
+    assert dpr.assortativity_bounds(G, 'negative') == r_min
+    assert dpr.assortativity_bounds(G, 'positive') == r_max
+    H = G.copy()
+    for seed in range(10):
+        nx.double_edge_swap(H, nswap=200, max_tries=10**5, seed=seed)
+        assert r_min < nx.degree_assortativity_coefficient(H) < r_max
+
+
+def test_unreachable_raise():
+    G = nx.barabasi_albert_graph(300, 3, seed=15)
+    edges = sorted(map(sorted, G.edges()))
+    with pytest.raises(ValueError):
+        dpr.rewire(G, 0.99, 'g', method='original', unreachable='raise')
+    with pytest.raises(ValueError):
+        dpr.rewire(G, -0.99, 'g', method='new', unreachable='raise')
+    assert sorted(map(sorted, G.edges())) == edges
+
+
+def test_unreachable_clamp_builds_the_extremal_graph():
+    G = nx.barabasi_albert_graph(300, 3, seed=16)
+    r_max = dpr.assortativity_bounds(G, 'positive')
+    #the bound is computed with the random module seeded to 0, so the run 
+    #builds the same graph from that seed
+    random.seed(0)
+    with pytest.warns(UserWarning, match='building the extremal graph'):
+        H, results = dpr.rewire(G, 0.99, 'g', method='original', unreachable='clamp')
+    #method 'max': Havel-Hakimi rows only, no fine tuning
+    assert set(results['method']) == {'max'}
+    assert results['target_r'].iloc[-1] == pytest.approx(r_max)
+    assert nx.degree_assortativity_coefficient(H) == pytest.approx(r_max)
+
+
+def test_unreachable_untimed_original_warns_by_default():
+    G = nx.barabasi_albert_graph(300, 3, seed=17)
+    with pytest.warns(UserWarning, match='may never be reached'):
+        chunks = dpr.rewire_iter(G, 0.99, 'g', window=10, method='original', jit=False)
+        next(chunks)
+        chunks.close()